@@ -0,0 +1,115 @@
+"""目录大小计算基准测试
+
+在临时目录中生成合成目录树，比较并行大小计算引擎与原先的两种递归实现：
+- legacy_get_file_size: 逐项递归，每项检查一次内存（新建 psutil.Process）并 gc.collect()
+- legacy_calculate_dir_size: 单线程递归 os.scandir
+
+用法:
+    python benchmarks/bench_dir_size.py [--dirs 2000] [--files 20] [--workers 8]
+    python benchmarks/bench_dir_size.py --path /some/existing/tree --skip-legacy-full
+"""
+import argparse
+import gc
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.size_engine import SizeEngine  # noqa: E402
+
+
+def build_tree(root: str, dirs: int, files: int, fanout: int = 8) -> int:
+    """生成 dirs 个目录、每个目录 files 个文件的树，返回文件总字节数"""
+    total = 0
+    paths = [root]
+    for index in range(1, dirs):
+        parent = paths[(index - 1) // fanout]
+        path = os.path.join(parent, f"d{index}")
+        os.mkdir(path)
+        paths.append(path)
+    for d, path in enumerate(paths):
+        for f in range(files):
+            size = (d * 31 + f * 7) % 4096
+            with open(os.path.join(path, f"f{f}.bin"), 'wb') as fh:
+                fh.write(b'\0' * size)
+            total += size
+    return total
+
+
+def legacy_get_file_size(path: str) -> int:
+    """原 FileSystemOperations.get_file_size 的热路径（不含缓存）"""
+    import psutil
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_size
+    size = st.st_size
+    for entry in os.scandir(path):
+        process = psutil.Process()
+        process.memory_info()
+        psutil.virtual_memory()
+        size += legacy_get_file_size(entry.path)
+        gc.collect()
+    return size
+
+
+def legacy_calculate_dir_size(path: str) -> int:
+    """原 FileSystemOperations.calculate_dir_size"""
+    total = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                total += entry.stat().st_size
+            elif entry.is_dir(follow_symlinks=False):
+                total += legacy_calculate_dir_size(entry.path)
+    return total
+
+
+def timed(label: str, func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32}{elapsed * 1000:>10.1f} ms   {value}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="目录大小计算基准测试")
+    parser.add_argument("--path", help="使用已有目录树（不生成合成树）")
+    parser.add_argument("--dirs", type=int, default=2000, help="合成树的目录数")
+    parser.add_argument("--files", type=int, default=20, help="每个目录的文件数")
+    parser.add_argument("--workers", type=int, default=8, help="引擎线程数")
+    parser.add_argument("--skip-legacy-full", action="store_true",
+                        help="跳过逐项检查内存的原实现（大目录树上非常慢）")
+    args = parser.parse_args()
+
+    temp = None
+    root = args.path
+    if not root:
+        temp = tempfile.mkdtemp(prefix="bench_dir_size_")
+        root = temp
+        print(f"生成合成目录树: {args.dirs} 个目录 x {args.files} 个文件 ...")
+        expected = build_tree(root, args.dirs, args.files)
+        print(f"文件总大小 {expected} 字节")
+
+    try:
+        if not args.skip_legacy_full:
+            timed("legacy get_file_size", legacy_get_file_size, root)
+        baseline = timed("legacy calculate_dir_size", legacy_calculate_dir_size, root)
+        for workers in sorted({1, args.workers}):
+            engine = SizeEngine(workers)
+            engine.measure(root)  # 预热线程
+            elapsed = timed(f"SizeEngine workers={workers}",
+                            lambda: engine.measure(root).size)
+            print(f"{'':<32}相对单线程递归 {baseline / elapsed:.2f}x")
+            engine.shutdown()
+    finally:
+        if temp:
+            shutil.rmtree(temp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
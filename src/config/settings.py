@@ -13,16 +13,142 @@ class FileSystemSettings:
     
     # 批处理配置
     BATCH_SIZE = 500  # 每批处理的文件数
-    MAX_QUEUE_SIZE = 1000  # 最大队列大小
+    BATCH_INTERVAL = 0.1  # 未攒满一批时最长等待时间（秒），流式加载目录用
     
     # 缓存配置
-    CACHE_FILE = "directory_size_cache.json"
+    CACHE_FILE = "directory_sizes.db"  # 位于用户缓存目录
+    CACHE_BATCH_SIZE = 1000  # 缓存写入攒批条数
+    CACHE_BUSY_TIMEOUT = 5  # 其他实例写入时的等待时间（秒）
     CACHE_EXPIRE_TIME = 3600  # 缓存过期时间（秒）
+    CACHE_MAX_ENTRIES = 200000  # 内存中最多缓存的目录记录数
+    CACHE_MAX_BYTES = 64 * 1024 * 1024  # 内存缓存估算字节上限
+
+    # 目录大小计算配置
+    SIZE_WORKERS = 8  # 并行扫描目录的线程数
+    PROGRESS_INTERVAL = 0.2  # 计算进度回调的最小间隔（秒）
+    SIZE_SCHEDULER_WORKERS = 2  # 后台同时计算大小的目录数（每个目录仍由引擎并行扫描）
+
+    # 目录监视配置（Linux inotify）
+    WATCH_COALESCE = 0.3  # 合并窗口：无新事件持续该时间后批量处理（秒）
+    WATCH_MAX_DELAY = 2  # 事件持续不断时最长等待时间（秒）
+    WATCH_MAX_DIRS = 4096  # 为大小缓存监视的目录数上限
+    WATCH_REFRESH_THRESHOLD = 500  # 当前目录一批变化超过该数量时整体刷新
     
     # 状态显示文本
     SIZE_CALCULATING = "计算中..."
     SIZE_UNKNOWN = "未知"
 
+class AgentSettings:
+    # 探测代理配置
+    DEFAULT_HOST = "127.0.0.1"  # 默认只监听本机；监听其他地址时必须设置共享令牌
+    TOKEN_ENV = "NETWORK_TOOL_AGENT_TOKEN"  # 未指定 --token 时从该环境变量读取共享令牌
+    DEFAULT_PORT = 9500  # 默认监听端口
+    MAX_MESSAGE_SIZE = 16 * 1024 * 1024  # 单条消息最大字节数
+    MAX_WORKERS = 32  # 单个代理并发探测数
+    CONNECT_TIMEOUT = 5  # 协调器连接代理超时（秒）
+    MAX_JOB_TARGETS = 500000  # 协调器单次分发的目标数上限（主机数 x 端口数）
+
+class ApiSettings:
+    # HTTP/JSON 接口服务配置
+    DEFAULT_HOST = "127.0.0.1"  # 默认只监听本机；监听其他地址时必须设置访问令牌
+    DEFAULT_PORT = 8765  # 默认监听端口
+    TOKEN_ENV = "NETWORK_TOOL_API_TOKEN"  # 未指定 --token 时从该环境变量读取访问令牌
+    MAX_WORKERS = 16  # 工作线程池大小（所有客户端共享）
+    INTERACTIVE_WORKERS = 4  # 其中为单次调用（/api/ping 等）保留、长任务不占用的线程数
+    MAX_ACTIVE_JOBS = 64  # 同时运行的任务上限
+    JOB_CONCURRENCY = 8  # 单个任务内的并发探测数
+    JOB_RETENTION = 600  # 已结束任务的保留时间（秒）
+    MAX_BODY_SIZE = 1024 * 1024  # 请求体最大字节数
+    MAX_JOB_TARGETS = 100000  # 单个任务展开后的目标数上限（主机数 x 端口数）
+
+class MetricsSettings:
+    # 监控指标配置
+    NAMESPACE = "network_tool"  # 指标名前缀
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                       0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # 延迟直方图桶上界（秒）
+    TEXTFILE_INTERVAL = 15  # textfile 输出间隔（秒）
+
+class TimeSeriesSettings:
+    # 探测历史时序存储配置
+    DATA_DIR = "timeseries"  # 数据目录（位于用户数据目录下）
+    RAW_RETENTION = 7 * 86400  # 原始样本保留时间（秒）
+    MINUTE_RETENTION = 90 * 86400  # 分钟汇总保留时间（秒）
+    HOUR_RETENTION = 2 * 365 * 86400  # 小时汇总保留时间（秒）
+    INITIAL_SEGMENT_RECORDS = 1024  # 新段文件初始容量（记录数）
+    MAX_OPEN_SEGMENTS = 256  # 同时映射的段文件上限
+
+class AnalyticsSettings:
+    # 延迟分析报表配置
+    PERCENTILES = (50, 90, 95, 99)  # 输出的百分位
+    OUTLIER_THRESHOLD = 3.5  # 稳健Z分数超过该值视为离群样本
+    MAX_REPORTED_OUTLIERS = 20  # 报表中列出的离群样本上限
+
+class MonitorSettings:
+    # TCP长连接健康监控配置
+    CONNECT_TIMEOUT = 3  # 建连超时（秒）
+    HEARTBEAT_INTERVAL = 5  # 心跳间隔（秒）
+    HEARTBEAT_TIMEOUT = 2  # 心跳应答超时（秒）
+    RECONNECT_DELAY = 0.05  # 首次重连延迟（秒）
+    MAX_RECONNECT_DELAY = 10  # 重连退避上限（秒）
+    KEEPALIVE_IDLE = 5  # TCP keepalive 空闲探测起始时间（秒）
+    KEEPALIVE_INTERVAL = 2  # TCP keepalive 探测间隔（秒）
+    KEEPALIVE_COUNT = 3  # TCP keepalive 失败次数
+
+class ListenerSettings:
+    # 多端口监听测试端配置
+    DEFAULT_HOST = "0.0.0.0"  # 默认监听地址
+    MODE = "echo"  # 应答方式：echo 回显 / ack 确认
+    READ_TIMEOUT = 30  # TCP连接空闲超时（秒）
+    MAX_PEERS_PER_PORT = 256  # 每个端口最多记录的对端数，限制长时间运行时的内存
+
+class LoadSettings:
+    # 连接压测配置
+    CONCURRENCY = 100  # 默认并发连接数
+    DURATION = 10  # 默认持续时间（秒）
+    WORKERS = 2  # 事件循环线程数
+    CONNECT_TIMEOUT = 3  # 建连超时（秒）
+    RECV_BUFFER = 4096  # 每个线程预分配的接收缓冲区大小
+    LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                       0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 3.0)  # 建连延迟桶（秒）
+
+class ProxySettings:
+    # 代理探测配置
+    MAX_CONNECTIONS = 16  # 单个代理同时进行中的隧道数上限
+    POOL_SIZE = 4  # 预先建立的到代理的空闲连接数
+    IDLE_TIMEOUT = 30  # 预热连接最长空闲时间（秒）
+    CONNECT_TIMEOUT = 5  # 经代理建连超时（秒）
+    BANNER_SIZE = 1024  # 读取 banner 的最大字节数
+    BANNER_TIMEOUT = 2  # 等待 banner 的超时（秒）
+    HTTP_TIMEOUT = 5  # HTTP 探测超时（秒）
+    USER_AGENT = "network-tool"
+
+class AnnotateSettings:
+    # IP 归属（ASN/国家）离线标注配置
+    INDEX_FILE = "ip2asn.idx"  # 编译后的区间表（位于用户数据目录下）
+
+class ResolverSettings:
+    # 批量DNS解析配置
+    MAX_WORKERS = 64  # 并发解析数上限
+    RATE_LIMIT = 2000  # 每秒查询数上限（0 表示不限）
+    BURST = 100  # 限速允许的突发查询数
+    CACHE_SIZE = 100000  # 解析缓存条目上限
+    POSITIVE_TTL = 300  # 成功结果缓存时间（秒）
+    NEGATIVE_TTL = 60  # 失败/无记录结果缓存时间（秒）
+
+class SubdomainSettings:
+    # 子域名枚举配置（仅用于授权的资产审计）
+    WILDCARD_PROBES = 3  # 检测泛解析时查询的随机子域名个数
+    MAX_OUTSTANDING = 2000  # 同时提交给解析器的候选名字上限
+    RATE_LIMIT = 1000  # 默认每秒查询数上限
+
+class SchedulerSettings:
+    # 定时探测任务配置
+    MAX_WORKERS = 32  # 执行探测的线程数（与任务数量无关）
+    JITTER = 0.1  # 每次执行时间的随机偏移（占间隔的比例）
+    MIN_INTERVAL = 1  # 最小执行间隔（秒）
+    FLUSH_INTERVAL = 60  # 时序数据刷盘间隔（秒）
+    RETENTION_INTERVAL = 3600  # 清理过期时序段文件的间隔（秒）
+
 # 窗口设置
 WINDOW_TITLE = "网络工具集合"
 WINDOW_SIZE = "900x700"
@@ -30,11 +156,16 @@ WINDOW_SIZE = "900x700"
 # 网络设置
 PING_COUNT = 4
 SOCKET_TIMEOUT = 2
+CONNECTION_ATTEMPT_DELAY = 0.25  # 双栈建连时相邻两次尝试的间隔（秒，RFC 8305）
+MAX_EXPAND_TARGETS = 65536  # 单个网段/地址范围最多展开的目标数
+SCAN_WORKERS = 64  # 界面批量端口扫描的并发数
 
 # 文件系统设置
 CHUNK_SIZE = 8192  # 文件读取块大小
 
 # UI设置
+VIRTUAL_LIST_OVERSCAN = 5  # 虚拟列表在可见行之外多保留的行数
+SIZE_UPDATE_INTERVAL = 0.25  # 后台计算出的目录大小合并后刷新到列表的间隔（秒）
 TREEVIEW_COLUMNS = {
     "size": {"width": 120, "anchor": "e", "text": "大小"},
     "modified": {"width": 150, "anchor": "w", "text": "修改时间"}
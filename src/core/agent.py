@@ -0,0 +1,291 @@
+"""分布式探测代理与协调器
+
+代理（ProbeAgent）以无界面模式监听TCP端口，接收任务并流式返回探测结果；
+协调器（AgentCoordinator）把目标拆分给多个代理，合并各代理的结果流。
+
+通信协议：每条消息为 4 字节大端长度前缀 + UTF-8 编码的 JSON 对象。
+代理默认只监听本机；监听其他地址时必须配置共享令牌，任务消息的 token
+字段与之不符时代理回复错误并断开连接。
+"""
+import hmac
+import json
+import socket
+import struct
+import threading
+import socketserver
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from src.core.network import NetworkOperations
+from src.core.utils import is_loopback, logger
+from src.config.settings import AgentSettings as Settings
+
+_HEADER = struct.Struct('!I')
+
+JOB_TYPES = ('ping', 'dns', 'scan')
+
+
+def send_message(sock: socket.socket, message: dict):
+    """发送一条长度前缀的JSON消息"""
+    data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    if len(data) > Settings.MAX_MESSAGE_SIZE:
+        raise ValueError(f"消息过大: {len(data)} 字节")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """读取指定长度的数据，连接在消息边界关闭时返回None"""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            if received == 0:
+                return None
+            raise ConnectionError("连接在消息中途关闭")
+        received += count
+    return bytes(buf)
+
+
+def recv_message(sock: socket.socket) -> Optional[dict]:
+    """接收一条长度前缀的JSON消息，对端关闭连接时返回None"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > Settings.MAX_MESSAGE_SIZE:
+        raise ValueError(f"消息过大: {length} 字节")
+    data = _recv_exact(sock, length) if length else b''
+    if data is None:
+        raise ConnectionError("连接在消息中途关闭")
+    return json.loads(data.decode('utf-8'))
+
+
+def run_probe(job_type: str, target, protocol: str = "TCP",
+              proxy: Optional[str] = None) -> Tuple[bool, object]:
+    """执行单个探测目标（proxy 为代理URL时端口探测经代理进行）"""
+    if job_type == 'ping':
+        return NetworkOperations.ping(target)
+    if job_type == 'dns':
+        return NetworkOperations.resolve_dns(target)
+    if job_type == 'scan':
+        host, port = target
+        return NetworkOperations.scan_port(host, int(port), protocol, proxy)
+    raise ValueError(f"未知的任务类型: {job_type}")
+
+
+def execute_job(job: dict, emit: Callable[[dict], None], agent_name: str = "",
+                max_workers: int = Settings.MAX_WORKERS,
+                cancelled: Optional[threading.Event] = None):
+    """执行任务，每完成一个目标调用一次emit，最后发送完成消息"""
+    if not isinstance(job, dict):
+        emit({'job': None, 'agent': agent_name, 'error': "任务消息必须是JSON对象"})
+        return
+    job_id = job.get('id')
+    job_type = job.get('type')
+    targets = job.get('targets') or []
+    protocol = job.get('protocol', 'TCP')
+    proxy = job.get('proxy')
+    cancelled = cancelled or threading.Event()
+
+    if job_type not in JOB_TYPES:
+        emit({'job': job_id, 'agent': agent_name, 'error': f"未知的任务类型: {job_type}"})
+        return
+    if not isinstance(targets, list):
+        emit({'job': job_id, 'agent': agent_name, 'error': "targets 必须是列表"})
+        return
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets) or 1))) as pool:
+        futures = {pool.submit(run_probe, job_type, target, protocol, proxy): target
+                   for target in targets}
+        try:
+            for future in as_completed(futures):
+                if cancelled.is_set():
+                    break
+                target = futures[future]
+                try:
+                    success, result = future.result()
+                except Exception as e:
+                    success, result = False, str(e)
+                emit({'job': job_id, 'agent': agent_name, 'target': target,
+                      'success': success, 'result': result})
+                count += 1
+        finally:
+            for future in futures:
+                future.cancel()
+
+    if not cancelled.is_set():
+        emit({'job': job_id, 'agent': agent_name, 'done': True, 'count': count})
+
+
+class _AgentHandler(socketserver.BaseRequestHandler):
+    """处理单个协调器连接"""
+
+    def handle(self):
+        send_lock = threading.Lock()
+        cancelled = threading.Event()
+
+        def emit(message):
+            with send_lock:
+                try:
+                    send_message(self.request, message)
+                except OSError:
+                    # 协调器已断开，停止剩余探测
+                    cancelled.set()
+
+        try:
+            while not cancelled.is_set():
+                job = recv_message(self.request)
+                if job is None:
+                    break
+                if not isinstance(job, dict):
+                    emit({'job': None, 'agent': self.server.name,
+                          'error': "任务消息必须是JSON对象"})
+                    continue
+                if not self.server.authorized(job.get('token')):
+                    logger.warning(f"代理拒绝未授权的任务 {self.client_address}")
+                    emit({'job': job.get('id'), 'agent': self.server.name, 'error': "令牌无效"})
+                    break
+                targets = job.get('targets')
+                logger.info(f"代理收到任务 {job.get('id')} ({job.get('type')}, "
+                            f"{len(targets) if isinstance(targets, list) else 0} 个目标)")
+                execute_job(job, emit, self.server.name,
+                            self.server.max_workers, cancelled)
+        except (OSError, ValueError) as e:
+            logger.warning(f"代理连接异常 {self.client_address}: {str(e)}")
+
+
+class ProbeAgent(socketserver.ThreadingTCPServer):
+    """无界面探测代理"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host: str = Settings.DEFAULT_HOST, port: int = Settings.DEFAULT_PORT,
+                 name: Optional[str] = None, max_workers: int = Settings.MAX_WORKERS,
+                 token: Optional[str] = None):
+        super().__init__((host, port), _AgentHandler)
+        self.token = token or None
+        if self.token is None and not is_loopback(self.server_address[0]):
+            self.server_close()
+            raise ValueError(f"代理监听 {host} 时必须设置共享令牌（--token 或环境变量 "
+                             f"{Settings.TOKEN_ENV}），否则任何人都能用它发起探测")
+        self.max_workers = max_workers
+        self.name = name or f"{socket.gethostname()}:{self.server_address[1]}"
+        self._thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """实际监听地址（端口为0时返回系统分配的端口）"""
+        return self.server_address[0], self.server_address[1]
+
+    def authorized(self, token) -> bool:
+        """校验任务携带的令牌（未设置令牌时只监听本机，不做校验）"""
+        if self.token is None:
+            return True
+        return isinstance(token, str) and hmac.compare_digest(token.encode('utf-8'),
+                                                              self.token.encode('utf-8'))
+
+    def start(self):
+        """在后台线程中启动代理"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"探测代理已启动: {self.address[0]}:{self.address[1]}")
+        return self
+
+    def stop(self):
+        """停止代理"""
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+class AgentCoordinator:
+    """协调多个探测代理"""
+
+    def __init__(self, agents: List[Tuple[str, int]], token: Optional[str] = None):
+        if not agents:
+            raise ValueError("至少需要一个代理")
+        self.agents = list(agents)
+        self.token = token or None
+
+    @staticmethod
+    def parse_agents(agent_str: str) -> List[Tuple[str, int]]:
+        """解析代理列表，格式为 "host:port,host:port" """
+        return NetworkOperations.parse_endpoints(agent_str)
+
+    @staticmethod
+    def split_targets(targets: List, count: int) -> List[List]:
+        """把目标轮流分配给各代理"""
+        return [targets[i::count] for i in range(count)]
+
+    def stream(self, job_type: str, targets: List, protocol: str = "TCP",
+               broadcast: bool = False) -> Iterator[dict]:
+        """下发任务并按到达顺序合并各代理的结果流
+
+        broadcast为True时每个代理都执行全部目标（多视角对比），
+        否则目标在代理间拆分。
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"未知的任务类型: {job_type}")
+
+        job_id = uuid.uuid4().hex[:12]
+        if broadcast:
+            shares = [list(targets) for _ in self.agents]
+        else:
+            shares = self.split_targets(list(targets), len(self.agents))
+
+        results: Queue = Queue()
+        threads = []
+        for agent, share in zip(self.agents, shares):
+            if not share:
+                continue
+            job = {'id': job_id, 'type': job_type, 'protocol': protocol, 'targets': share}
+            if self.token:
+                job['token'] = self.token
+            thread = threading.Thread(target=self._run_on_agent,
+                                      args=(agent, job, results), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        pending = len(threads)
+        while pending:
+            message = results.get()
+            if message is None:
+                pending -= 1
+                continue
+            yield message
+
+    def run(self, job_type: str, targets: List, protocol: str = "TCP",
+            broadcast: bool = False, callback: Optional[Callable[[dict], None]] = None) -> List[dict]:
+        """执行任务并收集全部结果"""
+        collected = []
+        for message in self.stream(job_type, targets, protocol, broadcast):
+            collected.append(message)
+            if callback:
+                callback(message)
+        return collected
+
+    @staticmethod
+    def _run_on_agent(agent: Tuple[str, int], job: dict, results: Queue):
+        """在单个代理上执行任务，把消息转发到合并队列"""
+        agent_name = f"{agent[0]}:{agent[1]}"
+        try:
+            with socket.create_connection(agent, timeout=Settings.CONNECT_TIMEOUT) as sock:
+                sock.settimeout(None)
+                send_message(sock, job)
+                while True:
+                    message = recv_message(sock)
+                    if message is None:
+                        raise ConnectionError("代理提前关闭连接")
+                    results.put(message)
+                    if message.get('done') or 'error' in message:
+                        break
+        except Exception as e:
+            logger.error(f"代理 {agent_name} 执行任务失败: {str(e)}")
+            results.put({'job': job['id'], 'agent': agent_name, 'error': str(e)})
+        finally:
+            results.put(None)
@@ -0,0 +1,286 @@
+"""探测延迟分析报表
+
+从时序存储中把原始样本直接映射为 NumPy 数组，以向量化方式计算
+百分位、抖动、连续丢包、按小时热力图以及离群/异常标记，生成每个主机的报表。
+
+原始样本只保留 RAW_RETENTION；时间范围早于该期限的报表改用分钟汇总计算，
+报表的 resolution 字段注明所用精度（分钟汇总下的百分位、抖动等为近似值）。
+"""
+import time
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from src.core.timeseries import TimeSeriesStore, RAW, MINUTE
+from src.config.settings import AnalyticsSettings as Settings
+from src.config.settings import TimeSeriesSettings
+
+# 与 timeseries.RAW_RECORD ('<qf') 对应的结构化类型
+RAW_DTYPE = np.dtype([('ts', '<i8'), ('rtt', '<f4')])
+# 与 timeseries.ROLLUP_RECORD ('<qIIffff') 对应的结构化类型
+ROLLUP_DTYPE = np.dtype([('ts', '<i8'), ('count', '<u4'), ('lost', '<u4'), ('min', '<f4'),
+                         ('avg', '<f4'), ('max', '<f4'), ('p95', '<f4')])
+
+_HOUR_MS = 3600 * 1000
+_DAY_MS = 24 * _HOUR_MS
+
+
+def _load(store: TimeSeriesStore, host: str, start: float, end: float,
+          resolution: str, dtype: np.dtype) -> np.ndarray:
+    result = store.query(host, start, end, resolution)
+    if not result.views:
+        return np.empty(0, dtype=dtype)
+    arrays = [np.frombuffer(view, dtype=dtype) for view in result.views]
+    return arrays[0].copy() if len(arrays) == 1 else np.concatenate(arrays)
+
+
+def load_samples(store: TimeSeriesStore, host: str, start: float, end: float) -> np.ndarray:
+    """加载主机在时间范围内的原始样本为结构化数组"""
+    return _load(store, host, start, end, RAW, RAW_DTYPE)
+
+
+def load_rollups(store: TimeSeriesStore, host: str, start: float, end: float) -> np.ndarray:
+    """加载主机在时间范围内的分钟汇总为结构化数组"""
+    return _load(store, host, start, end, MINUTE, ROLLUP_DTYPE)
+
+
+def report_resolution(start: float, now: Optional[float] = None) -> str:
+    """起点仍在原始样本保留期内时用原始样本，否则用分钟汇总"""
+    now = time.time() if now is None else now
+    return RAW if start >= now - TimeSeriesSettings.RAW_RETENTION else MINUTE
+
+
+def _nan_to_none(values: np.ndarray) -> list:
+    """转换为列表，NaN 替换为 None"""
+    return [None if v != v else round(float(v), 3) for v in values]
+
+
+def loss_streaks(lost: np.ndarray) -> np.ndarray:
+    """连续丢包段的长度数组"""
+    if not lost.size:
+        return np.empty(0, dtype=np.int64)
+    padded = np.concatenate(([0], lost.view(np.int8), [0]))
+    edges = np.diff(padded)
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def hourly_heatmap(ts: np.ndarray, rtt: np.ndarray) -> Tuple[Optional[int], np.ndarray, np.ndarray]:
+    """按 UTC 天 x 小时统计平均时延和丢包率，返回 (起始日时间戳, 均值矩阵, 丢包率矩阵)"""
+    valid = ~np.isnan(rtt)
+    return _heatmap(ts, np.ones(ts.size), valid.astype(np.float64), np.where(valid, rtt, 0.0))
+
+
+def _heatmap(ts: np.ndarray, counts: np.ndarray, received: np.ndarray,
+             sums: np.ndarray) -> Tuple[Optional[int], np.ndarray, np.ndarray]:
+    """按时间戳把 (样本数, 收到数, 时延和) 累加到小时格子"""
+    if not ts.size:
+        return None, np.empty((0, 24)), np.empty((0, 24))
+    first_day = int(ts[0]) // _DAY_MS * _DAY_MS
+    hour_index = (ts - first_day) // _HOUR_MS
+    days = int(hour_index[-1]) // 24 + 1
+    cells = days * 24
+
+    counts = np.bincount(hour_index, weights=counts, minlength=cells)
+    received = np.bincount(hour_index, weights=received, minlength=cells)
+    sums = np.bincount(hour_index, weights=sums, minlength=cells)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(received > 0, sums / received, np.nan)
+        loss_rate = np.where(counts > 0, 1.0 - received / counts, np.nan)
+    return first_day // 1000, mean.reshape(days, 24), loss_rate.reshape(days, 24)
+
+
+def robust_zscores(values: np.ndarray) -> np.ndarray:
+    """基于中位数和MAD的稳健Z分数
+
+    过半样本相同（如大量 10ms 中混入一个尖峰）时 MAD 为 0，此时改用
+    1.2533 倍平均绝对偏差作为尺度，避免所有样本都判为正常。
+    """
+    if not values.size:
+        return values
+    median = np.median(values)
+    deviation = np.abs(values - median)
+    mad = np.median(deviation)
+    if mad != 0:
+        return 0.6745 * (values - median) / mad
+    mean_deviation = deviation.mean()
+    if mean_deviation == 0:
+        return np.zeros_like(values, dtype=np.float64)
+    return (values - median) / (1.2533 * mean_deviation)
+
+
+def _weighted_percentiles(values: np.ndarray, weights: np.ndarray, percentiles) -> np.ndarray:
+    """按权重计算百分位（取累计权重首次达到该比例的值）"""
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    targets = np.asarray(percentiles, dtype=np.float64) / 100 * cumulative[-1]
+    index = np.minimum(np.searchsorted(cumulative, targets), values.size - 1)
+    return values[order][index]
+
+
+def analyze_samples(samples: np.ndarray) -> dict:
+    """对结构化样本数组做统计分析"""
+    ts = samples['ts']
+    rtt = samples['rtt'].astype(np.float64)
+    lost = np.isnan(rtt)
+    received = rtt[~lost]
+    received_ts = ts[~lost]
+    total = int(rtt.size)
+
+    report = {
+        'samples': total,
+        'lost': int(lost.sum()),
+        'loss_rate': float(lost.mean()) if total else 0.0,
+        'start': int(ts[0]) / 1000 if total else None,
+        'end': int(ts[-1]) / 1000 if total else None,
+    }
+
+    if received.size:
+        percentiles = np.percentile(received, Settings.PERCENTILES)
+        report.update({
+            'min': float(received.min()),
+            'avg': float(received.mean()),
+            'max': float(received.max()),
+            'stddev': float(received.std()),
+            'percentiles': {f"p{p}": float(v) for p, v in zip(Settings.PERCENTILES, percentiles)},
+            # 相邻有效样本时延差的平均绝对值
+            'jitter': float(np.abs(np.diff(received)).mean()) if received.size > 1 else 0.0,
+        })
+    else:
+        report.update({'min': None, 'avg': None, 'max': None, 'stddev': None,
+                       'percentiles': {}, 'jitter': None})
+
+    streaks = loss_streaks(lost)
+    report['loss_streaks'] = {
+        'count': int(streaks.size),
+        'longest': int(streaks.max()) if streaks.size else 0,
+    }
+    report['outliers'] = _outliers(received_ts, received)
+    _add_heatmap(report, *hourly_heatmap(ts, rtt))
+    report['resolution'] = RAW
+    return report
+
+
+def analyze_rollups(rollups: np.ndarray) -> dict:
+    """基于分钟汇总做统计分析，字段与 analyze_samples 相同
+
+    百分位按收到的样本数加权取自每分钟平均值，抖动为相邻分钟平均值之差，
+    连续丢包只统计整分钟全部丢失的区段，离群标记针对分钟平均值，均为近似结果。
+    """
+    ts = rollups['ts']
+    count = rollups['count'].astype(np.int64)
+    lost = rollups['lost'].astype(np.int64)
+    received = count - lost
+    has = received > 0
+    means = rollups['avg'][has].astype(np.float64)
+    weights = received[has]
+    total = int(count.sum())
+
+    report = {
+        'samples': total,
+        'lost': int(lost.sum()),
+        'loss_rate': float(lost.sum() / total) if total else 0.0,
+        'start': int(ts[0]) / 1000 if ts.size else None,
+        'end': int(ts[-1]) / 1000 if ts.size else None,
+    }
+
+    if means.size:
+        average = float(np.average(means, weights=weights))
+        percentiles = _weighted_percentiles(means, weights, Settings.PERCENTILES)
+        report.update({
+            'min': float(rollups['min'][has].min()),
+            'avg': average,
+            'max': float(rollups['max'][has].max()),
+            'stddev': float(np.sqrt(np.average((means - average) ** 2, weights=weights))),
+            'percentiles': {f"p{p}": float(v) for p, v in zip(Settings.PERCENTILES, percentiles)},
+            'jitter': float(np.abs(np.diff(means)).mean()) if means.size > 1 else 0.0,
+        })
+    else:
+        report.update({'min': None, 'avg': None, 'max': None, 'stddev': None,
+                       'percentiles': {}, 'jitter': None})
+
+    # 整分钟全部丢失的连续区段，长度换算为样本数
+    full_loss = (count > 0) & (received == 0)
+    padded = np.concatenate(([0], full_loss.view(np.int8), [0]))
+    edges = np.diff(padded)
+    cumulative = np.concatenate(([0], np.cumsum(count)))
+    streaks = cumulative[np.flatnonzero(edges == -1)] - cumulative[np.flatnonzero(edges == 1)]
+    report['loss_streaks'] = {
+        'count': int(streaks.size),
+        'longest': int(streaks.max()) if streaks.size else 0,
+    }
+    report['outliers'] = _outliers(ts[has], means)
+    _add_heatmap(report, *_heatmap(ts, count.astype(np.float64), received.astype(np.float64),
+                                   np.where(has, rollups['avg'], 0.0) * received))
+    report['resolution'] = MINUTE
+    return report
+
+
+def _outliers(ts: np.ndarray, values: np.ndarray) -> dict:
+    """稳健Z分数超过阈值的样本，列出最显著的若干个"""
+    zscores = robust_zscores(values)
+    outliers = np.flatnonzero(zscores > Settings.OUTLIER_THRESHOLD)
+    worst = outliers[np.argsort(zscores[outliers])[::-1][:Settings.MAX_REPORTED_OUTLIERS]]
+    return {
+        'count': int(outliers.size),
+        'samples': [{'time': int(ts[i]) / 1000, 'rtt': float(values[i])}
+                    for i in np.sort(worst)],
+    }
+
+
+def _add_heatmap(report: dict, start_day: Optional[int], hourly_mean: np.ndarray,
+                 hourly_loss: np.ndarray):
+    """写入热力图与异常小时"""
+    report['heatmap'] = {
+        'start_day': start_day,
+        'mean': [_nan_to_none(row) for row in hourly_mean],
+        'loss_rate': [_nan_to_none(row) for row in hourly_loss],
+    }
+
+    # 小时均值相对全部小时显著偏高的时段记为异常
+    anomalies = []
+    flat_mean = hourly_mean.ravel()
+    hours = np.flatnonzero(~np.isnan(flat_mean))
+    hour_scores = robust_zscores(flat_mean[hours])
+    for index in hours[hour_scores > Settings.OUTLIER_THRESHOLD]:
+        anomalies.append({'hour': start_day + int(index) * 3600, 'mean': float(flat_mean[index])})
+    report['anomalous_hours'] = anomalies
+
+
+class LatencyReporter:
+    """基于时序存储生成延迟报表"""
+
+    def __init__(self, store: TimeSeriesStore):
+        self.store = store
+
+    def host_report(self, host: str, start: float, end: float) -> dict:
+        """单个主机的报表；起点早于原始样本保留期时改用分钟汇总"""
+        if report_resolution(start) == RAW:
+            report = analyze_samples(load_samples(self.store, host, start, end))
+        else:
+            report = analyze_rollups(load_rollups(self.store, host, start, end))
+        report['host'] = host
+        return report
+
+    def report(self, start: float, end: float,
+               hosts: Optional[Iterable[str]] = None) -> List[dict]:
+        """多个主机的报表（默认全部主机）"""
+        return [self.host_report(host, start, end)
+                for host in (hosts if hosts is not None else self.store.hosts())]
+
+    @staticmethod
+    def format_table(reports: List[dict]) -> str:
+        """把报表格式化为文本表格"""
+        header = (f"{'主机':<24}{'样本':>10}{'丢包率':>9}{'P50':>9}{'P95':>9}"
+                  f"{'P99':>9}{'抖动':>9}{'最长连丢':>9}{'离群':>7}{'精度':>6}")
+        lines = [header]
+
+        def fmt(value):
+            return f"{value:9.2f}" if value is not None else f"{'-':>9}"
+
+        for report in reports:
+            p = report['percentiles']
+            lines.append(
+                f"{report['host']:<24}{report['samples']:>10}{report['loss_rate'] * 100:8.2f}%"
+                f"{fmt(p.get('p50'))}{fmt(p.get('p95'))}{fmt(p.get('p99'))}{fmt(report['jitter'])}"
+                f"{report['loss_streaks']['longest']:>9}{report['outliers']['count']:>7}"
+                f"{report['resolution']:>6}")
+        return "\n".join(lines)
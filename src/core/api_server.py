@@ -0,0 +1,496 @@
+"""本地HTTP/JSON接口服务
+
+基于 asyncio 的轻量HTTP服务，把 NetworkOperations 与 FileSystemOperations
+以JSON接口的形式暴露给自动化脚本。
+
+接口列表：
+    GET    /api/ping?host=...                      单次Ping
+    GET    /api/dns?domain=...                     DNS解析
+    GET    /api/scan?host=...&port=...&protocol=   单端口探测（可加 proxy=代理URL）
+    GET    /api/dirsize?path=...                   目录大小
+    GET    /metrics                                Prometheus 格式监控指标
+    POST   /api/jobs                               创建长任务，返回任务ID
+    GET    /api/jobs                               任务列表
+    GET    /api/jobs/<id>?offset=N                 轮询任务状态与结果
+    GET    /api/jobs/<id>/stream                   以分块传输流式返回结果（NDJSON）
+    DELETE /api/jobs/<id>                          取消任务
+
+默认只监听本机；监听其他地址时必须配置访问令牌，每个请求都要携带
+"Authorization: Bearer <令牌>" 请求头，否则返回 401。
+
+所有阻塞操作都在固定大小的线程池中执行，客户端再多也不会无限制地创建线程。
+其中 INTERACTIVE_WORKERS 个线程单独留给单次调用，长任务再多也不会让它们排队。
+"""
+import asyncio
+import hmac
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+from src.core.agent import run_probe
+from src.core.file_system import FileSystemOperations
+from src.core.metrics import REGISTRY, CONTENT_TYPE
+from src.core.network import NetworkOperations
+from src.core.utils import is_loopback, logger
+from src.config.settings import ApiSettings as Settings
+
+
+class ApiError(Exception):
+    """接口错误，携带HTTP状态码"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiJob:
+    """长任务：由若干探测目标组成，结果逐条追加"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_type: str, targets: List, protocol: str = "TCP",
+                 proxy: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.type = job_type
+        self.targets = targets
+        self.protocol = protocol
+        self.proxy = proxy
+        self.status = self.PENDING
+        self.results: List[dict] = []
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Condition()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.DONE, self.CANCELLED)
+
+    def summary(self) -> dict:
+        """任务概要"""
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'total': len(self.targets),
+            'completed': len(self.results),
+            'created': self.created,
+            'finished': self.finished,
+        }
+
+    async def notify(self):
+        """唤醒正在等待新结果的流式客户端"""
+        async with self.changed:
+            self.changed.notify_all()
+
+
+class ApiServer:
+    """HTTP/JSON 接口服务"""
+
+    JOB_TYPES = ('ping', 'dns', 'scan', 'dirsize')
+
+    def __init__(self, host: str = Settings.DEFAULT_HOST, port: int = Settings.DEFAULT_PORT,
+                 max_workers: int = Settings.MAX_WORKERS, token: Optional[str] = None):
+        self.token = token or None
+        self.check_binding(host, self.token)
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+        reserved = min(Settings.INTERACTIVE_WORKERS, max_workers - 1) if max_workers > 1 else 0
+        # 长任务使用 executor，单次调用使用 interactive_executor（线程数为保留的部分）
+        self.executor = ThreadPoolExecutor(max_workers=max_workers - reserved,
+                                           thread_name_prefix="api-worker")
+        self.interactive_executor = (ThreadPoolExecutor(max_workers=reserved,
+                                                        thread_name_prefix="api-interactive")
+                                     if reserved else self.executor)
+        self.jobs: Dict[str, ApiJob] = {}
+        self._busy_workers = 0
+        self._busy_lock = threading.Lock()
+        REGISTRY.gauge("api_workers_busy", "接口线程池中忙碌的线程数").set_function(
+            lambda: self._busy_workers)
+        REGISTRY.gauge("api_workers_total", "接口线程池大小").set_function(
+            lambda: self.max_workers)
+        REGISTRY.gauge("api_active_jobs", "运行中的接口任务数").set_function(
+            lambda: sum(1 for job in self.jobs.values() if not job.is_finished))
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    async def start(self):
+        """启动服务"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"HTTP接口服务已启动: http://{self.host}:{self.port}")
+        return self
+
+    async def serve_forever(self):
+        """启动服务并一直运行"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        """停止服务并取消所有任务"""
+        for job in list(self.jobs.values()):
+            if job.task and not job.task.done():
+                job.task.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=False)
+        self.interactive_executor.shutdown(wait=False)
+
+    # ------------------------------------------------------------------
+    # HTTP 协议处理
+    # ------------------------------------------------------------------
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter):
+        """处理单个HTTP连接（每个连接一个请求）"""
+        try:
+            method, path, query, headers, body = await self._read_request(reader)
+            self._authorize(headers)
+            await self._dispatch(method, path, query, body, writer)
+        except ApiError as e:
+            await self._send_json(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"处理接口请求失败: {str(e)}")
+            try:
+                await self._send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, dict, dict, object]:
+        """读取并解析HTTP请求"""
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            raise ConnectionError("空请求")
+        try:
+            method, target, _ = request_line.split(' ', 2)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "无效的请求行")
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = None
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "无效的 Content-Length")
+        if length < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "无效的 Content-Length")
+        if length > Settings.MAX_BODY_SIZE:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+        if length:
+            raw = await reader.readexactly(length)
+            try:
+                body = json.loads(raw.decode('utf-8'))
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "请求体不是有效的JSON")
+
+        parts = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        return method.upper(), parts.path.rstrip('/') or '/', query, headers, body
+
+    @staticmethod
+    def check_binding(host: str, token: Optional[str]):
+        """监听非本机地址但未设置令牌时抛出 ValueError"""
+        if not token and not is_loopback(host):
+            raise ValueError(f"接口服务监听 {host} 时必须设置访问令牌（--token 或环境变量 "
+                             f"{Settings.TOKEN_ENV}），否则任何人都能用它发起探测")
+
+    def _authorize(self, headers: dict):
+        """校验访问令牌（未设置令牌时只监听本机，不做校验）"""
+        if self.token is None:
+            return
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(
+                token.strip().encode('utf-8'), self.token.encode('utf-8')):
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "缺少或无效的访问令牌")
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, payload):
+        """发送JSON响应"""
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        status = HTTPStatus(status)
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + data)
+        await writer.drain()
+
+    @staticmethod
+    async def _send_text(writer: asyncio.StreamWriter, status: int, text: str,
+                         content_type: str):
+        """发送文本响应"""
+        data = text.encode('utf-8')
+        status = HTTPStatus(status)
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + data)
+        await writer.drain()
+
+    @staticmethod
+    async def _write_chunk(writer: asyncio.StreamWriter, payload: dict):
+        """以分块传输编码写出一行JSON"""
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8') + b"\n"
+        writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+        await writer.drain()
+
+    async def _dispatch(self, method: str, path: str, query: dict, body,
+                        writer: asyncio.StreamWriter):
+        """根据路径分发请求"""
+        self._purge_jobs()
+        if path == '/metrics' and method == 'GET':
+            await self._send_text(writer, HTTPStatus.OK, REGISTRY.render(), CONTENT_TYPE)
+            return
+
+        parts = path.strip('/').split('/')
+
+        if parts[:1] != ['api'] or len(parts) < 2:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"未知的路径: {path}")
+
+        if parts[1] == 'jobs':
+            if len(parts) == 2:
+                if method == 'GET':
+                    await self._send_json(writer, HTTPStatus.OK,
+                                          [job.summary() for job in self.jobs.values()])
+                    return
+                if method == 'POST':
+                    job = self._create_job(body or {})
+                    await self._send_json(writer, HTTPStatus.ACCEPTED, job.summary())
+                    return
+            else:
+                job = self.jobs.get(parts[2])
+                if job is None:
+                    raise ApiError(HTTPStatus.NOT_FOUND, f"任务不存在: {parts[2]}")
+                if len(parts) == 4 and parts[3] == 'stream' and method == 'GET':
+                    await self._stream_job(job, writer)
+                    return
+                if len(parts) == 3 and method == 'GET':
+                    try:
+                        offset = int(query.get('offset', 0) or 0)
+                    except ValueError:
+                        raise ApiError(HTTPStatus.BAD_REQUEST, "无效的 offset")
+                    if offset < 0:
+                        raise ApiError(HTTPStatus.BAD_REQUEST, "无效的 offset")
+                    payload = job.summary()
+                    payload['results'] = job.results[offset:]
+                    await self._send_json(writer, HTTPStatus.OK, payload)
+                    return
+                if len(parts) == 3 and method == 'DELETE':
+                    self._cancel_job(job)
+                    await self._send_json(writer, HTTPStatus.OK, job.summary())
+                    return
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"不支持的请求: {method} {path}")
+
+        if method != 'GET' or len(parts) != 2:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"不支持的请求: {method} {path}")
+        success, result = await self._run_single(parts[1], query)
+        await self._send_json(writer, HTTPStatus.OK, {'success': success, 'result': result})
+
+    # ------------------------------------------------------------------
+    # 单次调用
+    # ------------------------------------------------------------------
+    async def _run_in_pool(self, function, *args, interactive: bool = False):
+        """在线程池中执行阻塞调用并统计忙碌线程数（interactive 时使用保留的线程）"""
+        def run():
+            with self._busy_lock:
+                self._busy_workers += 1
+            try:
+                return function(*args)
+            finally:
+                with self._busy_lock:
+                    self._busy_workers -= 1
+
+        executor = self.interactive_executor if interactive else self.executor
+        return await asyncio.get_running_loop().run_in_executor(executor, run)
+
+    async def _run_single(self, operation: str, query: dict):
+        """在线程池中执行单次调用"""
+        try:
+            if operation == 'ping':
+                return await self._run_in_pool(run_probe, 'ping', self._require(query, 'host'),
+                                               interactive=True)
+            if operation == 'dns':
+                return await self._run_in_pool(run_probe, 'dns', self._require(query, 'domain'),
+                                               interactive=True)
+            if operation == 'scan':
+                target = (self._require(query, 'host'), int(self._require(query, 'port')))
+                return await self._run_in_pool(run_probe, 'scan', target,
+                                               query.get('protocol', 'TCP').upper(),
+                                               query.get('proxy') or None, interactive=True)
+            if operation == 'dirsize':
+                return await self._run_in_pool(self._dir_size, self._require(query, 'path'),
+                                               interactive=True)
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        raise ApiError(HTTPStatus.NOT_FOUND, f"未知的操作: {operation}")
+
+    @staticmethod
+    def _require(query: dict, name: str) -> str:
+        """获取必需的查询参数"""
+        value = query.get(name, '').strip()
+        if not value:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"缺少参数: {name}")
+        return value
+
+    @staticmethod
+    def _dir_size(path: str) -> Tuple[bool, dict]:
+        """计算目录大小"""
+        size = FileSystemOperations.get_file_size(path)
+        return True, {'path': path, 'size': size,
+                      'formatted': FileSystemOperations.format_size(size)}
+
+    # ------------------------------------------------------------------
+    # 长任务
+    # ------------------------------------------------------------------
+    def _create_job(self, spec: dict) -> ApiJob:
+        """根据请求创建并启动任务"""
+        job_type = spec.get('type')
+        if job_type not in self.JOB_TYPES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"未知的任务类型: {job_type}")
+
+        active = sum(1 for job in self.jobs.values() if not job.is_finished)
+        if active >= Settings.MAX_ACTIVE_JOBS:
+            raise ApiError(HTTPStatus.TOO_MANY_REQUESTS, "运行中的任务过多，请稍后重试")
+
+        try:
+            targets = self._job_targets(job_type, spec)
+        except (ValueError, TypeError) as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        if not targets:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "任务没有目标")
+
+        job = ApiJob(job_type, targets, str(spec.get('protocol', 'TCP')).upper(),
+                     spec.get('proxy') or None)
+        self.jobs[job.id] = job
+        job.task = asyncio.ensure_future(self._run_job(job))
+        logger.info(f"创建接口任务 {job.id} ({job_type}, {len(targets)} 个目标)")
+        return job
+
+    @staticmethod
+    def _job_targets(job_type: str, spec: dict) -> List:
+        """把任务描述展开为目标列表，超过 MAX_JOB_TARGETS 时抛出 ValueError
+
+        主机和端口在展开过程中即按上限检查，端口扫描先核对 主机数 x 端口数
+        再组合，一个请求不会在事件循环里生成海量目标。
+        """
+        limit = Settings.MAX_JOB_TARGETS
+        targets = spec.get('targets', [])
+        if isinstance(targets, str):
+            targets = (NetworkOperations.expand_targets(targets, limit)
+                       if job_type != 'dirsize' else [targets])
+        if not isinstance(targets, list):
+            raise ValueError("targets 必须是字符串或列表")
+        if job_type == 'scan':
+            ports = spec.get('ports', [])
+            if isinstance(ports, str):
+                ports = NetworkOperations.parse_ports(ports, limit)
+            if not isinstance(ports, list):
+                raise ValueError("ports 必须是字符串或列表")
+            if len(targets) * len(ports) > limit:
+                raise ValueError(f"目标过多: {len(targets)} 个主机 x {len(ports)} 个端口"
+                                 f"（上限 {limit} 个）")
+            return [(host, int(port)) for host in targets for port in ports]
+        if len(targets) > limit:
+            raise ValueError(f"目标过多（上限 {limit} 个）")
+        return list(targets)
+
+    async def _run_job(self, job: ApiJob):
+        """执行任务：固定数量的协程依次领取目标，逐条记录结果
+
+        协程数不超过 JOB_CONCURRENCY，目标再多也不会预先为每个目标创建协程。
+        """
+        job.status = ApiJob.RUNNING
+        targets = iter(job.targets)
+
+        async def worker():
+            for target in targets:
+                try:
+                    if job.type == 'dirsize':
+                        success, result = await self._run_in_pool(self._dir_size, target)
+                    else:
+                        success, result = await self._run_in_pool(
+                            run_probe, job.type, target, job.protocol, job.proxy)
+                except Exception as e:
+                    success, result = False, str(e)
+                job.results.append({'target': target, 'success': success, 'result': result})
+                await job.notify()
+
+        workers = [asyncio.ensure_future(worker())
+                   for _ in range(min(Settings.JOB_CONCURRENCY, len(job.targets)))]
+        try:
+            await asyncio.gather(*workers)
+            job.status = ApiJob.DONE
+        except asyncio.CancelledError:
+            # gather 被取消时会一并取消各个工作协程
+            job.status = ApiJob.CANCELLED
+        finally:
+            job.finished = time.time()
+            await job.notify()
+
+    def _cancel_job(self, job: ApiJob):
+        """取消任务，尚未开始的目标不再执行"""
+        if job.task and not job.task.done():
+            job.task.cancel()
+            logger.info(f"已取消接口任务 {job.id}")
+
+    async def _stream_job(self, job: ApiJob, writer: asyncio.StreamWriter):
+        """以分块传输流式输出任务结果，任务结束后发送概要"""
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: application/x-ndjson; charset=utf-8\r\n"
+                     b"Transfer-Encoding: chunked\r\n"
+                     b"Connection: close\r\n\r\n")
+        sent = 0
+        while True:
+            async with job.changed:
+                if sent >= len(job.results) and not job.is_finished:
+                    await job.changed.wait()
+            while sent < len(job.results):
+                await self._write_chunk(writer, job.results[sent])
+                sent += 1
+            if job.is_finished and sent >= len(job.results):
+                break
+        await self._write_chunk(writer, job.summary())
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def _purge_jobs(self):
+        """清理过期的已结束任务"""
+        expire_before = time.time() - Settings.JOB_RETENTION
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.is_finished and job.finished < expire_before]:
+            del self.jobs[job_id]
+
+
+def run_server(host: str = Settings.DEFAULT_HOST, port: int = Settings.DEFAULT_PORT,
+               max_workers: int = Settings.MAX_WORKERS, token: Optional[str] = None):
+    """运行接口服务直到被中断"""
+    server = ApiServer(host, port, max_workers, token)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,439 @@
+"""TCP长连接健康监控
+
+对大量服务保持长连接（可选应用层心跳），所有连接在一个线程里通过
+selectors（Linux 下为 epoll）多路复用。连接断开、重连以及重连耗时在
+检测到的当下即通过回调上报，比反复执行 _scan_tcp_port 的短连接探测
+开销更小，也能发现两次采样之间的闪断。
+
+解析出多个候选地址的目标（如双栈）按 RFC 8305 在同一个 selector 里竞速建连：
+每隔 CONNECTION_ATTEMPT_DELAY 秒（或上一次尝试失败时立即）对下一个候选地址
+发起非阻塞连接，最先可写且连接成功的套接字胜出，其余尝试随即关闭。
+"""
+import errno
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from src.core.metrics import REGISTRY
+from src.core.network import NetworkOperations
+from src.core.utils import logger
+from src.config.settings import CONNECTION_ATTEMPT_DELAY, MonitorSettings as Settings
+
+CONNECTING = "connecting"
+UP = "up"
+DOWN = "down"
+
+MONITOR_EVENTS = REGISTRY.counter("monitor_events_total", "长连接监控事件计数", ("event",))
+RECONNECT_SECONDS = REGISTRY.histogram("monitor_reconnect_seconds", "长连接从断开到恢复的耗时（秒）",
+                                       buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300))
+
+
+class MonitoredConnection:
+    """被监控的单个连接"""
+    __slots__ = ('key', 'host', 'port', 'address', 'family', 'candidates', 'heartbeat', 'interval',
+                 'sock', 'attempts', 'next_candidate', 'next_attempt_at', 'last_error',
+                 'state', 'connect_started', 'down_since', 'last_change',
+                 'heartbeat_sent', 'awaiting_reply', 'retry_delay', 'generation',
+                 'connect_latency', 'heartbeat_rtt', 'disconnects')
+
+    def __init__(self, key: int, host: str, port: int, heartbeat: Optional[bytes],
+                 interval: float):
+        self.key = key
+        self.host = host
+        self.port = port
+        self.address = None
+        self.family = socket.AF_INET
+        self.candidates: List[Tuple[int, tuple]] = []
+        self.heartbeat = heartbeat
+        self.interval = interval
+        self.sock: Optional[socket.socket] = None
+        # 建连过程中尚未结束的尝试：套接字 -> (地址族, 套接字地址)
+        self.attempts: Dict[socket.socket, Tuple[int, tuple]] = {}
+        self.next_candidate = 0
+        self.next_attempt_at = 0.0
+        self.last_error: Optional[str] = None
+        self.state = DOWN
+        self.connect_started = 0.0
+        self.down_since: Optional[float] = None
+        self.last_change = time.time()
+        self.heartbeat_sent = 0.0
+        self.awaiting_reply = False
+        self.retry_delay = Settings.RECONNECT_DELAY
+        self.generation = 0
+        self.connect_latency: Optional[float] = None
+        self.heartbeat_rtt: Optional[float] = None
+        self.disconnects = 0
+
+    @property
+    def name(self) -> str:
+        host = f"[{self.host}]" if ':' in self.host else self.host
+        return f"{host}:{self.port}"
+
+    def snapshot(self) -> dict:
+        return {
+            'target': self.name,
+            'state': self.state,
+            'since': self.last_change,
+            'connect_latency_ms': _ms(self.connect_latency),
+            'heartbeat_rtt_ms': _ms(self.heartbeat_rtt),
+            'disconnects': self.disconnects,
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class ConnectionMonitor:
+    """单线程多路复用的TCP长连接监控器
+
+    callback 在监控线程中被调用，参数为事件字典：
+        {'target', 'event': 'up'|'down'|'connect_failed', 'time', 'reason',
+         'connect_latency_ms', 'downtime_ms'}
+    """
+
+    def __init__(self, callback: Optional[Callable[[dict], None]] = None,
+                 heartbeat_timeout: float = Settings.HEARTBEAT_TIMEOUT,
+                 connect_timeout: float = Settings.CONNECT_TIMEOUT,
+                 keepalive: bool = True):
+        self.callback = callback
+        self.heartbeat_timeout = heartbeat_timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive = keepalive
+        self._selector = selectors.DefaultSelector()
+        self._connections: Dict[int, MonitoredConnection] = {}
+        self._timers: List[Tuple[float, int, int, int, str]] = []
+        self._sequence = itertools.count()
+        self._keys = itertools.count(1)
+        self._commands: List[Tuple[str, object]] = []
+        self._lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        gauge = REGISTRY.gauge("monitor_connections", "被监控的连接数", ("state",))
+        for state in (UP, DOWN, CONNECTING):
+            gauge.labels(state).set_function(
+                lambda state=state: sum(1 for c in list(self._connections.values())
+                                        if c.state == state))
+
+    # ------------------------------------------------------------------
+    # 公共接口（可在任意线程调用）
+    # ------------------------------------------------------------------
+    def add(self, host: str, port: int, heartbeat: Optional[bytes] = None,
+            interval: float = Settings.HEARTBEAT_INTERVAL) -> int:
+        """添加监控目标，返回目标键"""
+        key = next(self._keys)
+        connection = MonitoredConnection(key, host, port, heartbeat, interval)
+        # 在调用方线程解析地址，避免阻塞监控线程
+        try:
+            connection.candidates = NetworkOperations.resolve_addresses(host, port)
+            connection.family, connection.address = connection.candidates[0]
+        except OSError as e:
+            logger.warning(f"解析监控目标失败 {connection.name}: {str(e)}")
+        self._submit('add', connection)
+        return key
+
+    def remove(self, key: int):
+        """移除监控目标"""
+        self._submit('remove', key)
+
+    def snapshot(self) -> List[dict]:
+        """所有连接的当前状态"""
+        return [c.snapshot() for c in list(self._connections.values())]
+
+    def start(self):
+        """启动监控线程"""
+        if not self._running and self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止监控并关闭所有连接"""
+        self._running = False
+        self._wake()
+        if self._thread:
+            self._thread.join()
+        for connection in self._connections.values():
+            self._close(connection)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def _submit(self, command: str, argument):
+        with self._lock:
+            self._commands.append((command, argument))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    # ------------------------------------------------------------------
+    # 事件循环
+    # ------------------------------------------------------------------
+    def _run(self):
+        while self._running:
+            timeout = None
+            if self._timers:
+                timeout = max(0.0, self._timers[0][0] - time.monotonic())
+            for selector_key, events in self._selector.select(timeout):
+                connection = selector_key.data
+                if connection is None:
+                    self._drain_wakeup()
+                    continue
+                try:
+                    if connection.state == CONNECTING:
+                        self._on_connect_ready(connection, selector_key.fileobj)
+                    elif events & selectors.EVENT_READ:
+                        self._on_readable(connection)
+                except Exception as e:
+                    logger.error(f"长连接监控处理 {connection.name} 失败: {str(e)}")
+                    self._mark_down(connection, str(e))
+            self._process_commands()
+            self._run_timers()
+
+    def _drain_wakeup(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _process_commands(self):
+        with self._lock:
+            commands, self._commands = self._commands, []
+        for command, argument in commands:
+            if command == 'add':
+                self._connections[argument.key] = argument
+                self._start_connect(argument)
+            elif command == 'remove':
+                connection = self._connections.pop(argument, None)
+                if connection:
+                    connection.generation += 1
+                    self._close(connection)
+
+    def _schedule(self, delay: float, connection: MonitoredConnection, action: str):
+        heapq.heappush(self._timers, (time.monotonic() + delay, next(self._sequence),
+                                      connection.key, connection.generation, action))
+
+    def _run_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, key, generation, action = heapq.heappop(self._timers)
+            connection = self._connections.get(key)
+            # 连接状态变化后旧定时器自动失效
+            if connection is None or connection.generation != generation:
+                continue
+            if action == 'connect':
+                self._start_connect(connection)
+            elif action == 'next_attempt':
+                # 较早安排的定时器在尝试失败、提前发起下一次后已过时
+                if connection.state == CONNECTING and now >= connection.next_attempt_at:
+                    self._next_attempt(connection)
+            elif action == 'connect_timeout':
+                self._mark_down(connection, "建连超时")
+            elif action == 'heartbeat':
+                self._send_heartbeat(connection)
+            elif action == 'heartbeat_timeout':
+                if connection.awaiting_reply:
+                    self._mark_down(connection, "心跳超时")
+
+    # ------------------------------------------------------------------
+    # 连接状态机
+    # ------------------------------------------------------------------
+    def _start_connect(self, connection: MonitoredConnection):
+        """对候选地址发起非阻塞连接，多个候选地址时错开发起、竞速建连"""
+        connection.generation += 1
+        try:
+            if connection.address is None:
+                connection.candidates = NetworkOperations.resolve_addresses(
+                    connection.host, connection.port)
+                connection.family, connection.address = connection.candidates[0]
+        except OSError as e:
+            self._connect_failed(connection, str(e))
+            return
+        connection.state = CONNECTING
+        connection.connect_started = time.monotonic()
+        connection.next_candidate = 0
+        connection.last_error = None
+        if self._next_attempt(connection):
+            self._schedule(self.connect_timeout, connection, 'connect_timeout')
+
+    def _next_attempt(self, connection: MonitoredConnection) -> bool:
+        """对下一个候选地址发起连接
+
+        立即失败的地址直接跳过；全部候选地址都已失败时上报建连失败并返回False。
+        """
+        while connection.next_candidate < len(connection.candidates):
+            family, address = connection.candidates[connection.next_candidate]
+            connection.next_candidate += 1
+            sock = None
+            try:
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if self.keepalive:
+                    self._enable_keepalive(sock)
+                result = sock.connect_ex(address)
+            except OSError as e:
+                if sock is not None:
+                    sock.close()
+                connection.last_error = errno.errorcode.get(e.errno, str(e))
+                continue
+            if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK,
+                              getattr(errno, 'WSAEWOULDBLOCK', -1)):
+                sock.close()
+                connection.last_error = errno.errorcode.get(result, str(result))
+                continue
+            connection.attempts[sock] = (family, address)
+            self._selector.register(sock, selectors.EVENT_WRITE, connection)
+            if connection.next_candidate < len(connection.candidates):
+                connection.next_attempt_at = time.monotonic() + CONNECTION_ATTEMPT_DELAY
+                self._schedule(CONNECTION_ATTEMPT_DELAY, connection, 'next_attempt')
+            return True
+        if not connection.attempts:
+            self._connect_failed(connection, connection.last_error or "没有可用的地址")
+            return False
+        return True
+
+    @staticmethod
+    def _enable_keepalive(sock: socket.socket):
+        """开启TCP keepalive，在没有应用层心跳时也能发现静默断开"""
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (('TCP_KEEPIDLE', Settings.KEEPALIVE_IDLE),
+                              ('TCP_KEEPINTVL', Settings.KEEPALIVE_INTERVAL),
+                              ('TCP_KEEPCNT', Settings.KEEPALIVE_COUNT)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    def _on_connect_ready(self, connection: MonitoredConnection, sock: socket.socket):
+        """某次连接尝试结束：失败时立即尝试下一个地址，成功则关闭其余尝试"""
+        if sock not in connection.attempts:
+            # 同一轮 select 中已随其他尝试胜出而关闭
+            return
+        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self._selector.unregister(sock)
+            sock.close()
+            del connection.attempts[sock]
+            connection.last_error = errno.errorcode.get(error, str(error))
+            self._next_attempt(connection)
+            return
+
+        connection.family, connection.address = connection.attempts.pop(sock)
+        self._close(connection)
+        connection.sock = sock
+
+        now = time.monotonic()
+        connection.generation += 1
+        connection.connect_latency = now - connection.connect_started
+        connection.state = UP
+        connection.last_change = time.time()
+        connection.retry_delay = Settings.RECONNECT_DELAY
+        connection.awaiting_reply = False
+        self._selector.modify(connection.sock, selectors.EVENT_READ, connection)
+
+        downtime = None
+        if connection.down_since is not None:
+            downtime = now - connection.down_since
+            RECONNECT_SECONDS.observe(downtime)
+            connection.down_since = None
+        self._emit(connection, 'up', connect_latency_ms=_ms(connection.connect_latency),
+                   downtime_ms=_ms(downtime))
+        if connection.heartbeat:
+            self._schedule(connection.interval, connection, 'heartbeat')
+
+    def _on_readable(self, connection: MonitoredConnection):
+        """读取对端数据；收到 FIN 或 RST 即判定断开"""
+        try:
+            data = connection.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._mark_down(connection, errno.errorcode.get(e.errno, str(e)))
+            return
+        if not data:
+            self._mark_down(connection, "对端关闭连接")
+            return
+        if connection.awaiting_reply:
+            connection.awaiting_reply = False
+            connection.heartbeat_rtt = time.monotonic() - connection.heartbeat_sent
+
+    def _send_heartbeat(self, connection: MonitoredConnection):
+        """发送应用层心跳并等待应答"""
+        try:
+            connection.sock.send(connection.heartbeat)
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            self._mark_down(connection, errno.errorcode.get(e.errno, str(e)))
+            return
+        connection.heartbeat_sent = time.monotonic()
+        connection.awaiting_reply = True
+        self._schedule(self.heartbeat_timeout, connection, 'heartbeat_timeout')
+        self._schedule(connection.interval, connection, 'heartbeat')
+
+    def _mark_down(self, connection: MonitoredConnection, reason: str):
+        """连接断开：上报并安排立即重连"""
+        was_up = connection.state == UP
+        self._close(connection)
+        if not was_up:
+            self._connect_failed(connection, reason)
+            return
+        connection.generation += 1
+        connection.state = DOWN
+        connection.last_change = time.time()
+        connection.down_since = time.monotonic()
+        connection.disconnects += 1
+        self._emit(connection, 'down', reason=reason)
+        self._schedule(connection.retry_delay, connection, 'connect')
+
+    def _connect_failed(self, connection: MonitoredConnection, reason: str):
+        """建连失败：按指数退避重试"""
+        connection.generation += 1
+        if connection.state != DOWN:
+            connection.last_change = time.time()
+        connection.state = DOWN
+        if connection.down_since is None:
+            connection.down_since = time.monotonic()
+        self._emit(connection, 'connect_failed', reason=reason)
+        self._schedule(connection.retry_delay, connection, 'connect')
+        connection.retry_delay = min(connection.retry_delay * 2, Settings.MAX_RECONNECT_DELAY)
+
+    def _close(self, connection: MonitoredConnection):
+        """关闭连接及所有尚未结束的建连尝试"""
+        socks = list(connection.attempts)
+        connection.attempts.clear()
+        if connection.sock is not None:
+            socks.append(connection.sock)
+            connection.sock = None
+        for sock in socks:
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+            sock.close()
+
+    def _emit(self, connection: MonitoredConnection, event: str, **details):
+        MONITOR_EVENTS.labels(event).inc()
+        message = {'target': connection.name, 'event': event, 'time': time.time()}
+        message.update(details)
+        if event == 'connect_failed':
+            logger.debug(f"长连接 {connection.name} 建连失败: {details.get('reason')}")
+        else:
+            logger.info(f"长连接 {connection.name} {event} {details}")
+        if self.callback:
+            try:
+                self.callback(message)
+            except Exception as e:
+                logger.error(f"长连接监控回调失败: {str(e)}")
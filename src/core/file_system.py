@@ -1,16 +1,21 @@
 """文件系统操作"""
 import os
 import stat
-import json
+import sqlite3
 import time
 import psutil
 import gc
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
-from src.core.utils import format_size, format_timestamp, logger
+from src.core.utils import format_size, format_timestamp, logger, get_user_cache_dir
+from src.core.metrics import REGISTRY
+from src.core.size_engine import get_size_engine
+from src.core.size_index import SizeIndex
+from src.core.size_store import SizeStore
+from src.core.size_scheduler import SizeScheduler, PRIORITY_CURRENT, PRIORITY_VISIBLE
+from src.core.fs_watcher import DirectoryWatcher
 from src.config.settings import FileSystemSettings as Settings
-from threading import Lock, Thread
-from queue import Queue, Empty
+from threading import Lock
 import sys
 
 class FileSystemOperations:
@@ -19,14 +24,12 @@ class FileSystemOperations:
     SIZE_UNKNOWN = Settings.SIZE_UNKNOWN
     
     # 其他类属性
-    _size_cache = {}
-    _cache_lock = Lock()
-    _size_calc_queue = Queue(maxsize=Settings.MAX_QUEUE_SIZE)
-    _background_thread = None
-    _is_running = False
-    _current_directory = None
-    _last_save_time = 0
-    _cache_modified = False
+    _size_index = SizeIndex()
+    _scheduler = None
+    _store_lock = Lock()
+    _watcher = None
+    _watch_listener = None
+    _shown_directory = None
 
     @classmethod
     def _check_memory_usage(cls):
@@ -47,13 +50,21 @@ class FileSystemOperations:
             return True
 
     @classmethod
-    def _scan_directory(cls, directory):
-        """使用生成器方式扫描目录"""
+    def _scan_directory(cls, directory, cancel=None, size_callback=None):
+        """使用生成器方式扫描目录
+
+        每攒够 BATCH_SIZE 项、或距上一批超过 BATCH_INTERVAL 时产出一批，
+        慢速挂载点上也能尽快拿到第一批；cancel（threading.Event）置位后停止。
+        未缓存大小的子目录交给后台调度器计算，完成后调用 size_callback(路径, 大小)。
+        """
         batch = []
         file_count = 0
+        deadline = time.monotonic() + Settings.BATCH_INTERVAL
         try:
             with os.scandir(directory) as entries:
                 for entry in entries:
+                    if cancel is not None and cancel.is_set():
+                        return
                     try:
                         file_count += 1
                         
@@ -79,22 +90,18 @@ class FileSystemOperations:
                                 info['size'] = 0
                                 info['size_status'] = cls.SIZE_UNKNOWN
                         else:
-                            cached_size = cls._get_cached_size(entry.path)
+                            # 列目录时只取未校验的缓存值，不逐个 stat 子树；
+                            # 校验（或首次统计）交给后台调度器，有变化时通过回调更新
+                            cached_size = cls._peek_cached_size(entry.path)
                             if cached_size is not None:
                                 info['size'] = cached_size
                             else:
                                 info['size'] = 0
                                 info['size_status'] = cls.SIZE_CALCULATING
-                                if cls._size_calc_queue.qsize() < Settings.MAX_QUEUE_SIZE:
-                                    cls._size_calc_queue.put((directory, info, None))
+                            cls.request_size(entry.path, size_callback)
 
                         batch.append(info)
-                        
-                        if len(batch) >= Settings.BATCH_SIZE:
-                            yield batch
-                            batch = []
-                            gc.collect()
-                            
+
                     except (PermissionError, OSError) as e:
                         logger.warning(f"无法获取文件信息 {entry.path}: {str(e)}")
                         batch.append({
@@ -106,7 +113,12 @@ class FileSystemOperations:
                             'size_status': cls.SIZE_UNKNOWN
                         })
 
-            if batch:
+                    if len(batch) >= Settings.BATCH_SIZE or time.monotonic() >= deadline:
+                        yield batch
+                        batch = []
+                        deadline = time.monotonic() + Settings.BATCH_INTERVAL
+
+            if batch and not (cancel is not None and cancel.is_set()):
                 yield batch
 
         except Exception as e:
@@ -115,163 +127,188 @@ class FileSystemOperations:
 
     @classmethod
     def _load_cache(cls):
-        """从文件加载缓存"""
-        try:
-            cache_path = os.path.join(os.path.dirname(__file__), Settings.CACHE_FILE)
-            if os.path.exists(cache_path):
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    with cls._cache_lock:
-                        cls._size_cache = cache_data
-                    logger.info("已加载目录大小缓存")
-        except Exception as e:
-            logger.error(f"加载缓存失败: {str(e)}")
-            cls._size_cache = {}
+        """打开持久化缓存（按路径查询，不整体加载）"""
+        if cls._size_index.store is not None:
+            return
+        with cls._store_lock:
+            if cls._size_index.store is not None:
+                return
+            try:
+                cache_path = os.path.join(get_user_cache_dir(), Settings.CACHE_FILE)
+                cls._size_index.store = SizeStore(cache_path)
+                logger.info(f"已打开目录大小缓存: {cache_path}")
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"打开缓存失败，仅使用内存缓存: {str(e)}")
 
     @classmethod
-    def _save_cache(cls, force=False):
-        """保存缓存到文件"""
+    def _save_cache(cls):
+        """把待写的缓存记录写入数据库"""
         try:
-            current_time = time.time()
-            # 检查是否需要保存（避免频繁写入）
-            if not force and (current_time - cls._last_save_time < 60):  # 至少间隔60秒
-                return
-
-            if cls._cache_modified or force:
-                cache_path = os.path.join(os.path.dirname(__file__), Settings.CACHE_FILE)
-                with open(cache_path, 'w', encoding='utf-8') as f:
-                    json.dump(cls._size_cache, f, indent=2)
-                cls._last_save_time = current_time
-                cls._cache_modified = False
-                logger.info("已保存目录大小缓存")
+            cls._size_index.flush()
         except Exception as e:
             logger.error(f"保存缓存失败: {str(e)}")
 
     @classmethod
-    def _get_dir_modification_time(cls, path):
-        """获取目录的最新修改时间"""
+    def _peek_cached_size(cls, path):
+        """获取缓存的大小（不校验）"""
         try:
-            latest_time = os.path.getmtime(path)
-            for root, dirs, files in os.walk(path):
-                for name in files + dirs:
-                    try:
-                        file_path = os.path.join(root, name)
-                        mtime = os.path.getmtime(file_path)
-                        latest_time = max(latest_time, mtime)
-                    except (OSError, PermissionError):
-                        continue
-            return latest_time
-        except (OSError, PermissionError):
-            return 0
+            size = cls._size_index.peek(path)
+        except Exception as e:
+            logger.error(f"读取缓存失败 {path}: {str(e)}")
+            size = None
+        if size is None:
+            SIZE_CACHE_MISSES.inc()
+        else:
+            SIZE_CACHE_HITS.inc()
+        return size
 
     @classmethod
-    def _is_cache_valid(cls, path):
-        """检查缓存是否有效"""
+    def _get_cached_size(cls, path, cancel=None):
+        """获取缓存的大小（按目录索引增量校验）"""
         try:
-            with cls._cache_lock:
-                if path not in cls._size_cache:
-                    return False
-                
-                cache_data = cls._size_cache[path]
-                cache_time = cache_data.get('time', 0)
-                cache_mtime = cache_data.get('mtime', 0)
-                current_time = time.time()
-                
-                # 检查缓存是否过期
-                if current_time - cache_time > Settings.CACHE_EXPIRE_TIME:
-                    return False
-                
-                # 检查目录是否被修改
-                current_mtime = cls._get_dir_modification_time(path)
-                if current_mtime > cache_mtime:
-                    return False
-                
-                return True
-        except Exception:
-            return False
+            size = cls._size_index.get(path, cancel)
+        except Exception as e:
+            logger.error(f"校验缓存失败 {path}: {str(e)}")
+            size = None
+        if size is None:
+            SIZE_CACHE_MISSES.inc()
+        else:
+            SIZE_CACHE_HITS.inc()
+        return size
 
     @classmethod
-    def _get_cached_size(cls, path):
-        """获取缓存的大小"""
-        try:
-            if cls._is_cache_valid(path):
-                with cls._cache_lock:
-                    return cls._size_cache[path]['size']
-            return None
-        except Exception:
-            return None
+    def _get_scheduler(cls):
+        """后台目录大小计算调度器（首次使用时创建）"""
+        with cls._store_lock:
+            if cls._scheduler is None:
+                cls._scheduler = SizeScheduler(cls._compute_size)
+            return cls._scheduler
 
     @classmethod
-    def _set_cached_size(cls, path, size):
-        """设置缓存的大小"""
-        try:
-            with cls._cache_lock:
-                cls._size_cache[path] = {
-                    'size': size,
-                    'time': time.time(),
-                    'mtime': cls._get_dir_modification_time(path)
-                }
-                cls._cache_modified = True
-            
-            # 定期保存缓存
-            if cls._cache_modified:
-                cls._save_cache()
-        except Exception as e:
-            logger.error(f"设置缓存失败 {path}: {str(e)}")
+    def _compute_size(cls, path, cancel):
+        """调度器工作线程中计算目录大小，被取消时返回None
+
+        取消前已完整统计的子目录仍会写入大小缓存。
+        """
+        cls._load_cache()
+        size = cls._get_cached_size(path, cancel)
+        if size is None and not cancel.is_set():
+            result = cls._size_index.build(path, cancel=cancel)
+            cls._save_cache()
+            size = result.size
+        return None if cancel.is_set() else size
 
     @classmethod
-    def _start_background_thread(cls):
-        """启动后台计算线程"""
-        if not cls._is_running:
-            cls._is_running = True
-            cls._background_thread = Thread(target=cls._process_size_calc_queue, daemon=True)
-            cls._background_thread.start()
+    def request_size(cls, path, callback=None, priority=PRIORITY_CURRENT):
+        """把目录交给后台调度器计算，完成后在后台线程调用 callback(路径, 大小)
+
+        同一目录重复请求只计算一次。
+        """
+        cls._get_scheduler().submit(path, priority, callback)
+
+    @classmethod
+    def prioritize_sizes(cls, paths, priority=PRIORITY_VISIBLE):
+        """优先计算这些已在排队的目录（如列表中可见的行）"""
+        if cls._scheduler is not None:
+            cls._scheduler.prioritize(paths, priority)
+
+    @classmethod
+    def get_item_info(cls, path, size_callback=None):
+        """获取单个文件或目录的信息（格式同目录内容条目），不存在时返回None"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if not os.path.lexists(path):
+                return None
+            st = None
+        except OSError:
+            st = None
+        info = {
+            'name': os.path.basename(path),
+            'path': path,
+            'is_dir': st is not None and stat.S_ISDIR(st.st_mode),
+            'modified': st.st_mtime if st is not None else 0,
+            'size': 0,
+            'size_status': ''
+        }
+        if st is None:
+            info['size_status'] = cls.SIZE_UNKNOWN
+        elif not info['is_dir']:
+            info['size'] = st.st_size
+        else:
+            cached_size = cls._get_cached_size(path)
+            if cached_size is not None:
+                info['size'] = cached_size
+            else:
+                info['size_status'] = cls.SIZE_CALCULATING
+                cls.request_size(path, size_callback)
+        return info
 
     @classmethod
-    def _process_size_calc_queue(cls):
-        """处理大小计算队列的后台线程"""
-        while cls._is_running:
+    def start_watching(cls, listener=None):
+        """启用目录监视（仅 Linux inotify），返回是否可用
+
+        监视当前显示的目录和大小缓存中的目录，变化时使对应缓存失效，
+        再在监视线程中调用 listener(变化字典, 是否溢出)。
+        """
+        if not DirectoryWatcher.available():
+            return False
+        if cls._watcher is None:
             try:
-                directory, item, callback = cls._size_calc_queue.get(timeout=1)
-                if item is None:  # 退出信号
-                    break
-                
-                # 检查是否仍在当前目录
-                if directory != cls._current_directory:
-                    cls._size_calc_queue.task_done()
-                    continue
-
-                # 计算大小
-                size = cls.get_file_size(item['path'])
-                cls._set_cached_size(item['path'], size)
-                
-                if callback and directory == cls._current_directory:
-                    callback(item['path'], size)
-                
-                cls._size_calc_queue.task_done()
-            except Empty:
-                continue
-            except Exception as e:
-                logger.error(f"后台计算文件大小时出错: {str(e)}")
+                cls._watcher = DirectoryWatcher(cls._on_directory_changes).start()
+            except OSError as e:
+                logger.warning(f"无法启用目录监视: {str(e)}")
+                return False
+            cls._size_index.listener = cls._watcher.watch
+        cls._watch_listener = listener
+        return True
+
+    @classmethod
+    def watch_directory(cls, directory):
+        """监视当前显示的目录，之前显示的目录不在缓存中时停止监视"""
+        if cls._watcher is None:
+            return
+        previous, cls._shown_directory = cls._shown_directory, directory
+        if previous and previous != directory and previous not in cls._size_index:
+            cls._watcher.unwatch(previous)
+        cls._watcher.watch(directory, force=True)
+
+    @classmethod
+    def _on_directory_changes(cls, changes, overflow):
+        """使变化目录及其祖先的缓存失效，再通知界面"""
+        if overflow:
+            for path in cls._watcher.paths():
+                cls._size_index.invalidate(path)
+        for directory in changes:
+            cls._size_index.invalidate(directory, ancestors=True)
+        if cls._watch_listener:
+            cls._watch_listener(changes, overflow)
 
     @classmethod
     def get_directory_contents(cls, directory, size_callback=None):
         """获取目录内容"""
+        contents = []
+        parent = cls.parent_item(directory)
+        if parent is not None:
+            contents.append(parent)
+        for batch in cls.iter_directory_contents(directory, size_callback):
+            contents.extend(batch)
+        return contents
+
+    @classmethod
+    def iter_directory_contents(cls, directory, size_callback=None, cancel=None):
+        """逐批获取目录内容（不含 ".." 项），供后台线程流式加载
+
+        cancel 为 threading.Event，置位后尽快停止，不再产出后续批次。
+        size_callback(路径, 大小) 在后台线程中调用，界面需自行转交到主线程。
+        """
         if not directory:
             raise ValueError("目录路径不能为空")
 
-        cls._current_directory = directory
-        cls._start_background_thread()
-        
-        # 清空计算队列
-        while not cls._size_calc_queue.empty():
-            try:
-                cls._size_calc_queue.get_nowait()
-                cls._size_calc_queue.task_done()
-            except Empty:
-                break
+        # 与新目录无关的计算取消（已完成的子目录结果保留在缓存中）
+        if cls._scheduler is not None:
+            cls._scheduler.focus(directory)
 
-        contents = []
         try:
             if not os.path.exists(directory):
                 raise FileNotFoundError(f"目录不存在: {directory}")
@@ -279,108 +316,50 @@ class FileSystemOperations:
             if not os.path.isdir(directory):
                 raise NotADirectoryError(f"不是目录: {directory}")
 
-            # 添加上级目录项
-            parent = os.path.dirname(directory)
-            if parent != directory:
-                contents.append({
-                    'name': '..',
-                    'path': parent,
-                    'is_dir': True,
-                    'modified': 0,
-                    'size': 0,
-                    'size_status': ''
-                })
-
             # 使用生成器方式获取目录内容
-            for batch in cls._scan_directory(directory):
-                contents.extend(batch)
-                gc.collect()
+            yield from cls._scan_directory(directory, cancel, size_callback)
 
         except Exception as e:
             logger.error(f"读取目录失败 {directory}: {str(e)}")
             raise
 
-        return contents
+    @staticmethod
+    def parent_item(directory):
+        """目录的 ".." 项；根目录返回 None"""
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        return {
+            'name': '..',
+            'path': parent,
+            'is_dir': True,
+            'modified': 0,
+            'size': 0,
+            'size_status': ''
+        }
 
     @classmethod
-    def get_file_size(cls, path, depth=0):
-        """获取文件或目录的大小"""
-        try:
-            if depth == 0 and not cls._check_memory_usage():
-                logger.warning(f"内存使用较高，使用缓存或估算大小: {path}")
-                cached_size = cls._get_cached_size(path)
-                if cached_size is not None:
-                    return cached_size
-                try:
-                    return os.path.getsize(path)
-                except:
-                    return 0
-
-            if depth > Settings.MAX_DEPTH:
-                logger.warning(f"目录递归深度超过 {Settings.MAX_DEPTH} 层: {path}")
-                return 0
-
-            # 检查缓存
-            cached_size = cls._get_cached_size(path)
-            if cached_size is not None:
-                return cached_size
+    def get_file_size(cls, path, progress=None):
+        """获取文件或目录的大小
 
-            if not os.path.exists(path):
-                return 0
-
-            try:
-                st = os.lstat(path)
-            except (OSError, PermissionError) as e:
-                logger.error(f"无法获取文件状态 {path}: {str(e)}")
-                return 0
-
-            size = 0
-            try:
-                if stat.S_ISLNK(st.st_mode):
-                    size = st.st_size
-                elif stat.S_ISREG(st.st_mode):
-                    size = st.st_size
-                elif stat.S_ISDIR(st.st_mode):
-                    size = st.st_size
-                    try:
-                        for entry in os.scandir(path):
-                            # 定期检查内存使用情况
-                            if not cls._check_memory_usage():
-                                logger.warning(f"内存使用过高，停止计算目录大小: {path}")
-                                return size
-                            
-                            try:
-                                size += cls.get_file_size(entry.path, depth + 1)
-                            except (OSError, PermissionError) as e:
-                                logger.warning(f"计算文件大小失败 {entry.path}: {str(e)}")
-                                continue
-                            
-                            # 强制垃圾回收
-                            gc.collect()
-                            
-                    except (OSError, PermissionError) as e:
-                        logger.warning(f"无法访问目录 {path}: {str(e)}")
-
-                # 更新缓存
-                if size > 0:
-                    cls._set_cached_size(path, size)
-                return size
-
-            except Exception as e:
-                logger.error(f"计算大小时发生错误 {path}: {str(e)}")
-                return 0
+        目录由并行大小计算引擎统计，progress(快照字典) 在工作线程中定期调用。
+        """
+        cls._load_cache()
+        cached_size = cls._get_cached_size(path)
+        if cached_size is not None:
+            return cached_size
 
-        except Exception as e:
-            logger.error(f"计算文件大小时发生未知错误 {path}: {str(e)}")
-            return 0
+        result = cls._size_index.build(path, progress)
+        cls._save_cache()
+        return result.size
 
     @classmethod
     def stop_background_thread(cls):
-        """停止后台计算线程"""
-        cls._is_running = False
-        cls._size_calc_queue.put((None, None, None))  # 发送退出信号
-        if cls._background_thread:
-            cls._background_thread.join()
+        """取消所有后台大小计算并停止调度线程"""
+        with cls._store_lock:
+            scheduler, cls._scheduler = cls._scheduler, None
+        if scheduler is not None:
+            scheduler.shutdown()
 
     @staticmethod
     def format_size(size, status=''):
@@ -419,26 +398,9 @@ class FileSystemOperations:
             return 0
 
     @staticmethod
-    def calculate_dir_size(path: str, depth: int = 0) -> int:
-        """递归计算目录大小"""
-        if depth >= Settings.MAX_DEPTH:
-            return 0
-            
-        total = 0
-        try:
-            with os.scandir(path) as it:
-                for entry in it:
-                    try:
-                        if entry.is_file(follow_symlinks=False):
-                            total += entry.stat().st_size
-                        elif entry.is_dir(follow_symlinks=False):
-                            total += FileSystemOperations.calculate_dir_size(
-                                entry.path, depth + 1)
-                    except (PermissionError, OSError):
-                        continue
-        except (PermissionError, OSError):
-            pass
-        return total
+    def calculate_dir_size(path: str) -> int:
+        """计算目录大小（不使用缓存）"""
+        return get_size_engine().measure(path).size
 
     @staticmethod
     def delete_item(path: str) -> Tuple[bool, str]:
@@ -460,5 +422,21 @@ class FileSystemOperations:
     @classmethod
     def cleanup(cls):
         """清理类，保存缓存"""
-        cls._save_cache(force=True)
-        cls.stop_background_thread() 
\ No newline at end of file
+        cls._save_cache()
+        if cls._watcher is not None:
+            cls._watcher.stop()
+            cls._watcher = None
+            cls._size_index.listener = None
+        cls.stop_background_thread() 
+
+
+# 监控指标
+SIZE_CACHE_HITS = REGISTRY.counter("size_cache_hits_total", "目录大小缓存命中次数")
+SIZE_CACHE_MISSES = REGISTRY.counter("size_cache_misses_total", "目录大小缓存未命中次数")
+
+REGISTRY.hit_ratio("size_cache_hit_ratio", "目录大小缓存命中率",
+                   SIZE_CACHE_HITS, SIZE_CACHE_MISSES)
+REGISTRY.gauge("size_cache_entries", "目录大小缓存条目数").set_function(
+    lambda: len(FileSystemOperations._size_index))
+REGISTRY.gauge("size_calc_queue_depth", "后台目录大小计算队列长度").set_function(
+    lambda: len(FileSystemOperations._scheduler) if FileSystemOperations._scheduler else 0)
@@ -0,0 +1,241 @@
+"""基于 inotify 的目录变化监视（仅 Linux，通过 ctypes 调用，无额外依赖）
+
+监视线程读取 inotify 事件，按所在目录归并变化的名字；在一个短的合并窗口内
+没有新事件（或累计等待超过上限）时一次性回调，git checkout 之类瞬间改动
+上万个文件的操作只产生一批更新。
+
+回调参数为 (变化字典, 是否溢出)：变化字典为 目录 -> 变化的直接子项名集合，
+名字为空串表示目录自身被删除或移走；内核事件队列溢出时部分事件已丢失，
+调用方应把所有监视的目录视为已变化。
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+from src.core.metrics import REGISTRY
+from src.core.utils import logger
+from src.config.settings import FileSystemSettings as Settings
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+SELF_GONE = IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+Changes = Dict[str, Set[str]]
+
+WATCH_EVENTS = REGISTRY.counter("fs_watch_events_total", "收到的 inotify 事件数")
+WATCH_BATCHES = REGISTRY.counter("fs_watch_batches_total", "合并后回调的变化批次数")
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+class DirectoryWatcher:
+    """监视一组目录（非递归）的直接子项变化"""
+
+    def __init__(self, callback: Callable[[Changes, bool], None],
+                 coalesce: float = Settings.WATCH_COALESCE,
+                 max_delay: float = Settings.WATCH_MAX_DELAY,
+                 max_watches: int = Settings.WATCH_MAX_DIRS):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "当前系统不支持 inotify")
+        self.callback = callback
+        self.coalesce = coalesce
+        self.max_delay = max_delay
+        self.max_watches = max_watches
+        self._fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, f"inotify_init1 失败: {os.strerror(code)}")
+        self._wake_r, self._wake_w = os.pipe()
+        self._paths: Dict[int, str] = {}
+        self._wds: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._limit_logged = False
+
+        REGISTRY.gauge("fs_watch_dirs", "正在监视的目录数").set_function(lambda: len(self._wds))
+
+    @staticmethod
+    def available() -> bool:
+        """当前系统是否支持 inotify"""
+        return _libc is not None
+
+    def __len__(self):
+        return len(self._wds)
+
+    def __contains__(self, path: str):
+        return path in self._wds
+
+    def paths(self) -> List[str]:
+        with self._lock:
+            return list(self._wds)
+
+    # ------------------------------------------------------------------
+    # 监视管理
+    # ------------------------------------------------------------------
+    def watch(self, path: str, force: bool = False) -> bool:
+        """开始监视目录；超过 max_watches 时除非 force 否则忽略"""
+        with self._lock:
+            if path in self._wds:
+                return True
+            if not force and len(self._wds) >= self.max_watches:
+                if not self._limit_logged:
+                    self._limit_logged = True
+                    logger.warning(f"监视目录数已达上限 {self.max_watches}，不再添加")
+                return False
+            wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                code = ctypes.get_errno()
+                if code == errno.ENOSPC and not self._limit_logged:
+                    self._limit_logged = True
+                    logger.warning("inotify 监视数达到系统上限 (fs.inotify.max_user_watches)")
+                elif code not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES, errno.ENOSPC):
+                    logger.warning(f"监视目录失败 {path}: {os.strerror(code)}")
+                return False
+            # 同一目录（如经符号链接的不同路径）返回同一个 wd
+            old = self._paths.get(wd)
+            if old is not None:
+                self._wds.pop(old, None)
+            self._paths[wd] = path
+            self._wds[path] = wd
+            return True
+
+    def unwatch(self, path: str):
+        """停止监视目录"""
+        with self._lock:
+            wd = self._wds.pop(path, None)
+            if wd is not None:
+                self._paths.pop(wd, None)
+                _libc.inotify_rm_watch(self._fd, wd)
+
+    # ------------------------------------------------------------------
+    # 监视线程
+    # ------------------------------------------------------------------
+    def start(self) -> 'DirectoryWatcher':
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="fs-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止监视线程并释放 inotify 描述符"""
+        self._stopping = True
+        try:
+            os.write(self._wake_w, b'\0')
+        except OSError:
+            pass
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        with self._lock:
+            self._paths.clear()
+            self._wds.clear()
+
+    def _read_events(self, changes: Changes) -> bool:
+        """读出所有待处理事件并归并到 changes，返回是否发生溢出"""
+        overflow = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return overflow
+            except OSError as e:
+                logger.error(f"读取 inotify 事件失败: {str(e)}")
+                return overflow
+            offset = 0
+            with self._lock:
+                while offset + _EVENT.size <= len(data):
+                    wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                    offset += _EVENT.size
+                    name = data[offset:offset + length].rstrip(b'\0')
+                    offset += length
+                    WATCH_EVENTS.inc()
+                    if mask & IN_Q_OVERFLOW:
+                        overflow = True
+                        continue
+                    path = self._paths.get(wd)
+                    if path is None:
+                        continue
+                    if mask & IN_IGNORED:
+                        # 目录已删除或监视已移除
+                        self._paths.pop(wd, None)
+                        if self._wds.get(path) == wd:
+                            del self._wds[path]
+                        continue
+                    names = changes.setdefault(path, set())
+                    names.add('' if mask & SELF_GONE else os.fsdecode(name))
+
+    def _run(self):
+        changes: Changes = {}
+        overflow = False
+        first = last = 0.0
+        while not self._stopping:
+            timeout = None
+            if changes or overflow:
+                now = time.monotonic()
+                timeout = max(0.0, min(last + self.coalesce, first + self.max_delay) - now)
+            try:
+                readable, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+            except (OSError, ValueError):
+                break
+            if self._fd in readable:
+                had_pending = bool(changes) or overflow
+                overflow = self._read_events(changes) or overflow
+                last = time.monotonic()
+                if not had_pending:
+                    first = last
+            if not (changes or overflow):
+                continue
+            now = time.monotonic()
+            if now < last + self.coalesce and now < first + self.max_delay:
+                continue
+            # 合并窗口结束（或持续有事件但已等待到上限）
+            batch, changes = changes, {}
+            batch_overflow, overflow = overflow, False
+            WATCH_BATCHES.inc()
+            try:
+                self.callback(batch, batch_overflow)
+            except Exception as e:
+                logger.error(f"目录变化回调失败: {str(e)}")
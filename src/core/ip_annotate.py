@@ -0,0 +1,239 @@
+"""IP 归属离线标注（ASN / 国家 / 组织）
+
+把 ip2asn 之类的 CSV/TSV 数据库（每行: 起始地址, 结束地址, ASN, 国家代码, 组织）
+一次性编译为紧凑的二进制区间表，之后通过 mmap 加载，用 bisect 二分查找。
+
+索引文件布局（本机字节序）：
+    头部 '<4sHHIII'  魔数, 版本, 字节序标记, IPv4区间数, IPv6区间数, 记录数
+    IPv4 起始/结束地址列 (uint32) 与记录号列 (uint32)
+    IPv6 起始/结束地址列 (16字节大端) 与记录号列 (uint32)
+    记录表 '<I2s2xII'  ASN, 国家代码, 组织名偏移, 组织名长度
+    组织名 UTF-8 字节串
+"""
+import csv
+import ipaddress
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from src.core.utils import logger, get_user_data_dir
+from src.config.settings import AnnotateSettings as Settings
+
+_MAGIC = b'IPAS'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHHIII')
+_RECORD = struct.Struct('<I2s2xII')
+_LITTLE_ENDIAN = 1 if sys.byteorder == 'little' else 0
+
+
+class AsnInfo(NamedTuple):
+    """地址归属信息"""
+    asn: int
+    country: str
+    org: str
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class _BytesColumn:
+    """定长字节串列的只读序列视图，供 bisect 使用"""
+    __slots__ = ('_view', '_width', '_count')
+
+    def __init__(self, view: memoryview, width: int):
+        self._view = view
+        self._width = width
+        self._count = len(view) // width
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index: int) -> bytes:
+        start = index * self._width
+        return self._view[start:start + self._width].tobytes()
+
+
+class IpAnnotator:
+    """基于二进制区间表的IP归属查询"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, little, v4_count, v6_count, record_count = \
+            _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mm.close()
+            raise ValueError(f"不是有效的归属索引文件: {path}")
+        if little != _LITTLE_ENDIAN:
+            self._mm.close()
+            raise ValueError(f"索引文件字节序与本机不符，请重新编译: {path}")
+
+        view = memoryview(self._mm)
+        offset = _align(_HEADER.size)
+
+        def take(size: int) -> memoryview:
+            nonlocal offset
+            section = view[offset:offset + size]
+            offset = _align(offset + size)
+            return section
+
+        self._v4_starts = take(4 * v4_count).cast('I')
+        self._v4_ends = take(4 * v4_count).cast('I')
+        self._v4_ids = take(4 * v4_count).cast('I')
+        self._v6_starts = _BytesColumn(take(16 * v6_count), 16)
+        self._v6_ends = _BytesColumn(take(16 * v6_count), 16)
+        self._v6_ids = take(4 * v6_count).cast('I')
+        self._records = take(_RECORD.size * record_count)
+        self._names = view[offset:]
+        self._cache: Dict[int, AsnInfo] = {}
+        self.counts = {'ipv4': v4_count, 'ipv6': v6_count, 'records': record_count}
+
+    def close(self):
+        """释放映射"""
+        for name in ('_v4_starts', '_v4_ends', '_v4_ids', '_v6_ids', '_records', '_names'):
+            getattr(self, name).release()
+        self._v6_starts._view.release()
+        self._v6_ends._view.release()
+        self._mm.close()
+
+    def _record(self, record_id: int) -> AsnInfo:
+        info = self._cache.get(record_id)
+        if info is None:
+            asn, country, offset, length = _RECORD.unpack_from(self._records,
+                                                                record_id * _RECORD.size)
+            info = AsnInfo(asn, country.decode('ascii').rstrip('\0'),
+                           bytes(self._names[offset:offset + length]).decode('utf-8'))
+            self._cache[record_id] = info
+        return info
+
+    def _lookup_v6(self, address: str) -> Optional[AsnInfo]:
+        key = socket.inet_pton(socket.AF_INET6, address.split('%')[0])
+        index = bisect_right(self._v6_starts, key) - 1
+        if index >= 0 and key <= self._v6_ends[index]:
+            return self._record(self._v6_ids[index])
+        return None
+
+    def lookup(self, address: str) -> Optional[AsnInfo]:
+        """查询单个地址，未收录或地址无效时返回None"""
+        return self.annotate((address,))[0]
+
+    def annotate(self, addresses: Iterable[str]) -> List[Optional[AsnInfo]]:
+        """批量查询，结果与输入一一对应"""
+        starts, ends, ids = self._v4_starts, self._v4_ends, self._v4_ids
+        record = self._record
+        aton, from_bytes = socket.inet_aton, int.from_bytes
+        results = []
+        append = results.append
+        for address in addresses:
+            try:
+                if ':' in address:
+                    append(self._lookup_v6(address.strip('[]')))
+                    continue
+                value = from_bytes(aton(address), 'big')
+            except (OSError, ValueError):
+                append(None)
+                continue
+            index = bisect_right(starts, value) - 1
+            append(record(ids[index]) if index >= 0 and value <= ends[index] else None)
+        return results
+
+    @staticmethod
+    def compile(source: str, target: str) -> int:
+        """把 CSV/TSV 数据库编译为区间表索引，返回区间数"""
+        records: Dict[tuple, int] = {}
+        v4, v6 = [], []
+        with open(source, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            delimiter = '\t' if '\t' in f.readline() else ','
+            f.seek(0)
+            for row in csv.reader(f, delimiter=delimiter):
+                if len(row) < 3 or row[0].startswith('#'):
+                    continue
+                try:
+                    start = ipaddress.ip_address(row[0].strip())
+                    end = ipaddress.ip_address(row[1].strip())
+                    asn = int(row[2].strip().upper().lstrip('AS') or 0)
+                except ValueError:
+                    # 表头或格式错误的行
+                    continue
+                if start.version != end.version or end < start:
+                    continue
+                country = row[3].strip() if len(row) > 3 else ''
+                if len(country) != 2:
+                    # 未分配/未路由的地址段国家代码为 "None" 等占位符
+                    country = ''
+                org = row[4].strip() if len(row) > 4 else ''
+                key = (asn, country, org)
+                record_id = records.setdefault(key, len(records))
+                (v4 if start.version == 4 else v6).append((int(start), int(end), record_id))
+        v4.sort()
+        v6.sort()
+
+        names = bytearray()
+        record_table = bytearray(_RECORD.size * len(records))
+        for (asn, country, org), record_id in records.items():
+            encoded = org.encode('utf-8')
+            _RECORD.pack_into(record_table, record_id * _RECORD.size, asn,
+                              country.encode('ascii', 'replace'), len(names), len(encoded))
+            names += encoded
+
+        sections = [
+            array('I', (r[0] for r in v4)).tobytes(),
+            array('I', (r[1] for r in v4)).tobytes(),
+            array('I', (r[2] for r in v4)).tobytes(),
+            b''.join(r[0].to_bytes(16, 'big') for r in v6),
+            b''.join(r[1].to_bytes(16, 'big') for r in v6),
+            array('I', (r[2] for r in v6)).tobytes(),
+            bytes(record_table),
+            bytes(names),
+        ]
+        temp = target + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, _LITTLE_ENDIAN, len(v4), len(v6), len(records)))
+            for section in sections:
+                f.write(b'\0' * (_align(f.tell()) - f.tell()))
+                f.write(section)
+        os.replace(temp, target)
+        logger.info(f"已编译归属索引 {target}: IPv4 {len(v4)} 段, IPv6 {len(v6)} 段, "
+                    f"{len(records)} 条记录")
+        return len(v4) + len(v6)
+
+
+def default_index_path() -> str:
+    """默认索引文件路径"""
+    return os.path.join(get_user_data_dir(), Settings.INDEX_FILE)
+
+
+_annotator: Optional[IpAnnotator] = None
+_annotator_lock = threading.Lock()
+
+
+def get_annotator() -> Optional[IpAnnotator]:
+    """共享的标注器；尚未编译索引时返回None"""
+    global _annotator
+    with _annotator_lock:
+        if _annotator is None:
+            path = default_index_path()
+            if os.path.exists(path):
+                try:
+                    _annotator = IpAnnotator(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"加载归属索引失败: {str(e)}")
+        return _annotator
+
+
+def install_database(source: str) -> int:
+    """编译数据库到默认位置并重新加载共享标注器"""
+    global _annotator
+    # 先释放旧映射，Windows 上无法替换仍被映射的文件
+    with _annotator_lock:
+        if _annotator is not None:
+            _annotator.close()
+        _annotator = None
+    return IpAnnotator.compile(source, default_index_path())
@@ -0,0 +1,261 @@
+"""多端口 TCP/UDP 监听测试端
+
+在一个 asyncio 事件循环中同时监听成百上千个TCP/UDP端口，对到达的连接或
+报文回显（echo）或确认（ack）。每个端口是否被访问过记录在位图中，
+首次出现的 (端口, 对端) 组合实时上报。与端口扫描器配合即可得到两台机器
+之间的端到端可达性矩阵。
+"""
+import asyncio
+import ipaddress
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from src.core.utils import logger, raise_file_limit
+from src.config.settings import ListenerSettings as Settings
+
+PROTOCOLS = ("TCP", "UDP")
+_PROTOCOL_BIT = {"TCP": 0, "UDP": 1}
+
+
+class PortBitmap:
+    """65536 位的端口位图"""
+    __slots__ = ('bits',)
+
+    def __init__(self):
+        self.bits = bytearray(65536 // 8)
+
+    def set(self, port: int) -> bool:
+        """置位，返回该端口此前是否未被置位"""
+        index, mask = port >> 3, 1 << (port & 7)
+        if self.bits[index] & mask:
+            return False
+        self.bits[index] |= mask
+        return True
+
+    def __contains__(self, port: int) -> bool:
+        return bool(self.bits[port >> 3] & (1 << (port & 7)))
+
+    def ports(self) -> List[int]:
+        """所有已置位的端口"""
+        result = []
+        for index, byte in enumerate(self.bits):
+            if byte:
+                base = index << 3
+                result.extend(base + bit for bit in range(8) if byte & (1 << bit))
+        return result
+
+
+class _UdpResponder(asyncio.DatagramProtocol):
+    """UDP端口的应答协议"""
+
+    def __init__(self, listener: 'PortListener', port: int):
+        self.listener = listener
+        self.port = port
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.listener._record_hit("UDP", self.port, addr[0])
+        # 空报文无法回显（asyncio 不发送空数据报），端口扫描器恰好用空报文探测
+        reply = data if self.listener.mode == "echo" and data else self.listener._ack(self.port)
+        self.transport.sendto(reply, addr)
+
+
+class PortListener:
+    """多端口监听测试端
+
+    callback 在事件循环线程中被调用，参数为
+        {'protocol', 'port', 'peer', 'time', 'first_on_port'}
+    每个 (协议, 端口, 对端地址) 组合只上报一次；每个端口最多记录
+    MAX_PEERS_PER_PORT 个对端，超出后该端口的新对端不再上报（计入 peers_dropped）。
+    """
+
+    def __init__(self, ports: Iterable[int], protocols: Iterable[str] = PROTOCOLS,
+                 host: str = Settings.DEFAULT_HOST, mode: str = Settings.MODE,
+                 callback: Optional[Callable[[dict], None]] = None):
+        if mode not in ("echo", "ack"):
+            raise ValueError(f"未知的应答方式: {mode}")
+        self.ports = sorted(set(ports))
+        self.protocols = tuple(p.upper() for p in protocols)
+        self.host = host
+        self.mode = mode
+        self.callback = callback
+        self.hits = {protocol: PortBitmap() for protocol in PROTOCOLS}
+        self.first_peers: Dict[Tuple[str, int], str] = {}
+        self.failed: List[Tuple[str, int, str]] = []
+        self._peers: Dict[int, Set[int]] = {}  # (协议位 << 16 | 端口) -> 已上报的对端
+        self.peers_dropped = 0
+        self._servers = []
+        self._transports = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_error: Optional[BaseException] = None
+
+    # ------------------------------------------------------------------
+    # 记录与上报
+    # ------------------------------------------------------------------
+    def _ack(self, port: int) -> bytes:
+        return f"ACK {port}\n".encode('ascii')
+
+    def _record_hit(self, protocol: str, port: int, peer: str):
+        """记录一次访问，首次出现的 (端口, 对端) 实时上报"""
+        first_on_port = self.hits[protocol].set(port)
+        if first_on_port:
+            self.first_peers[(protocol, port)] = peer
+        # 对端地址编码为整数，比保存字符串更省内存
+        try:
+            peer_value = int(ipaddress.ip_address(peer.split('%')[0]))
+        except ValueError:
+            peer_value = hash(peer) & 0xFFFFFFFF
+        peers = self._peers.setdefault((_PROTOCOL_BIT[protocol] << 16) | port, set())
+        if peer_value in peers:
+            return
+        if len(peers) >= Settings.MAX_PEERS_PER_PORT:
+            self.peers_dropped += 1
+            return
+        peers.add(peer_value)
+        if self.callback:
+            try:
+                self.callback({'protocol': protocol, 'port': port, 'peer': peer,
+                               'time': time.time(), 'first_on_port': first_on_port})
+            except Exception as e:
+                logger.error(f"监听回调失败: {str(e)}")
+
+    def report(self) -> dict:
+        """已被访问的端口及首个对端"""
+        return {
+            protocol.lower(): [
+                {'port': port, 'first_peer': self.first_peers.get((protocol, port))}
+                for port in self.hits[protocol].ports()
+            ]
+            for protocol in self.protocols
+        }
+
+    # ------------------------------------------------------------------
+    # 事件循环
+    # ------------------------------------------------------------------
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                          port: int):
+        peer = writer.get_extra_info('peername')
+        self._record_hit("TCP", port, peer[0] if peer else "?")
+        try:
+            if self.mode == "ack":
+                writer.write(self._ack(port))
+                await writer.drain()
+                return
+            while True:
+                data = await asyncio.wait_for(reader.read(4096), Settings.READ_TIMEOUT)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """在当前事件循环中打开所有端口"""
+        loop = asyncio.get_running_loop()
+        raise_file_limit(len(self.ports) * len(self.protocols) + 256)
+        for port in self.ports:
+            if "TCP" in self.protocols:
+                try:
+                    server = await asyncio.start_server(
+                        lambda r, w, port=port: self._handle_tcp(r, w, port),
+                        self.host, port, reuse_address=True)
+                    self._servers.append(server)
+                except OSError as e:
+                    self.failed.append(("TCP", port, str(e)))
+            if "UDP" in self.protocols:
+                try:
+                    transport, _ = await loop.create_datagram_endpoint(
+                        lambda port=port: _UdpResponder(self, port), local_addr=(self.host, port))
+                    self._transports.append(transport)
+                except OSError as e:
+                    self.failed.append(("UDP", port, str(e)))
+        opened = len(self._servers) + len(self._transports)
+        logger.info(f"监听测试端已打开 {opened} 个端口，失败 {len(self.failed)} 个")
+        for protocol, port, error in self.failed[:10]:
+            logger.warning(f"无法监听 {protocol} 端口 {port}: {error}")
+        return self
+
+    async def close(self):
+        """关闭所有端口"""
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+        for transport in self._transports:
+            transport.close()
+        self._servers.clear()
+        self._transports.clear()
+
+    def start_in_thread(self):
+        """在后台线程中运行事件循环，端口全部打开后返回
+
+        启动过程中抛出的异常在调用线程中重新抛出。
+        """
+        def run():
+            try:
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                self._loop.run_until_complete(self.start())
+            except BaseException as e:
+                self._start_error = e
+                if self._loop is not None:
+                    self._loop.run_until_complete(self.close())
+                    self._loop.close()
+                return
+            finally:
+                # 无论成功与否都要唤醒等待中的调用方
+                self._ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.close())
+            # 取消仍在进行的连接处理，避免关闭事件循环后才释放其传输对象
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+        self._ready.clear()
+        self._start_error = None
+        self._loop = None
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._start_error is not None:
+            self._thread.join()
+            self._thread = None
+            raise self._start_error
+        return self
+
+    def stop(self):
+        """停止后台线程中的事件循环"""
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+
+def reachability_matrix(ports: Iterable[int], scanner_open: Iterable[int],
+                        listener_hits: Iterable[int]) -> List[dict]:
+    """合并扫描端与监听端的结果，得到每个端口的端到端可达性
+
+    scanner_open 为扫描端判定开放的端口，listener_hits 为监听端实际收到访问的端口。
+    """
+    scanner_open, listener_hits = set(scanner_open), set(listener_hits)
+    verdicts = {
+        (True, True): "可达",
+        (True, False): "中间设备应答",  # 扫描端看到开放，但测试端没有收到连接
+        (False, True): "回程受阻",  # 请求到达测试端，但应答未回到扫描端
+        (False, False): "阻断",
+    }
+    return [{'port': port, 'scanner_open': port in scanner_open,
+             'listener_hit': port in listener_hits,
+             'verdict': verdicts[(port in scanner_open, port in listener_hits)]}
+            for port in sorted(set(ports))]
@@ -0,0 +1,326 @@
+"""TCP 建连压测
+
+对目标 host:port 反复建立并关闭TCP连接（可选发送一段短请求并读取应答），
+按目标速率或固定并发数运行，统计每秒连接数、建连延迟直方图以及按错误码
+分类的失败次数。
+
+每个工作线程运行一个非阻塞 selectors 事件循环；连接状态保存在预先分配的
+槽位对象中循环复用，请求内容和接收缓冲区也在启动前分配好，
+热路径上除套接字本身外基本不产生新的Python对象。
+"""
+import errno
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+from src.core.metrics import REGISTRY
+from src.core.utils import logger, raise_file_limit
+from src.config.settings import LoadSettings as Settings
+
+CONNECT_LATENCY = REGISTRY.histogram(
+    "loadgen_connect_seconds", "压测建连延迟", buckets=Settings.LATENCY_BUCKETS)
+CONNECTIONS = REGISTRY.counter("loadgen_connections_total", "压测连接结果", ("result",))
+
+# l_onoff=1, l_linger=0：关闭时直接发送RST，避免本端大量 TIME_WAIT 耗尽临时端口
+_LINGER_RESET = struct.pack('ii', 1, 0)
+# 非阻塞 connect 正在进行中的返回码（Windows 上为 WSAEWOULDBLOCK）
+_IN_PROGRESS = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, 10035}
+_TIMEOUT = -1
+
+_CONNECTING, _SENDING, _READING = 1, 2, 3
+
+
+class _Slot:
+    """一个并发连接槽位，在连接之间复用"""
+    __slots__ = ('sock', 'started', 'phase', 'sent')
+
+    def __init__(self):
+        self.sock: Optional[socket.socket] = None
+        self.started = 0.0
+        self.phase = 0
+        self.sent = 0
+
+
+class _Worker:
+    """单个事件循环线程"""
+
+    def __init__(self, generator: 'LoadGenerator', slots: int, rate: float):
+        self.generator = generator
+        self.slots = [_Slot() for _ in range(slots)]
+        self.idle = list(self.slots)
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.recv_buffer = bytearray(Settings.RECV_BUFFER)
+        self.histogram = CONNECT_LATENCY.local()
+        self.errors: Dict[int, int] = {}
+        self.attempts = 0
+        self.connected = 0
+        self.completed = 0
+        self.max_latency = 0.0
+
+    def _error(self, code: int):
+        self.errors[code] = self.errors.get(code, 0) + 1
+
+    def _open(self, selector, slot: _Slot, now: float) -> bool:
+        generator = self.generator
+        self.attempts += 1
+        try:
+            sock = socket.socket(generator.family, socket.SOCK_STREAM)
+        except OSError as e:
+            self._error(e.errno or 0)
+            return False
+        sock.setblocking(False)
+        if generator.reset:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RESET)
+        code = sock.connect_ex(generator.sockaddr)
+        if code not in _IN_PROGRESS:
+            sock.close()
+            self._error(code)
+            return False
+        slot.sock = sock
+        slot.started = now
+        slot.phase = _CONNECTING
+        slot.sent = 0
+        selector.register(sock, selectors.EVENT_WRITE, slot)
+        return True
+
+    def _release(self, selector, slot: _Slot, error: Optional[int] = None):
+        selector.unregister(slot.sock)
+        slot.sock.close()
+        slot.sock = None
+        slot.phase = 0
+        self.idle.append(slot)
+        if error is None:
+            self.completed += 1
+        else:
+            self._error(error)
+
+    def _send(self, selector, slot: _Slot) -> bool:
+        """发送请求，全部发送完成返回True"""
+        request = self.generator.request
+        try:
+            slot.sent += slot.sock.send(request[slot.sent:])
+        except (BlockingIOError, InterruptedError):
+            return False
+        if slot.sent < len(request):
+            return False
+        if self.generator.read_response:
+            slot.phase = _READING
+            selector.modify(slot.sock, selectors.EVENT_READ, slot)
+            return False
+        return True
+
+    def _handle(self, selector, slot: _Slot, now: float):
+        try:
+            if slot.phase == _CONNECTING:
+                code = slot.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code:
+                    self._release(selector, slot, code)
+                    return
+                latency = now - slot.started
+                self.histogram.observe(latency)
+                if latency > self.max_latency:
+                    self.max_latency = latency
+                self.connected += 1
+                if not self.generator.request:
+                    self._release(selector, slot)
+                    return
+                slot.phase = _SENDING
+            if slot.phase == _SENDING:
+                if self._send(selector, slot):
+                    self._release(selector, slot)
+                return
+            if slot.phase == _READING:
+                # 只要收到应答（或对端关闭）即视为完成
+                slot.sock.recv_into(self.recv_buffer)
+                self._release(selector, slot)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError as e:
+            self._release(selector, slot, e.errno or 0)
+
+    def _expire(self, selector, now: float):
+        """关闭超时未完成的连接"""
+        deadline = now - Settings.CONNECT_TIMEOUT
+        for slot in self.slots:
+            if slot.sock is not None and slot.started < deadline:
+                self._release(selector, slot, _TIMEOUT)
+
+    def run(self, deadline: float, stop: threading.Event):
+        selector = selectors.DefaultSelector()
+        idle = self.idle
+        interval = self.interval
+        now = time.perf_counter()
+        next_start = now
+        next_expire = now + 0.1
+        try:
+            while not stop.is_set():
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                # 按速率或并发上限补充新连接，每轮最多补满一次槽位
+                budget = len(self.slots)
+                while idle and budget and (not interval or next_start <= now):
+                    budget -= 1
+                    slot = idle.pop()
+                    if not self._open(selector, slot, now):
+                        idle.append(slot)
+                    if interval:
+                        next_start += interval
+                        # 落后太多时不再追赶，避免瞬间突发
+                        if next_start < now - 1.0:
+                            next_start = now
+
+                if interval and idle:
+                    timeout = max(0.0, min(next_start, deadline) - time.perf_counter())
+                else:
+                    timeout = min(0.1, max(0.0, deadline - now))
+                if len(idle) < len(self.slots):
+                    for key, _ in selector.select(timeout):
+                        self._handle(selector, key.data, time.perf_counter())
+                elif timeout:
+                    # 没有进行中的连接（如全部建连立即失败），等待下一次发起
+                    stop.wait(timeout)
+
+                if now >= next_expire:
+                    self._expire(selector, now)
+                    next_expire = now + 0.1
+        finally:
+            for slot in self.slots:
+                if slot.sock is not None:
+                    selector.unregister(slot.sock)
+                    slot.sock.close()
+                    slot.sock = None
+            selector.close()
+
+
+class LoadGenerator:
+    """TCP 建连压测器
+
+    concurrency 为同时进行中的连接上限；rate 大于0时按每秒 rate 个连接的
+    速率发起，否则在并发上限内尽可能快地发起。
+    """
+
+    def __init__(self, host: str, port: int, concurrency: int = Settings.CONCURRENCY,
+                 rate: float = 0, duration: float = Settings.DURATION,
+                 request: bytes = b'', read_response: bool = False,
+                 workers: int = Settings.WORKERS, reset: bool = True):
+        if concurrency < 1:
+            raise ValueError("并发数必须大于0")
+        self.host = host
+        self.port = port
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.request = memoryview(bytes(request))
+        self.read_response = read_response and bool(request)
+        self.workers = max(1, min(workers, concurrency))
+        self.reset = reset
+        self._stop = threading.Event()
+
+        # 只解析一次地址，热路径上直接使用套接字地址
+        info = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+        self.family, self.sockaddr = info[0], info[4]
+
+    def stop(self):
+        """提前结束压测"""
+        self._stop.set()
+
+    def run(self) -> dict:
+        """执行压测并返回统计结果"""
+        raise_file_limit(self.concurrency + 256)
+        base, extra = divmod(self.concurrency, self.workers)
+        workers = []
+        for index in range(self.workers):
+            slots = base + (1 if index < extra else 0)
+            rate = self.rate * slots / self.concurrency if self.rate > 0 else 0
+            workers.append(_Worker(self, slots, rate))
+
+        logger.info(f"开始建连压测 {self.host}:{self.port}，并发 {self.concurrency}，"
+                    f"速率 {self.rate or '不限'}，持续 {self.duration} 秒")
+        self._stop.clear()
+        started = time.perf_counter()
+        deadline = started + self.duration
+        threads = [threading.Thread(target=worker.run, args=(deadline, self._stop), daemon=True)
+                   for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return self._summarize(workers, elapsed)
+
+    def _summarize(self, workers: List[_Worker], elapsed: float) -> dict:
+        histogram = CONNECT_LATENCY.local()
+        errors: Dict[str, int] = {}
+        attempts = connected = completed = 0
+        max_latency = 0.0
+        for worker in workers:
+            histogram.merge(worker.histogram)
+            attempts += worker.attempts
+            connected += worker.connected
+            completed += worker.completed
+            max_latency = max(max_latency, worker.max_latency)
+            for code, count in worker.errors.items():
+                name = "timeout" if code == _TIMEOUT else errno.errorcode.get(code, str(code))
+                errors[name] = errors.get(name, 0) + count
+
+        CONNECT_LATENCY.merge(histogram)
+        CONNECTIONS.labels("completed").inc(completed)
+        for name, count in errors.items():
+            CONNECTIONS.labels(name).inc(count)
+
+        elapsed = max(elapsed, 1e-9)
+        to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+        # 桶内插值可能超过实际最大值
+        quantile = lambda q: min(histogram.quantile(q), max_latency) if connected else None
+        return {
+            'target': f"{self.host}:{self.port}",
+            'duration': round(elapsed, 3),
+            'attempts': attempts,
+            'connected': connected,
+            'completed': completed,
+            'failed': sum(errors.values()),
+            'connections_per_second': round(connected / elapsed, 1),
+            'errors': dict(sorted(errors.items(), key=lambda item: -item[1])),
+            'latency_ms': {
+                'avg': to_ms(histogram.sum / connected) if connected else None,
+                'p50': to_ms(quantile(0.5)),
+                'p90': to_ms(quantile(0.9)),
+                'p99': to_ms(quantile(0.99)),
+                'max': to_ms(max_latency) if connected else None,
+            },
+            'histogram': [{'le_ms': to_ms(bound), 'count': count}
+                          for bound, count in zip(histogram.bounds, histogram.counts)]
+                         + [{'le_ms': "+Inf", 'count': histogram.counts[-1]}],
+        }
+
+    @staticmethod
+    def format_report(result: dict) -> str:
+        """把压测结果格式化为文本"""
+        latency = result['latency_ms']
+
+        def fmt(value):
+            return f"{value:.3f}" if value is not None else "-"
+
+        lines = [
+            f"目标: {result['target']}  时长: {result['duration']:.1f}s",
+            f"发起: {result['attempts']}  建连成功: {result['connected']}  "
+            f"完成: {result['completed']}  失败: {result['failed']}",
+            f"连接速率: {result['connections_per_second']:.1f} 次/秒",
+            f"建连延迟(ms): 平均 {fmt(latency['avg'])}  P50 {fmt(latency['p50'])}  "
+            f"P90 {fmt(latency['p90'])}  P99 {fmt(latency['p99'])}  最大 {fmt(latency['max'])}",
+            "延迟分布:",
+        ]
+        peak = max((bucket['count'] for bucket in result['histogram']), default=0) or 1
+        for bucket in result['histogram']:
+            if not bucket['count']:
+                continue
+            label = bucket['le_ms'] if isinstance(bucket['le_ms'], str) else f"{bucket['le_ms']:g}"
+            bar = '#' * max(1, round(40 * bucket['count'] / peak))
+            lines.append(f"  <= {label:>8} ms {bucket['count']:>10}  {bar}")
+        if result['errors']:
+            lines.append("错误分类:")
+            lines.extend(f"  {name:<16}{count:>10}" for name, count in result['errors'].items())
+        return "\n".join(lines)
@@ -0,0 +1,95 @@
+"""有界 LRU 缓存
+
+按条目数和估算字节数两个上限淘汰最久未使用的条目。每个条目在内部只占
+一个 (字节数, 值) 元组。缓存只负责限制内存，不判断条目是否过时：
+目录大小索引由记录自身的 checked 时间决定何时重新扫描，再加一层按时间
+丢弃只会把仍可校验的记录变成整棵子树的重新统计。
+
+命中/未命中/淘汰次数以 lru_cache_events_total{cache=名称} 计数，
+条目数和字节数以仪表导出。
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from src.core.metrics import REGISTRY
+
+LRU_EVENTS = REGISTRY.counter("lru_cache_events_total", "LRU缓存事件次数", ("cache", "event"))
+LRU_ENTRIES = REGISTRY.gauge("lru_cache_entries", "LRU缓存条目数", ("cache",))
+LRU_BYTES = REGISTRY.gauge("lru_cache_bytes", "LRU缓存估算占用字节数", ("cache",))
+
+
+def default_sizeof(key, value) -> int:
+    """粗略估算一个条目的内存占用"""
+    return sys.getsizeof(key) + sys.getsizeof(value) + 100
+
+
+class LruCache:
+    """线程安全的有界 LRU 缓存"""
+
+    def __init__(self, name: str, max_entries: int = 0, max_bytes: int = 0,
+                 sizeof: Callable[[Any, Any], int] = default_sizeof):
+        """max_entries / max_bytes 为 0 表示不限制"""
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = LRU_EVENTS.labels(name, "hit")
+        self._misses = LRU_EVENTS.labels(name, "miss")
+        self._evictions = LRU_EVENTS.labels(name, "eviction")
+        LRU_ENTRIES.labels(name).set_function(lambda: len(self._data))
+        LRU_BYTES.labels(name).set_function(lambda: self.bytes)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """取值并标记为最近使用；不存在时返回 default"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data.move_to_end(key)
+                self._hits.inc()
+                return item[1]
+        self._misses.inc()
+        return default
+
+    def put(self, key, value):
+        """写入条目，超出上限时淘汰最久未使用的条目"""
+        size = self.sizeof(key, value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[0]
+            self._data[key] = (size, value)
+            self.bytes += size
+            while len(self._data) > 1 and (
+                    (self.max_entries and len(self._data) > self.max_entries) or
+                    (self.max_bytes and self.bytes > self.max_bytes)):
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                self._evictions.inc()
+
+    def pop(self, key, default=None):
+        """删除条目并返回其值"""
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self.bytes -= item[0]
+            return item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """条目数、字节数与累计事件次数"""
+        return {'entries': len(self._data), 'bytes': self.bytes,
+                'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+                'hits': int(self._hits.value), 'misses': int(self._misses.value),
+                'evictions': int(self._evictions.value)}
@@ -1,14 +1,44 @@
 """网络操作相关功能"""
+import os
+import re
+import ssl
+import errno
 import socket
+import selectors
+import time
 import platform
 import subprocess
-from typing import Tuple, List, Optional
-from ..config.settings import PING_COUNT, SOCKET_TIMEOUT
+import ipaddress
+import contextlib
+from typing import Iterator, Tuple, List, Optional
+from urllib.parse import urlsplit
+from .metrics import REGISTRY
+from .ip_annotate import get_annotator
+from ..config.settings import (PING_COUNT, SOCKET_TIMEOUT, CONNECTION_ATTEMPT_DELAY,
+                               MAX_EXPAND_TARGETS, ProxySettings)
+
+# 监控指标
+PROBE_DURATION = REGISTRY.histogram("probe_duration_seconds", "探测耗时（秒）", ("probe",))
+PROBE_RESULTS = REGISTRY.counter("probe_results_total", "探测结果计数", ("probe", "result"))
+PING_RTT = REGISTRY.histogram("ping_rtt_seconds", "Ping往返时延（秒）")
+PING_SENT = REGISTRY.counter("ping_packets_sent_total", "Ping发送的数据包数")
+PING_LOST = REGISTRY.counter("ping_packets_lost_total", "Ping丢失的数据包数")
+
+# 解析ping输出（兼容Linux/Windows中英文输出）
+_RTT_PATTERN = re.compile(r'(?:time|时间)\s*[=<]\s*([\d.]+)\s*ms', re.IGNORECASE)
+_UNIX_LOSS_PATTERN = re.compile(r'(\d+) packets transmitted, (\d+) (?:packets )?received')
+_WINDOWS_LOSS_PATTERN = re.compile(
+    r'(?:Sent|已发送)\s*=\s*(\d+).*?(?:Received|已接收)\s*=\s*(\d+)', re.IGNORECASE | re.DOTALL)
+
+# 非阻塞 connect 正在进行中的返回码（Windows 上为 WSAEWOULDBLOCK）
+_CONNECT_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, 10035}
+_FAMILY_NAMES = {socket.AF_INET: "IPv4", socket.AF_INET6: "IPv6"}
 
 class NetworkOperations:
     @staticmethod
     def ping(host: str) -> Tuple[bool, str]:
         """执行ping操作"""
+        start = time.perf_counter()
         try:
             param = '-n' if platform.system().lower() == 'windows' else '-c'
             command = ['ping', param, str(PING_COUNT), host]
@@ -19,61 +49,424 @@ class NetworkOperations:
             output, error = process.communicate()
             
             if error:
+                PROBE_RESULTS.labels("ping", "error").inc()
                 return False, error.decode('gbk', 'ignore')
-            return True, output.decode('gbk' if platform.system().lower() == 'windows' 
+            text = output.decode('gbk' if platform.system().lower() == 'windows' 
                                     else 'utf-8')
+            NetworkOperations._record_ping_stats(text, process.returncode)
+            return True, text
         except Exception as e:
+            PROBE_RESULTS.labels("ping", "error").inc()
             return False, str(e)
+        finally:
+            PROBE_DURATION.labels("ping").observe(time.perf_counter() - start)
 
     @staticmethod
-    def resolve_dns(domain: str) -> Tuple[bool, dict]:
-        """DNS解析"""
+    def ping_rtts(output: str) -> List[float]:
+        """从ping输出中提取每个应答的往返时延（毫秒）"""
+        return [float(value) for value in _RTT_PATTERN.findall(output)]
+
+    @staticmethod
+    def _record_ping_stats(output: str, returncode: int = 0):
+        """从ping输出中提取往返时延和丢包数并记录指标
+
+        统计行无法识别（如其他语言的输出）时按是否解析到应答时延、
+        再按 ping 的退出码判断结果，每次调用都会记录一个结果标签。
+        """
+        rtts = 0
+        for match in _RTT_PATTERN.finditer(output):
+            PING_RTT.observe(float(match.group(1)) / 1000)
+            rtts += 1
+        match = _UNIX_LOSS_PATTERN.search(output) or _WINDOWS_LOSS_PATTERN.search(output)
+        if match:
+            sent, received = int(match.group(1)), int(match.group(2))
+            PING_SENT.inc(sent)
+            PING_LOST.inc(max(sent - received, 0))
+        else:
+            received = rtts or returncode == 0
+        PROBE_RESULTS.labels("ping", "ok" if received else "lost").inc()
+
+    @staticmethod
+    def resolve_dns(domain: str, aliases: bool = False) -> Tuple[bool, dict]:
+        """DNS解析（同时返回IPv4和IPv6地址）
+
+        aliases 为 True 时额外查询一次别名（CNAME），供界面上的单次查询使用；
+        批量和定时解析不需要别名，默认不查，每个名字只有一次阻塞查询。
+        """
+        start = time.perf_counter()
         try:
-            result = socket.gethostbyname_ex(domain)
-            return True, {
-                "hostname": result[0],
-                "aliases": result[1],
-                "addresses": result[2]
+            infos = socket.getaddrinfo(domain.strip('[]'), None, socket.AF_UNSPEC,
+                                       socket.SOCK_STREAM, 0, socket.AI_CANONNAME)
+            hostname = next((info[3] for info in infos if info[3]), domain)
+            addresses, ipv4, ipv6 = [], [], []
+            for family, _, _, _, sockaddr in infos:
+                address = sockaddr[0]
+                if address in addresses:
+                    continue
+                addresses.append(address)
+                (ipv6 if family == socket.AF_INET6 else ipv4).append(address)
+            alias_list = []
+            if aliases:
+                try:
+                    # getaddrinfo 不返回 CNAME 链，别名取自 gethostbyname_ex（只查IPv4，纯IPv6的名字没有别名）
+                    alias_list = socket.gethostbyname_ex(domain.strip('[]'))[1]
+                except (OSError, UnicodeError):
+                    pass
+            PROBE_RESULTS.labels("dns", "ok").inc()
+            result = {
+                "hostname": hostname,
+                "aliases": alias_list,
+                "addresses": addresses,
+                "ipv4": ipv4,
+                "ipv6": ipv6
             }
+            annotator = get_annotator()
+            if annotator is not None:
+                result["annotations"] = {
+                    address: info._asdict() if info else None
+                    for address, info in zip(addresses, annotator.annotate(addresses))}
+            return True, result
         except Exception as e:
+            PROBE_RESULTS.labels("dns", "error").inc()
             return False, {"error": str(e)}
+        finally:
+            PROBE_DURATION.labels("dns").observe(time.perf_counter() - start)
 
     @staticmethod
-    def scan_port(host: str, port: int, protocol: str) -> Tuple[bool, str]:
-        """端口扫描"""
+    def resolve_addresses(host: str, port: int,
+                          socktype: int = socket.SOCK_STREAM) -> List[Tuple[int, tuple]]:
+        """用 getaddrinfo 解析候选地址 [(地址族, 套接字地址)]
+
+        按 RFC 8305 交替排列不同地址族，首个地址族沿用系统的优先顺序。
+        """
+        infos = socket.getaddrinfo(host.strip('[]'), port, socket.AF_UNSPEC, socktype)
+        by_family = {}
+        seen = set()
+        for family, _, _, _, sockaddr in infos:
+            if sockaddr in seen:
+                continue
+            seen.add(sockaddr)
+            by_family.setdefault(family, []).append((family, sockaddr))
+        queues = list(by_family.values())
+        candidates = []
+        for index in range(max((len(q) for q in queues), default=0)):
+            candidates.extend(q[index] for q in queues if index < len(q))
+        return candidates
+
+    @staticmethod
+    def connect_happy_eyeballs(host: str, port: int, timeout: float = SOCKET_TIMEOUT,
+                               attempt_delay: float = CONNECTION_ATTEMPT_DELAY
+                               ) -> Tuple[socket.socket, tuple]:
+        """RFC 8305 方式竞速连接各候选地址
+
+        每隔 attempt_delay 秒（或上一次尝试失败时立即）发起下一个候选地址的连接，
+        返回最先连上的阻塞套接字及其地址，其余尝试全部关闭。
+        全部失败时抛出 OSError，总耗时不超过 timeout。
+        """
+        candidates = NetworkOperations.resolve_addresses(host, port)
+        deadline = time.monotonic() + timeout
+        selector = selectors.DefaultSelector()
+        pending = []
+        last_error: Optional[OSError] = None
+        index = 0
+        next_attempt = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                if index < len(candidates) and (now >= next_attempt or not pending):
+                    family, sockaddr = candidates[index]
+                    index += 1
+                    sock = None
+                    try:
+                        sock = socket.socket(family, socket.SOCK_STREAM)
+                        sock.setblocking(False)
+                        code = sock.connect_ex(sockaddr)
+                    except OSError as e:
+                        if sock is not None:
+                            sock.close()
+                        last_error = e
+                        continue
+                    if code == 0:
+                        sock.settimeout(timeout)
+                        return sock, sockaddr
+                    if code not in _CONNECT_IN_PROGRESS:
+                        sock.close()
+                        last_error = OSError(code, os.strerror(code))
+                        continue
+                    selector.register(sock, selectors.EVENT_WRITE, sockaddr)
+                    pending.append(sock)
+                    next_attempt = now + attempt_delay
+
+                if not pending:
+                    if index >= len(candidates):
+                        raise last_error or OSError(f"没有可用的地址: {host}")
+                    continue
+                if now >= deadline:
+                    raise socket.timeout(f"连接 {host}:{port} 超时")
+
+                wait = deadline - now
+                if index < len(candidates):
+                    wait = min(wait, max(0.0, next_attempt - now))
+                for key, _ in selector.select(wait):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    pending.remove(sock)
+                    code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if code == 0:
+                        sock.settimeout(max(0.0, deadline - time.monotonic()) or timeout)
+                        return sock, key.data
+                    sock.close()
+                    last_error = OSError(code, os.strerror(code))
+                    # 失败时不必等待间隔，立即尝试下一个候选地址
+                    next_attempt = now
+        finally:
+            for sock in pending:
+                selector.unregister(sock)
+                sock.close()
+            selector.close()
+
+    @staticmethod
+    def family_name(family: int) -> str:
+        """地址族名称"""
+        return _FAMILY_NAMES.get(family, str(family))
+
+    @staticmethod
+    def scan_port(host: str, port: int, protocol: str,
+                  proxy: Optional[str] = None) -> Tuple[bool, str]:
+        """端口扫描（proxy 为代理URL时经代理探测，仅支持TCP）"""
+        probe = "tcp" if protocol == "TCP" else "udp"
+        start = time.perf_counter()
         try:
             if protocol == "TCP":
-                return NetworkOperations._scan_tcp_port(host, port)
+                if proxy:
+                    success, message = NetworkOperations._scan_tcp_port_via_proxy(host, port, proxy)
+                else:
+                    success, message = NetworkOperations._scan_tcp_port(host, port)
             else:
-                return NetworkOperations._scan_udp_port(host, port)
+                if proxy:
+                    return False, "UDP 端口探测不支持经代理进行"
+                success, message = NetworkOperations._scan_udp_port(host, port)
+            PROBE_RESULTS.labels(probe, "open" if success else "closed").inc()
+            return success, message
         except Exception as e:
+            PROBE_RESULTS.labels(probe, "error").inc()
             return False, str(e)
+        finally:
+            PROBE_DURATION.labels(probe).observe(time.perf_counter() - start)
 
     @staticmethod
-    def _scan_tcp_port(host: str, port: int) -> Tuple[bool, str]:
-        """TCP端口扫描"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(SOCKET_TIMEOUT)
+    @contextlib.contextmanager
+    def open_connection(host: str, port: int, proxy: Optional[str] = None,
+                        timeout: float = SOCKET_TIMEOUT) -> Iterator[Tuple[socket.socket, dict]]:
+        """直连或经代理建立TCP连接，产出 (套接字, 分段耗时)"""
+        if proxy:
+            from .proxy import get_proxy
+
+            with get_proxy(proxy).open(host, port, timeout) as (sock, timings):
+                yield sock, timings
+            return
+        start = time.perf_counter()
+        sock, address = NetworkOperations.connect_happy_eyeballs(host, port, timeout)
         try:
-            result = sock.connect_ex((host, port))
-            if result == 0:
-                return True, f"TCP 端口 {port} 状态: 开放"
-            return False, f"TCP 端口 {port} 状态: 关闭"
+            yield sock, {'address': address[0],
+                         'connect_ms': round((time.perf_counter() - start) * 1000, 3)}
         finally:
             sock.close()
 
     @staticmethod
-    def _scan_udp_port(host: str, port: int) -> Tuple[bool, str]:
-        """UDP端口扫描"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(SOCKET_TIMEOUT)
+    def grab_banner(host: str, port: int, proxy: Optional[str] = None, payload: bytes = b'',
+                    timeout: float = ProxySettings.BANNER_TIMEOUT) -> Tuple[bool, dict]:
+        """建连后读取服务端主动发送（或对 payload 的）应答"""
+        start = time.perf_counter()
         try:
-            sock.sendto(b"", (host, port))
-            data, addr = sock.recvfrom(1024)
-            return True, f"UDP 端口 {port} 状态: 开放 (收到响应)"
-        except socket.timeout:
-            return False, f"UDP 端口 {port} 状态: 可能开放 (无响应)"
+            with NetworkOperations.open_connection(host, port, proxy, timeout) as (sock, timings):
+                sent = time.perf_counter()
+                if payload:
+                    sock.sendall(payload)
+                try:
+                    data = sock.recv(ProxySettings.BANNER_SIZE)
+                    timings['first_byte_ms'] = round((time.perf_counter() - sent) * 1000, 3)
+                except socket.timeout:
+                    data = b''
+            PROBE_RESULTS.labels("banner", "ok" if data else "empty").inc()
+            timings['banner'] = data.decode('utf-8', 'replace')
+            return True, timings
         except Exception as e:
-            return False, f"UDP 端口 {port} 状态: 可能关闭 ({str(e)})"
+            PROBE_RESULTS.labels("banner", "error").inc()
+            return False, {"error": str(e)}
+        finally:
+            PROBE_DURATION.labels("banner").observe(time.perf_counter() - start)
+
+    @staticmethod
+    def http_probe(url: str, proxy: Optional[str] = None,
+                   timeout: float = ProxySettings.HTTP_TIMEOUT) -> Tuple[bool, dict]:
+        """HTTP/HTTPS 探测：发送 GET 请求，返回状态码、响应头和分段耗时"""
+        start = time.perf_counter()
+        try:
+            parts = urlsplit(url if '://' in url else f"http://{url}")
+            secure = parts.scheme.lower() == 'https'
+            host = parts.hostname
+            port = parts.port or (443 if secure else 80)
+            path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+            with NetworkOperations.open_connection(host, port, proxy, timeout) as (sock, timings):
+                if secure:
+                    tls_start = time.perf_counter()
+                    sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+                    timings['tls_ms'] = round((time.perf_counter() - tls_start) * 1000, 3)
+                authority = parts.netloc.rpartition('@')[2]
+                request = (f"GET {path} HTTP/1.1\r\nHost: {authority}\r\n"
+                           f"User-Agent: {ProxySettings.USER_AGENT}\r\n"
+                           f"Accept: */*\r\nConnection: close\r\n\r\n")
+                sent = time.perf_counter()
+                # TLS 包装后原套接字已分离，需要单独关闭包装后的套接字
+                with sock, sock.makefile('rb') as reader:
+                    sock.sendall(request.encode('utf-8'))
+                    status_line = reader.readline(8192).decode('latin-1').strip()
+                    timings['first_byte_ms'] = round((time.perf_counter() - sent) * 1000, 3)
+                    headers = {}
+                    while True:
+                        line = reader.readline(8192).decode('latin-1').strip()
+                        if not line:
+                            break
+                        name, _, value = line.partition(':')
+                        headers[name.strip().lower()] = value.strip()
+            version, _, rest = status_line.partition(' ')
+            status, _, reason = rest.partition(' ')
+            if not version.startswith('HTTP/') or not status.isdigit():
+                raise ValueError(f"无效的HTTP响应: {status_line!r}")
+            PROBE_RESULTS.labels("http", status[0] + "xx").inc()
+            timings.update({'status': int(status), 'reason': reason, 'headers': headers})
+            return True, timings
+        except Exception as e:
+            PROBE_RESULTS.labels("http", "error").inc()
+            return False, {"error": str(e)}
         finally:
-            sock.close() 
\ No newline at end of file
+            PROBE_DURATION.labels("http").observe(time.perf_counter() - start)
+
+    @staticmethod
+    def parse_ports(port_str: str, limit: Optional[int] = None) -> List[int]:
+        """解析端口列表，支持 "80,443,8000-8010" 格式；超过 limit 个时抛出 ValueError"""
+        ports = []
+        for part in port_str.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, end = (int(p) for p in part.split('-', 1))
+            else:
+                start = end = int(part)
+            if not (0 <= start <= end <= 65535):
+                raise ValueError(f"无效的端口范围: {part}")
+            ports.extend(range(start, end + 1))
+            if limit is not None and len(ports) > limit:
+                raise ValueError(f"端口过多（上限 {limit} 个）")
+        return ports
+
+    @staticmethod
+    def parse_endpoints(endpoint_str: str, default_host: str = "127.0.0.1") -> List[Tuple[str, int]]:
+        """解析 "host:port,[v6地址]:port" 格式的端点列表"""
+        endpoints = []
+        for part in endpoint_str.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            host, _, port = part.rpartition(':')
+            endpoints.append((host.strip('[]') or default_host, int(port)))
+        return endpoints
+
+    @staticmethod
+    def expand_targets(target_str: str, limit: Optional[int] = None) -> List[str]:
+        """展开目标列表，支持逗号分隔的主机、CIDR网段和 "起始-结束" 地址范围
+
+        展开后的目标超过 limit 个时抛出 ValueError（每段展开后即检查）。
+        """
+        targets = []
+        for part in target_str.split(','):
+            if limit is not None and len(targets) > limit:
+                raise ValueError(f"目标过多（上限 {limit} 个）")
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                if '/' in part:
+                    network = ipaddress.ip_network(part.strip('[]'), strict=False)
+                    if network.num_addresses > MAX_EXPAND_TARGETS:
+                        raise ValueError(f"网段过大: {part}")
+                    hosts = list(network.hosts()) or [network.network_address]
+                    targets.extend(str(ip) for ip in hosts)
+                elif '-' in part:
+                    start_str, end_str = part.split('-', 1)
+                    start = ipaddress.ip_address(start_str.strip())
+                    end = ipaddress.ip_address(end_str.strip())
+                    if start.version != end.version or end < start:
+                        raise ValueError(f"无效的地址范围: {part}")
+                    if int(end) - int(start) >= MAX_EXPAND_TARGETS:
+                        raise ValueError(f"地址范围过大: {part}")
+                    targets.extend(str(ipaddress.ip_address(i))
+                                   for i in range(int(start), int(end) + 1))
+                else:
+                    targets.append(part.strip('[]'))
+            except ValueError:
+                # 不是地址范围时按主机名处理（如带连字符的域名）
+                if '/' in part or ':' in part or not any(c.isalpha() for c in part):
+                    raise
+                targets.append(part)
+        if limit is not None and len(targets) > limit:
+            raise ValueError(f"目标过多（上限 {limit} 个）")
+        return targets
+
+    @staticmethod
+    def _scan_tcp_port(host: str, port: int) -> Tuple[bool, str]:
+        """TCP端口扫描（双栈主机按先应答的地址族判定）"""
+        try:
+            sock, address = NetworkOperations.connect_happy_eyeballs(host, port)
+        except socket.gaierror:
+            raise
+        except OSError:
+            return False, f"TCP 端口 {port} 状态: 关闭"
+        family = NetworkOperations.family_name(sock.family)
+        sock.close()
+        return True, f"TCP 端口 {port} 状态: 开放 ({family} {address[0]})"
+
+    @staticmethod
+    def _scan_tcp_port_via_proxy(host: str, port: int, proxy: str) -> Tuple[bool, str]:
+        """经代理的TCP端口探测，分别报告到代理和代理到目标的耗时
+
+        只有代理明确回复目标拒绝连接或不可达时判定为关闭；认证失败、并发已满、
+        规则不允许等代理自身的错误抛出异常，端口状态未知。
+        """
+        from .proxy import ProxyError, ProxyTargetError
+
+        try:
+            with NetworkOperations.open_connection(host, port, proxy) as (_, timings):
+                return True, (f"TCP 端口 {port} 状态: 开放 (经代理 {timings['proxy']}，"
+                              f"代理 {timings['hop_ms']:.1f}ms，目标 {timings['target_ms']:.1f}ms)")
+        except ProxyTargetError as e:
+            return False, f"TCP 端口 {port} 状态: 关闭 ({str(e)})"
+        except ProxyError as e:
+            raise ProxyError(f"TCP 端口 {port} 状态: 未知 (代理错误: {str(e)})") from e
+
+    @staticmethod
+    def _scan_udp_port(host: str, port: int) -> Tuple[bool, str]:
+        """UDP端口扫描"""
+        candidates = NetworkOperations.resolve_addresses(host, port, socket.SOCK_DGRAM)
+        error: Optional[Exception] = None
+        for family, sockaddr in candidates:
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.settimeout(SOCKET_TIMEOUT)
+            try:
+                try:
+                    sock.sendto(b"", sockaddr)
+                except OSError as e:
+                    # 该地址族不可用（如没有IPv6路由），换下一个候选地址
+                    error = e
+                    continue
+                data, addr = sock.recvfrom(1024)
+                return True, f"UDP 端口 {port} 状态: 开放 (收到响应)"
+            except socket.timeout:
+                return False, f"UDP 端口 {port} 状态: 可能开放 (无响应)"
+            except Exception as e:
+                return False, f"UDP 端口 {port} 状态: 可能关闭 ({str(e)})"
+            finally:
+                sock.close()
+        return False, f"UDP 端口 {port} 状态: 可能关闭 ({str(error)})"
@@ -0,0 +1,428 @@
+"""经 SOCKS5 / HTTP CONNECT 代理探测
+
+只能通过跳板代理访问的网段，TCP建连探测、banner 抓取和 HTTP 探测都可以
+经代理进行。每个代理一个 ProxyClient 实例（按 URL 共享）：
+
+- SOCKS5 的方法协商、用户名密码认证和 CONNECT 请求合并为一次发送，
+  握手只需一个往返；
+- 同时进行中的隧道数受信号量限制，避免压垮代理本身；
+- 预先建立若干到代理的 TCP 连接，取用后在后台补充；
+- 到代理的耗时（hop）与代理到目标的耗时（target）分别统计。
+
+LocalProxy 是一个同时支持 SOCKS5 和 HTTP CONNECT 的最小代理，
+用于在本机验证代理探测。
+"""
+import base64
+import contextlib
+import ipaddress
+import selectors
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit, unquote
+from src.core.metrics import REGISTRY
+from src.core.network import NetworkOperations
+from src.core.utils import logger
+from src.config.settings import ProxySettings as Settings
+
+SCHEMES = {'socks5': 1080, 'socks5h': 1080, 'http': 8080}
+
+PROXY_LATENCY = REGISTRY.histogram("proxy_latency_seconds", "经代理探测的分段耗时（秒）", ("hop",))
+PROXY_HANDSHAKES = REGISTRY.counter("proxy_handshakes_total", "代理握手结果", ("result",))
+
+_SOCKS_ERRORS = {
+    1: "代理一般性失败", 2: "代理规则不允许", 3: "网络不可达", 4: "主机不可达",
+    5: "连接被拒绝", 6: "TTL过期", 7: "不支持的命令", 8: "不支持的地址类型",
+}
+# 代理明确回复目标不可达/拒绝连接的应答，只有这些说明目标端口关闭
+_SOCKS_TARGET_ERRORS = {3, 4, 5}
+_HTTP_TARGET_ERRORS = {'502', '504'}
+_MAX_HEAD = 16384
+
+
+class ProxyError(OSError):
+    """代理握手失败"""
+
+
+class ProxyTargetError(ProxyError):
+    """代理已连通，但代理到目标的连接失败（拒绝连接或不可达）"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """读取指定长度的数据"""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ProxyError("代理提前关闭连接")
+        received += count
+    return bytes(buf)
+
+
+def _read_http_head(sock: socket.socket) -> bytes:
+    """读取HTTP头部，不多读头部之后的隧道数据"""
+    head = b''
+    while True:
+        data = sock.recv(4096, socket.MSG_PEEK)
+        if not data:
+            raise ProxyError("代理提前关闭连接")
+        end = (head[-3:] + data).find(b'\r\n\r\n')
+        if end != -1:
+            # 只取到头部结束为止，隧道数据留在内核缓冲区
+            take = end + 4 - len(head[-3:])
+            return head + _recv_exact(sock, take)
+        head += _recv_exact(sock, len(data))
+        if len(head) > _MAX_HEAD:
+            raise ProxyError("代理响应头过长")
+
+
+def _socks5_address(host: str, port: int, resolve_locally: bool) -> bytes:
+    """编码 SOCKS5 目标地址"""
+    host = host.strip('[]')
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        if resolve_locally:
+            address = ipaddress.ip_address(
+                NetworkOperations.resolve_addresses(host, port)[0][1][0].split('%')[0])
+        else:
+            name = host.encode('idna')
+            return b'\x03' + bytes([len(name)]) + name + struct.pack('!H', port)
+    atyp = b'\x01' if address.version == 4 else b'\x04'
+    return atyp + address.packed + struct.pack('!H', port)
+
+
+class ProxyClient:
+    """单个代理服务器的客户端：并发上限 + 预热连接池"""
+
+    def __init__(self, url: str, max_connections: int = Settings.MAX_CONNECTIONS,
+                 pool_size: int = Settings.POOL_SIZE):
+        parts = urlsplit(url if '://' in url else f"socks5://{url}")
+        self.scheme = parts.scheme.lower()
+        if self.scheme not in SCHEMES:
+            raise ValueError(f"不支持的代理类型: {parts.scheme}")
+        if not parts.hostname:
+            raise ValueError(f"无效的代理地址: {url}")
+        self.host = parts.hostname
+        self.port = parts.port or SCHEMES[self.scheme]
+        self.username = unquote(parts.username) if parts.username else None
+        self.password = unquote(parts.password) if parts.password else ''
+        host = f"[{self.host}]" if ':' in self.host else self.host
+        self.name = f"{self.scheme}://{host}:{self.port}"
+        self.pool_size = pool_size
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._pool = deque()  # (套接字, 到代理的耗时, 建立时间)
+        self._pool_lock = threading.Lock()
+        self._refilling = False
+
+    # ------------------------------------------------------------------
+    # 到代理的连接
+    # ------------------------------------------------------------------
+    def _dial(self, timeout: float) -> Tuple[socket.socket, float]:
+        """建立到代理的TCP连接，返回 (套接字, 耗时秒)"""
+        start = time.perf_counter()
+        sock, _ = NetworkOperations.connect_happy_eyeballs(self.host, self.port, timeout)
+        hop = time.perf_counter() - start
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, hop
+
+    @staticmethod
+    def _alive(sock: socket.socket) -> bool:
+        """空闲连接是否仍可用（未被代理关闭）"""
+        sock.setblocking(False)
+        try:
+            sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.setblocking(True)
+        # 收到 EOF 或意外的数据
+        return False
+
+    def _take_warm(self) -> Optional[Tuple[socket.socket, float]]:
+        """取出一个可用的预热连接"""
+        now = time.monotonic()
+        with self._pool_lock:
+            while self._pool:
+                sock, hop, created = self._pool.popleft()
+                if now - created < Settings.IDLE_TIMEOUT and self._alive(sock):
+                    return sock, hop
+                sock.close()
+        return None
+
+    def warm(self, count: Optional[int] = None, timeout: float = Settings.CONNECT_TIMEOUT) -> int:
+        """预先建立到代理的连接，返回池中连接数"""
+        target = self.pool_size if count is None else count
+        while True:
+            with self._pool_lock:
+                if len(self._pool) >= target:
+                    return len(self._pool)
+            try:
+                sock, hop = self._dial(timeout)
+            except OSError as e:
+                logger.warning(f"预热代理连接失败 {self.name}: {str(e)}")
+                with self._pool_lock:
+                    return len(self._pool)
+            with self._pool_lock:
+                self._pool.append((sock, hop, time.monotonic()))
+
+    def _refill_async(self):
+        """在后台补充预热连接"""
+        with self._pool_lock:
+            if self._refilling or len(self._pool) >= self.pool_size:
+                return
+            self._refilling = True
+
+        def refill():
+            try:
+                self.warm()
+            finally:
+                self._refilling = False
+
+        threading.Thread(target=refill, daemon=True).start()
+
+    def close(self):
+        """关闭所有预热连接"""
+        with self._pool_lock:
+            while self._pool:
+                self._pool.popleft()[0].close()
+
+    # ------------------------------------------------------------------
+    # 握手
+    # ------------------------------------------------------------------
+    def _socks5_handshake(self, sock: socket.socket, host: str, port: int):
+        """SOCKS5 握手：方法协商、认证和 CONNECT 一次发出"""
+        method = 0x02 if self.username else 0x00
+        request = bytearray(b'\x05\x01' + bytes([method]))
+        if self.username:
+            user = self.username.encode('utf-8')
+            password = self.password.encode('utf-8')
+            request += b'\x01' + bytes([len(user)]) + user + bytes([len(password)]) + password
+        request += b'\x05\x01\x00' + _socks5_address(host, port, self.scheme == 'socks5')
+        sock.sendall(request)
+
+        version, chosen = _recv_exact(sock, 2)
+        if version != 5 or chosen != method:
+            raise ProxyError("代理不接受所需的认证方式")
+        if self.username:
+            _, status = _recv_exact(sock, 2)
+            if status != 0:
+                raise ProxyError("代理认证失败")
+        version, reply, _, atyp = _recv_exact(sock, 4)
+        if reply != 0:
+            error = ProxyTargetError if reply in _SOCKS_TARGET_ERRORS else ProxyError
+            raise error(_SOCKS_ERRORS.get(reply, f"代理返回错误码 {reply}"))
+        if atyp == 1:
+            _recv_exact(sock, 4 + 2)
+        elif atyp == 4:
+            _recv_exact(sock, 16 + 2)
+        elif atyp == 3:
+            _recv_exact(sock, _recv_exact(sock, 1)[0] + 2)
+        else:
+            raise ProxyError(f"代理返回未知地址类型 {atyp}")
+
+    def _http_handshake(self, sock: socket.socket, host: str, port: int):
+        """HTTP CONNECT 握手"""
+        host = host.strip('[]')
+        authority = f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+        lines = [f"CONNECT {authority} HTTP/1.1", f"Host: {authority}"]
+        if self.username:
+            token = base64.b64encode(f"{self.username}:{self.password}".encode('utf-8'))
+            lines.append(f"Proxy-Authorization: Basic {token.decode('ascii')}")
+        sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode('utf-8'))
+        status_line = _read_http_head(sock).split(b'\r\n', 1)[0].decode('latin-1')
+        parts = status_line.split(' ', 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise ProxyError(f"无效的代理响应: {status_line}")
+        if parts[1] in _HTTP_TARGET_ERRORS:
+            raise ProxyTargetError(f"代理无法连接目标: {status_line}")
+        if parts[1] != '200':
+            raise ProxyError(f"代理拒绝连接: {status_line}")
+
+    @contextlib.contextmanager
+    def open(self, host: str, port: int,
+             timeout: float = Settings.CONNECT_TIMEOUT) -> Iterator[Tuple[socket.socket, dict]]:
+        """经代理建立到目标的隧道，产出 (套接字, 分段耗时)"""
+        if not self._slots.acquire(timeout=timeout):
+            raise ProxyError(f"代理 {self.name} 并发已满")
+        sock = None
+        try:
+            warm = self._take_warm()
+            if warm is not None:
+                self._refill_async()
+            sock, hop = warm or self._dial(timeout)
+            sock.settimeout(timeout)
+            start = time.perf_counter()
+            try:
+                if self.scheme == 'http':
+                    self._http_handshake(sock, host, port)
+                else:
+                    self._socks5_handshake(sock, host, port)
+            except OSError:
+                PROXY_HANDSHAKES.labels("error").inc()
+                raise
+            target = time.perf_counter() - start
+            PROXY_HANDSHAKES.labels("ok").inc()
+            PROXY_LATENCY.labels("proxy").observe(hop)
+            PROXY_LATENCY.labels("target").observe(target)
+            yield sock, {'proxy': self.name, 'hop_ms': round(hop * 1000, 3),
+                         'target_ms': round(target * 1000, 3), 'reused': warm is not None}
+        finally:
+            if sock is not None:
+                sock.close()
+            self._slots.release()
+
+
+_clients: Dict[str, ProxyClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_proxy(url: str) -> ProxyClient:
+    """按 URL 共享代理客户端，使并发上限和预热连接对所有探测生效"""
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = ProxyClient(url)
+        return client
+
+
+# ----------------------------------------------------------------------
+# 本地代理
+# ----------------------------------------------------------------------
+class _LocalProxyHandler(socketserver.BaseRequestHandler):
+    """处理单个客户端连接"""
+
+    def handle(self):
+        sock = self.request
+        sock.settimeout(Settings.CONNECT_TIMEOUT)
+        try:
+            first = sock.recv(1, socket.MSG_PEEK)
+            if not first:
+                return
+            upstream = self._socks5(sock) if first == b'\x05' else self._http(sock)
+        except (OSError, ValueError) as e:
+            logger.debug(f"本地代理握手失败 {self.client_address}: {str(e)}")
+            return
+        if upstream is not None:
+            with upstream:
+                self._relay(sock, upstream)
+
+    def _connect(self, host: str, port: int) -> Optional[socket.socket]:
+        self.server.handshakes += 1
+        if self.server.target_delay:
+            time.sleep(self.server.target_delay)
+        try:
+            return socket.create_connection((host, port), timeout=Settings.CONNECT_TIMEOUT)
+        except OSError:
+            return None
+
+    def _socks5(self, sock: socket.socket) -> Optional[socket.socket]:
+        _, count = _recv_exact(sock, 2)
+        methods = _recv_exact(sock, count)
+        credentials = self.server.credentials
+        method = 0x02 if credentials else 0x00
+        if method not in methods:
+            sock.sendall(b'\x05\xff')
+            return None
+        sock.sendall(bytes([5, method]))
+        if credentials:
+            _recv_exact(sock, 1)
+            user = _recv_exact(sock, _recv_exact(sock, 1)[0]).decode('utf-8')
+            password = _recv_exact(sock, _recv_exact(sock, 1)[0]).decode('utf-8')
+            ok = (user, password) == credentials
+            sock.sendall(b'\x01\x00' if ok else b'\x01\x01')
+            if not ok:
+                return None
+        _, command, _, atyp = _recv_exact(sock, 4)
+        if atyp == 1:
+            host = socket.inet_ntop(socket.AF_INET, _recv_exact(sock, 4))
+        elif atyp == 4:
+            host = socket.inet_ntop(socket.AF_INET6, _recv_exact(sock, 16))
+        else:
+            host = _recv_exact(sock, _recv_exact(sock, 1)[0]).decode('idna')
+        (port,) = struct.unpack('!H', _recv_exact(sock, 2))
+        upstream = self._connect(host, port) if command == 1 else None
+        reply = 0 if upstream is not None else (5 if command == 1 else 7)
+        sock.sendall(bytes([5, reply, 0, 1]) + bytes(6))
+        return upstream
+
+    def _http(self, sock: socket.socket) -> Optional[socket.socket]:
+        request_line = _read_http_head(sock).split(b'\r\n', 1)[0].decode('latin-1')
+        method, authority, _ = request_line.split(' ', 2)
+        if method.upper() != 'CONNECT':
+            sock.sendall(b"HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n")
+            return None
+        host, _, port = authority.rpartition(':')
+        upstream = self._connect(host.strip('[]'), int(port))
+        if upstream is None:
+            sock.sendall(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            return None
+        sock.sendall(b"HTTP/1.1 200 Connection Established\r\n\r\n")
+        return upstream
+
+    @staticmethod
+    def _relay(client: socket.socket, upstream: socket.socket):
+        """双向转发直到任一方关闭"""
+        client.settimeout(None)
+        upstream.settimeout(None)
+        peers = {client: upstream, upstream: client}
+        with selectors.DefaultSelector() as selector:
+            for sock in peers:
+                selector.register(sock, selectors.EVENT_READ)
+            while True:
+                for key, _ in selector.select():
+                    try:
+                        data = key.fileobj.recv(65536)
+                        if not data:
+                            return
+                        peers[key.fileobj].sendall(data)
+                    except OSError:
+                        return
+
+
+class LocalProxy(socketserver.ThreadingTCPServer):
+    """本地代理（SOCKS5 与 HTTP CONNECT），用于验证代理探测
+
+    credentials 为 (用户名, 密码) 时要求认证（仅 SOCKS5）；
+    target_delay 模拟代理到目标之间的额外时延。
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 credentials: Optional[Tuple[str, str]] = None, target_delay: float = 0):
+        super().__init__((host, port), _LocalProxyHandler)
+        self.credentials = credentials
+        self.target_delay = target_delay
+        self.handshakes = 0
+        self._thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server_address[0], self.server_address[1]
+
+    def url(self, scheme: str = "socks5h") -> str:
+        """代理 URL"""
+        auth = f"{self.credentials[0]}:{self.credentials[1]}@" if self.credentials else ""
+        return f"{scheme}://{auth}{self.address[0]}:{self.address[1]}"
+
+    def start(self):
+        """在后台线程中启动代理"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止代理"""
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
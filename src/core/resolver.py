@@ -0,0 +1,215 @@
+"""批量DNS解析
+
+为扫描/探测结果批量做正向解析和反向（PTR）解析。所有查询共享：
+- 带TTL的LRU缓存（失败结果也缓存，时间较短）；
+- 进行中查询去重，同一名字同时只查一次；
+- 固定大小的线程池限制并发；
+- 令牌桶限速，避免对DNS服务器造成冲击。
+
+结果通过 Future 或回调返回，调用方无需等待全部查询完成即可展示结果。
+"""
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from src.core.metrics import REGISTRY
+from src.core.utils import logger
+from src.config.settings import ResolverSettings as Settings
+
+FORWARD = "A"
+REVERSE = "PTR"
+
+DNS_CACHE_HITS = REGISTRY.counter("dns_cache_hits_total", "DNS解析缓存命中次数")
+DNS_CACHE_MISSES = REGISTRY.counter("dns_cache_misses_total", "DNS解析缓存未命中次数")
+REGISTRY.hit_ratio("dns_cache_hit_ratio", "DNS解析缓存命中率", DNS_CACHE_HITS, DNS_CACHE_MISSES)
+DNS_QUERIES = REGISTRY.counter("dns_queries_total", "实际发出的DNS查询数", ("type", "result"))
+
+
+def default_resolve(name: str) -> List[str]:
+    """正向解析，返回去重后的地址列表"""
+    addresses = []
+    for _, _, _, _, sockaddr in socket.getaddrinfo(name, None, socket.AF_UNSPEC,
+                                                   socket.SOCK_STREAM):
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses
+
+
+def default_reverse(address: str) -> Optional[str]:
+    """反向解析，返回主机名"""
+    return socket.gethostbyaddr(address)[0]
+
+
+class RateLimiter:
+    """令牌桶限速（线程安全）"""
+
+    def __init__(self, rate: float, burst: int = Settings.BURST):
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，必要时等待"""
+        with self._lock:
+            now = time.monotonic()
+            # 空闲期间最多积攒 burst 个令牌
+            slot = max(self._next, now - self.burst * self.interval)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BulkResolver:
+    """带缓存、并发上限和限速的批量解析器
+
+    resolve_fn / reverse_fn 可替换为自定义实现（如测试用的本地区域数据）。
+    """
+
+    def __init__(self, max_workers: int = Settings.MAX_WORKERS,
+                 rate: float = Settings.RATE_LIMIT,
+                 resolve_fn: Callable[[str], List[str]] = default_resolve,
+                 reverse_fn: Callable[[str], Optional[str]] = default_reverse,
+                 cache_size: int = Settings.CACHE_SIZE):
+        self.resolve_fn = resolve_fn
+        self.reverse_fn = reverse_fn
+        self.cache_size = cache_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resolver")
+        self._limiter = RateLimiter(rate) if rate else None
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, object]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+    def _cached(self, key: Tuple[str, str]) -> Tuple[bool, object]:
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                return True, entry[1]
+            del self._cache[key]
+        return False, None
+
+    def _store(self, key: Tuple[str, str], value, ttl: float):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _lookup(self, key: Tuple[str, str]):
+        """执行一次查询；任何失败都按空结果缓存，进行中记录总会移除"""
+        kind, name = key
+        try:
+            if self._limiter:
+                self._limiter.acquire()
+            try:
+                value = self.resolve_fn(name) if kind == FORWARD else self.reverse_fn(name)
+                result = "ok" if value else "empty"
+            except (OSError, UnicodeError) as e:
+                logger.debug(f"{kind} 查询失败 {name}: {str(e)}")
+                value, result = ([] if kind == FORWARD else None), "empty"
+            except Exception as e:
+                # 自定义解析函数的意外错误同样当作查询失败，避免调用方等待不到结果
+                logger.error(f"{kind} 查询出错 {name}: {str(e)}")
+                value, result = ([] if kind == FORWARD else None), "error"
+            DNS_QUERIES.labels(kind, result).inc()
+            self._store(key, value, Settings.POSITIVE_TTL if value else Settings.NEGATIVE_TTL)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def submit(self, kind: str, name: str) -> Future:
+        """提交一次查询，命中缓存或已在查询中时不再重复发出"""
+        key = (kind, name)
+        with self._lock:
+            hit, value = self._cached(key)
+            if not hit:
+                future = self._inflight.get(key)
+                if future is None:
+                    DNS_CACHE_MISSES.inc()
+                    future = self._inflight[key] = self._pool.submit(self._lookup, key)
+                else:
+                    DNS_CACHE_HITS.inc()
+                return future
+        DNS_CACHE_HITS.inc()
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def resolve(self, name: str, timeout: Optional[float] = None) -> List[str]:
+        """正向解析单个名字"""
+        return self.submit(FORWARD, name).result(timeout)
+
+    def reverse(self, address: str, timeout: Optional[float] = None) -> Optional[str]:
+        """反向解析单个地址"""
+        return self.submit(REVERSE, address).result(timeout)
+
+    def _many(self, kind: str, names: Iterable[str],
+              callback: Optional[Callable[[str, object], None]]) -> Dict[str, Future]:
+        futures: Dict[str, Future] = {}
+        for name in names:
+            if name in futures:
+                continue
+            future = futures[name] = self.submit(kind, name)
+            if callback:
+                future.add_done_callback(lambda f, name=name: self._notify(callback, name, f))
+        return futures
+
+    @staticmethod
+    def _notify(callback: Callable[[str, object], None], name: str, future: Future):
+        try:
+            callback(name, future.result())
+        except Exception as e:
+            logger.error(f"解析回调失败: {str(e)}")
+
+    def resolve_many(self, names: Iterable[str],
+                     callback: Optional[Callable[[str, List[str]], None]] = None
+                     ) -> Dict[str, Future]:
+        """批量正向解析，每个名字完成时调用 callback(名字, 地址列表)"""
+        return self._many(FORWARD, names, callback)
+
+    def reverse_many(self, addresses: Iterable[str],
+                     callback: Optional[Callable[[str, Optional[str]], None]] = None
+                     ) -> Dict[str, Future]:
+        """批量反向解析，每个地址完成时调用 callback(地址, 主机名或None)"""
+        return self._many(REVERSE, addresses, callback)
+
+    def stats(self) -> dict:
+        """缓存与查询状态"""
+        with self._lock:
+            return {'entries': len(self._cache), 'inflight': len(self._inflight)}
+
+    def shutdown(self, wait: bool = True):
+        """停止线程池"""
+        self._pool.shutdown(wait=wait)
+
+
+_resolver: Optional[BulkResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> BulkResolver:
+    """进程内共享的解析器，所有调用方共用缓存和并发上限"""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = BulkResolver()
+        return _resolver
+
+
+REGISTRY.gauge("dns_cache_entries", "DNS解析缓存条目数").set_function(
+    lambda: len(_resolver._cache) if _resolver else 0)
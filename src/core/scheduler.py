@@ -0,0 +1,282 @@
+"""定时探测任务调度
+
+周期性任务（每 5 秒 ping 某主机、每分钟探测某端口、每 10 分钟解析某域名……）
+由一个调度线程统一管理：任务按下次执行时间放在最小堆里，调度线程只在
+最早的任务到期时醒来，空闲时不占用CPU；到期的任务交给固定大小的线程池执行。
+
+- 首次执行时间在一个间隔内随机分散，之后每次在基准时间上叠加随机偏移，
+  避免大量任务同时触发；基准时间按固定频率推进，不会因执行耗时而漂移；
+- 同一任务上一次尚未结束时跳过本次执行（计入 overlaps）；
+- 探测结果可写入时序存储，供延迟分析报表使用。
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from src.core.metrics import REGISTRY
+from src.core.network import NetworkOperations
+from src.core.timeseries import TimeSeriesStore
+from src.core.utils import logger
+from src.config.settings import PING_COUNT, SchedulerSettings as Settings
+
+JOB_TYPES = ('ping', 'dns', 'scan')
+
+SCHEDULER_RUNS = REGISTRY.counter("scheduler_runs_total", "定时任务执行次数", ("type", "result"))
+SCHEDULER_OVERLAPS = REGISTRY.counter("scheduler_overlaps_total", "因上次未结束而跳过的执行次数")
+SCHEDULER_LAG = REGISTRY.histogram("scheduler_lag_seconds", "任务实际开始时间相对计划时间的延迟（秒）",
+                                   buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+
+
+class ScheduledJob:
+    """一个周期性探测任务"""
+    __slots__ = ('id', 'type', 'target', 'interval', 'jitter', 'base', 'due', 'running',
+                 'cancelled', 'runs', 'overlaps', 'failures', 'last_run', 'last_success',
+                 'last_duration')
+
+    def __init__(self, job_id: int, job_type: str, target, interval: float, jitter: float):
+        self.id = job_id
+        self.type = job_type
+        self.target = target
+        self.interval = interval
+        self.jitter = jitter
+        self.base = 0.0
+        self.due = 0.0
+        self.running = False
+        self.cancelled = False
+        self.runs = 0
+        self.overlaps = 0
+        self.failures = 0
+        self.last_run: Optional[float] = None
+        self.last_success: Optional[bool] = None
+        self.last_duration: Optional[float] = None
+
+    @property
+    def series(self) -> str:
+        """写入时序存储时使用的序列名"""
+        if self.type == 'ping':
+            return self.target
+        if self.type == 'scan':
+            host, port = self.target
+            host = f"[{host}]" if ':' in host else host
+            return f"tcp://{host}:{port}"
+        return f"dns://{self.target}"
+
+    def snapshot(self) -> dict:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'target': self.target,
+            'interval': self.interval,
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'overlaps': self.overlaps,
+            'last_run': self.last_run,
+            'last_success': self.last_success,
+            'last_duration_ms': round(self.last_duration * 1000, 3)
+            if self.last_duration is not None else None,
+        }
+
+
+def run_check(job_type: str, target) -> Tuple[bool, List[Optional[float]], str]:
+    """执行一次探测，返回 (是否成功, 时延样本毫秒列表（None 为丢失）, 简要说明)"""
+    if job_type == 'ping':
+        success, output = NetworkOperations.ping(target)
+        rtts = NetworkOperations.ping_rtts(output) if success else []
+        samples = rtts + [None] * max(PING_COUNT - len(rtts), 0)
+        return bool(rtts), samples, f"{len(rtts)}/{PING_COUNT} 应答"
+    start = time.perf_counter()
+    if job_type == 'scan':
+        host, port = target
+        success, message = NetworkOperations.scan_port(host, int(port), "TCP")
+    elif job_type == 'dns':
+        success, result = NetworkOperations.resolve_dns(target)
+        message = ', '.join(result['addresses']) if success else result['error']
+    else:
+        raise ValueError(f"未知的任务类型: {job_type}")
+    elapsed = (time.perf_counter() - start) * 1000
+    return success, [elapsed if success else None], message
+
+
+class ProbeScheduler:
+    """单线程调度的定时探测器
+
+    callback 在工作线程中被调用，参数为每次执行的结果字典。
+    """
+
+    def __init__(self, max_workers: int = Settings.MAX_WORKERS,
+                 store: Optional[TimeSeriesStore] = None,
+                 callback: Optional[Callable[[dict], None]] = None,
+                 check: Callable[[str, object], Tuple[bool, List[Optional[float]], str]] = run_check):
+        self.store = store
+        self.callback = callback
+        self.check = check
+        self._jobs: Dict[int, ScheduledJob] = {}
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._ids = itertools.count(1)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scheduler")
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._next_flush = time.monotonic() + Settings.FLUSH_INTERVAL
+        # 首次刷盘时即清理一次，之后每 RETENTION_INTERVAL 清理一次
+        self._next_retention = time.monotonic()
+
+        REGISTRY.gauge("scheduler_jobs", "已调度的定时任务数").set_function(lambda: len(self._jobs))
+
+    # ------------------------------------------------------------------
+    # 任务管理（可在任意线程调用）
+    # ------------------------------------------------------------------
+    def add(self, job_type: str, target, interval: float,
+            jitter: float = Settings.JITTER) -> int:
+        """添加周期任务，返回任务ID"""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"未知的任务类型: {job_type}")
+        interval = max(float(interval), Settings.MIN_INTERVAL)
+        job = ScheduledJob(next(self._ids), job_type, target, interval, jitter)
+        # 首次执行在一个间隔内随机分散
+        job.base = time.monotonic() + random.uniform(0, interval)
+        job.due = job.base
+        with self._condition:
+            self._jobs[job.id] = job
+            self._push(job)
+        return job.id
+
+    def remove(self, job_id: int):
+        """移除任务（堆中的旧条目在到期时丢弃）"""
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+            if job is not None:
+                job.cancelled = True
+
+    def jobs(self) -> List[dict]:
+        """所有任务的当前状态"""
+        with self._condition:
+            return [job.snapshot() for job in self._jobs.values()]
+
+    def _push(self, job: ScheduledJob):
+        """调用方需持有 _condition"""
+        heapq.heappush(self._heap, (job.due, next(self._sequence), job))
+        if self._heap[0][2] is job:
+            # 新任务成为最早到期的任务，唤醒调度线程重新计算等待时间
+            self._condition.notify()
+
+    # ------------------------------------------------------------------
+    # 调度线程
+    # ------------------------------------------------------------------
+    def start(self):
+        """启动调度线程"""
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="probe-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        """停止调度并等待正在执行的探测结束"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self._pool.shutdown(wait=wait)
+        if self.store is not None:
+            self.store.flush()
+
+    def _run(self):
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                if self.store is not None and now >= self._next_flush:
+                    self._next_flush = now + Settings.FLUSH_INTERVAL
+                    retention = now >= self._next_retention
+                    if retention:
+                        self._next_retention = now + Settings.RETENTION_INTERVAL
+                    self._pool.submit(self._flush_store, retention)
+                timeout = self._next_flush - now if self.store is not None else None
+                if self._heap:
+                    due = self._heap[0][0]
+                    if due <= now:
+                        _, _, job = heapq.heappop(self._heap)
+                        if not job.cancelled:
+                            self._dispatch(job, now)
+                        continue
+                    timeout = due - now if timeout is None else min(timeout, due - now)
+                self._condition.wait(timeout)
+
+    def _flush_store(self, retention: bool):
+        """在工作线程中刷盘，需要时顺带删除过期分区"""
+        try:
+            self.store.flush()
+            if retention:
+                self.store.apply_retention()
+        except Exception as e:
+            logger.error(f"时序数据刷盘失败: {str(e)}")
+
+    def _dispatch(self, job: ScheduledJob, now: float):
+        """执行到期任务并安排下一次，调用方需持有 _condition"""
+        if job.running:
+            job.overlaps += 1
+            SCHEDULER_OVERLAPS.inc()
+            logger.debug(f"定时任务 {job.id} 上次执行未结束，跳过本次")
+        else:
+            job.running = True
+            SCHEDULER_LAG.observe(now - job.due)
+            self._pool.submit(self._execute, job)
+        # 基准时间按固定频率推进；落后超过一个间隔时（如系统休眠）从当前时间重新开始
+        job.base += job.interval
+        if job.base < now:
+            job.base = now + job.interval
+        job.due = job.base + random.uniform(-job.jitter, job.jitter) * job.interval
+        self._push(job)
+
+    def _execute(self, job: ScheduledJob):
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            success, samples, detail = self.check(job.type, job.target)
+        except Exception as e:
+            success, samples, detail = False, [None], str(e)
+        duration = time.perf_counter() - start
+        job.runs += 1
+        job.failures += 0 if success else 1
+        job.last_run = started
+        job.last_success = success
+        job.last_duration = duration
+        job.running = False
+        SCHEDULER_RUNS.labels(job.type, "ok" if success else "failed").inc()
+
+        if self.store is not None and not job.cancelled:
+            try:
+                for sample in samples:
+                    self.store.record(job.series, sample, started)
+            except OSError as e:
+                logger.error(f"写入时序数据失败 {job.series}: {str(e)}")
+
+        if self.callback:
+            try:
+                self.callback({'job': job.id, 'type': job.type, 'target': job.target,
+                               'time': started, 'success': success,
+                               'duration_ms': round(duration * 1000, 3),
+                               'samples': [round(s, 3) if s is not None else None for s in samples],
+                               'detail': detail})
+            except Exception as e:
+                logger.error(f"定时任务回调失败: {str(e)}")
+
+
+def parse_job_spec(spec: str) -> Tuple[str, object, float]:
+    """解析 "类型:目标:间隔秒" 格式的任务描述
+
+    例如 "ping:8.8.8.8:5"、"scan:10.0.0.1:443:60"、"dns:example.com:600"。
+    """
+    job_type, _, rest = spec.partition(':')
+    target, _, interval = rest.rpartition(':')
+    if job_type not in JOB_TYPES or not target or not interval:
+        raise ValueError(f"无效的任务描述: {spec}")
+    if job_type == 'scan':
+        return job_type, NetworkOperations.parse_endpoints(target)[0], float(interval)
+    return job_type, target.strip('[]'), float(interval)
@@ -0,0 +1,364 @@
+"""并行目录大小计算引擎
+
+用显式栈代替递归：每个目录是一个任务节点，工作线程 os.scandir 一个目录后把
+子目录作为新任务压入自己的双端队列。线程从自己队列的尾部取任务（深度优先，
+待处理节点数少），空闲时从其他线程队列的头部窃取（通常是较大的子树），
+深层目录树也不会出现递归深度问题，且各线程负载自动均衡。
+
+目录的合计在其所有子目录完成后自底向上累加到父目录；每个完整统计的子目录
+都可通过 on_subtotal 回调取得，on_directory 回调则给出每个目录自身的修改时间、
+直接包含的文件字节数和子目录名，调用方可据此缓存/索引子树结果。
+
+大小为目录树中所有非目录项（普通文件及符号链接本身）的 lstat 大小之和，
+不跟随符号链接，不含目录项本身占用的大小。
+"""
+import os
+import stat
+import threading
+import time
+from collections import deque
+from typing import Callable, List, NamedTuple, Optional
+from src.core.metrics import REGISTRY
+from src.core.utils import logger
+from src.config.settings import FileSystemSettings as Settings
+
+SIZE_DIRS_SCANNED = REGISTRY.counter("size_engine_dirs_scanned_total", "大小计算引擎扫描的目录数")
+SIZE_STEALS = REGISTRY.counter("size_engine_steals_total", "工作线程从其他线程窃取的任务数")
+
+# on_directory(目录路径, 修改时间ns, 直接包含的文件字节数, 子目录名列表)
+DirectoryCallback = Callable[[str, int, int, List[str]], None]
+
+
+class SizeResult(NamedTuple):
+    """一次大小计算的结果"""
+    size: int
+    files: int
+    dirs: int
+    errors: int
+    complete: bool  # False 表示被取消或超过深度限制（无法读取的目录计入 errors）
+    elapsed: float
+
+
+class _Node:
+    """目录任务节点"""
+    __slots__ = ('path', 'parent', 'depth', 'pending', 'total', 'partial')
+
+    def __init__(self, path: str, parent: Optional['_Node'], depth: int):
+        self.path = path
+        self.parent = parent
+        self.depth = depth
+        self.pending = 1  # 自身扫描 + 未完成的子目录数
+        self.total = 0
+        self.partial = False
+
+
+class SizeJob:
+    """一次进行中的大小计算"""
+
+    def __init__(self, path: str,
+                 progress: Optional[Callable[[dict], None]] = None,
+                 on_subtotal: Optional[Callable[[str, int], None]] = None,
+                 on_directory: Optional[DirectoryCallback] = None,
+                 max_depth: int = Settings.MAX_DEPTH,
+                 cancel: Optional[threading.Event] = None):
+        self.path = path
+        self.progress = progress
+        self.on_subtotal = on_subtotal
+        self.on_directory = on_directory
+        self.max_depth = max_depth
+        self.files = 0
+        self.dirs = 0
+        self.errors = 0
+        self.bytes = 0
+        # 可由调用方传入共享的 Event，置位即取消
+        self._cancel = cancel if cancel is not None else threading.Event()
+        self.started = time.perf_counter()
+        self._result: Optional[SizeResult] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._next_progress = self.started + Settings.PROGRESS_INTERVAL
+
+    def cancel(self):
+        """取消计算；已完成的子目录合计仍会通过 on_subtotal 上报"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def result(self, timeout: Optional[float] = None) -> SizeResult:
+        """等待计算结束并返回结果"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"计算目录大小超时: {self.path}")
+        return self._result
+
+    def snapshot(self) -> dict:
+        """当前进度"""
+        return {'path': self.path, 'files': self.files, 'dirs': self.dirs,
+                'bytes': self.bytes, 'errors': self.errors,
+                'elapsed': time.perf_counter() - self.started}
+
+    def _report(self, force: bool = False):
+        if not self.progress:
+            return
+        now = time.perf_counter()
+        if not force and now < self._next_progress:
+            return
+        self._next_progress = now + Settings.PROGRESS_INTERVAL
+        try:
+            self.progress(self.snapshot())
+        except Exception as e:
+            logger.error(f"大小计算进度回调失败: {str(e)}")
+
+    def _finish(self, root: _Node):
+        self._result = SizeResult(root.total, self.files, self.dirs, self.errors,
+                                  not root.partial, time.perf_counter() - self.started)
+        self._report(force=True)
+        self._done.set()
+
+
+class SizeEngine:
+    """带任务窃取的目录大小计算线程池
+
+    同一个引擎可同时处理多个计算任务，线程在首次提交时启动。
+    """
+
+    def __init__(self, workers: int = Settings.SIZE_WORKERS):
+        self.workers = max(1, workers)
+        self._queues: List[deque] = [deque() for _ in range(self.workers)]
+        self._condition = threading.Condition()
+        self._idle = 0
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._next_queue = 0
+
+    # ------------------------------------------------------------------
+    # 提交
+    # ------------------------------------------------------------------
+    def submit(self, path: str,
+               progress: Optional[Callable[[dict], None]] = None,
+               on_subtotal: Optional[Callable[[str, int], None]] = None,
+               on_directory: Optional[DirectoryCallback] = None,
+               max_depth: int = Settings.MAX_DEPTH,
+               cancel: Optional[threading.Event] = None) -> SizeJob:
+        """提交一个目录，立即返回 SizeJob
+
+        回调均在工作线程中调用；同一目录的 on_directory 先于其 on_subtotal。
+        cancel 置位时与调用 SizeJob.cancel() 效果相同。
+        """
+        job = SizeJob(path, progress, on_subtotal, on_directory, max_depth, cancel)
+        try:
+            st = os.lstat(path)
+        except OSError as e:
+            logger.warning(f"无法获取文件状态 {path}: {str(e)}")
+            job.errors = 1
+            root = _Node(path, None, 0)
+            root.partial = True
+            job._finish(root)
+            return job
+        if not stat.S_ISDIR(st.st_mode):
+            job.files = 1
+            root = _Node(path, None, 0)
+            root.total = st.st_size
+            job.bytes = st.st_size
+            job._finish(root)
+            return job
+
+        self._ensure_started()
+        with self._condition:
+            index = self._next_queue
+            self._next_queue = (index + 1) % self.workers
+        self._push(index, [(job, _Node(path, None, 0))])
+        return job
+
+    def measure(self, path: str,
+                progress: Optional[Callable[[dict], None]] = None,
+                on_subtotal: Optional[Callable[[str, int], None]] = None,
+                on_directory: Optional[DirectoryCallback] = None,
+                timeout: Optional[float] = None,
+                cancel: Optional[threading.Event] = None) -> SizeResult:
+        """计算路径大小并等待结果"""
+        return self.submit(path, progress, on_subtotal, on_directory,
+                           cancel=cancel).result(timeout)
+
+    def stats(self) -> dict:
+        """线程与队列状态"""
+        return {'workers': len(self._threads), 'busy': self._busy,
+                'queued': sum(len(q) for q in self._queues)}
+
+    def shutdown(self):
+        """停止工作线程
+
+        正在扫描的目录扫描完即停；尚未扫描的目录不再处理，所属任务被取消并以
+        不完整的结果（complete 为 False）结束，等待 SizeJob.result() 的调用方随即返回。
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for queue in self._queues:
+            while queue:
+                job, node = queue.popleft()
+                job.cancel()
+                node.partial = True
+                self._release(job, node)
+
+    # ------------------------------------------------------------------
+    # 工作线程
+    # ------------------------------------------------------------------
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._condition:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, args=(index,),
+                                          name=f"size-engine-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _push(self, index: int, tasks):
+        self._queues[index].extend(tasks)
+        with self._condition:
+            if self._idle:
+                self._condition.notify(len(tasks))
+
+    def _take(self, index: int):
+        """先取自己队列尾部的任务，没有时从其他队列头部窃取"""
+        try:
+            return self._queues[index].pop()
+        except IndexError:
+            pass
+        for offset in range(1, self.workers):
+            try:
+                task = self._queues[(index + offset) % self.workers].popleft()
+            except IndexError:
+                continue
+            SIZE_STEALS.inc()
+            return task
+        return None
+
+    def _work(self, index: int):
+        while not self._stopping:
+            task = self._take(index)
+            if task is None:
+                with self._condition:
+                    if self._stopping:
+                        return
+                    self._idle += 1
+                    # 入队先于通知，持锁再检查一次即可避免丢失唤醒
+                    if not any(self._queues):
+                        self._condition.wait()
+                    self._idle -= 1
+                continue
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                self._scan(index, *task)
+            except Exception as e:
+                logger.error(f"计算目录大小时出错 {task[1].path}: {str(e)}")
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+
+    def _scan(self, index: int, job: SizeJob, node: _Node):
+        total = files = errors = 0
+        subdirs, names = [], []
+        if job.cancelled or node.depth > job.max_depth:
+            if not job.cancelled:
+                logger.warning(f"目录层级超过 {job.max_depth} 层: {node.path}")
+            node.partial = True
+        else:
+            mtime = None
+            if job.on_directory:
+                # 先于扫描取修改时间，扫描期间的变化会在下次校验时被发现
+                try:
+                    mtime = os.stat(node.path).st_mtime_ns
+                except OSError:
+                    pass
+            try:
+                with os.scandir(node.path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                                names.append(entry.name)
+                            else:
+                                total += entry.stat(follow_symlinks=False).st_size
+                                files += 1
+                        except OSError:
+                            errors += 1
+            except OSError as e:
+                logger.warning(f"无法访问目录 {node.path}: {str(e)}")
+                errors += 1
+            SIZE_DIRS_SCANNED.inc()
+            if mtime is not None:
+                try:
+                    job.on_directory(node.path, mtime, total, names)
+                except Exception as e:
+                    logger.error(f"目录扫描回调失败 {node.path}: {str(e)}")
+
+        with job._lock:
+            job.files += files
+            job.dirs += 1
+            job.errors += errors
+            job.bytes += total
+            node.total += total
+            node.pending += len(subdirs)
+        if subdirs:
+            depth = node.depth + 1
+            self._push(index, [(job, _Node(path, node, depth)) for path in subdirs])
+        self._release(job, node)
+        job._report()
+
+    def _release(self, job: SizeJob, node: _Node):
+        """节点的一项工作完成；节点全部完成时把合计累加到父节点"""
+        while True:
+            with job._lock:
+                node.pending -= 1
+                if node.pending:
+                    return
+                parent = node.parent
+                if parent is not None:
+                    parent.total += node.total
+                    parent.partial = parent.partial or node.partial
+            if job.on_subtotal and not node.partial:
+                try:
+                    job.on_subtotal(node.path, node.total)
+                except Exception as e:
+                    logger.error(f"目录合计回调失败 {node.path}: {str(e)}")
+            if parent is None:
+                job._finish(node)
+                return
+            node = parent
+
+
+_engine: Optional[SizeEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_size_engine() -> SizeEngine:
+    """进程内共享的大小计算引擎"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SizeEngine()
+        return _engine
+
+
+REGISTRY.gauge("size_workers_busy", "正在计算目录大小的工作线程数").set_function(
+    lambda: _engine._busy if _engine else 0)
+REGISTRY.gauge("size_workers_total", "目录大小计算工作线程数").set_function(
+    lambda: len(_engine._threads) if _engine else 0)
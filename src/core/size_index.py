@@ -0,0 +1,273 @@
+"""增量目录大小索引
+
+为每个目录记录 (自身修改时间, 直接包含的文件字节数, 子目录名, 子树合计)，
+子树合计由各子目录的记录自底向上汇总，类似 Merkle 树。
+
+校验某个目录的缓存大小时只 stat 子树中的每个目录：
+- 修改时间未变的目录沿用记录的文件字节数和子目录列表；
+- 修改时间改变（增删/重命名了直接子项）或超过 CACHE_EXPIRE_TIME 的目录
+  重新扫描自身一层，新出现的子目录交给大小计算引擎完整统计；
+- 合计的变化量沿父目录链向上累加到已索引的祖先目录。
+
+目录修改时间不反映文件内容的原地改写，这类变化由过期时间兜底。
+"""
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from src.core.lru import LruCache
+from src.core.metrics import REGISTRY
+from src.core.size_engine import SizeEngine, SizeResult, get_size_engine
+from src.config.settings import FileSystemSettings as Settings
+
+SIZE_INDEX_CHECKS = REGISTRY.counter("size_index_checks_total", "校验大小索引时 stat 的目录数")
+SIZE_INDEX_RESCANS = REGISTRY.counter("size_index_rescans_total",
+                                      "因修改时间变化或过期而重新扫描的目录数")
+
+
+class IndexEntry(NamedTuple):
+    """单个目录的索引记录"""
+    mtime: int  # 目录自身的 st_mtime_ns，-1 表示已失效
+    own: int  # 直接包含的非目录项字节数
+    children: Tuple[str, ...]  # 子目录名
+    total: int  # 子树合计
+    checked: float  # 最近一次扫描该目录的时间
+
+
+def _entry_bytes(path: str, entry: IndexEntry) -> int:
+    """估算一条记录的内存占用（路径、元组、子目录名与字典开销）"""
+    return (sys.getsizeof(path) + sys.getsizeof(entry) + sys.getsizeof(entry.children) +
+            sum(sys.getsizeof(name) for name in entry.children) + 200)
+
+
+class SizeIndex:
+    """按目录增量维护的大小索引（线程安全）
+
+    单条记录的读-改-写（失效标记、重新汇总合计、向祖先累加变化量）都在
+    索引锁内完成；锁只在这些短操作期间持有，stat 子树和统计新目录时不持锁，
+    多个线程可同时校验不同的子树。
+
+    内存中的记录放在有界 LRU 中。指定 store 时 LRU 作为持久化存储的读穿缓存：
+    查不到（或已被淘汰）的路径按需从 store 读取，所有修改同时写入 store；
+    未指定 store 时被淘汰的子树在下次校验时重新统计。
+    """
+
+    def __init__(self, engine: Optional[SizeEngine] = None,
+                 expire: float = Settings.CACHE_EXPIRE_TIME, store=None,
+                 max_entries: int = Settings.CACHE_MAX_ENTRIES,
+                 max_bytes: int = Settings.CACHE_MAX_BYTES):
+        self.expire = expire
+        self.store = store
+        self._engine = engine
+        self._entries = LruCache("dir_sizes", max_entries, max_bytes, sizeof=_entry_bytes)
+        self._lock = threading.RLock()
+        # 新建目录记录时调用 listener(路径)，用于监视已缓存的目录
+        self.listener: Optional[Callable[[str], None]] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path: str):
+        return self._get(path) is not None
+
+    @property
+    def engine(self) -> SizeEngine:
+        return self._engine or get_size_engine()
+
+    # ------------------------------------------------------------------
+    # 记录读写
+    # ------------------------------------------------------------------
+    def _get(self, path: str) -> Optional[IndexEntry]:
+        entry = self._entries.get(path)
+        if entry is None and self.store is not None:
+            entry = self.store.get(path)
+            if entry is not None:
+                self._entries.put(path, entry)
+        return entry
+
+    def _put(self, path: str, entry: IndexEntry):
+        self._entries.put(path, entry)
+        if self.store is not None:
+            self.store.put(path, entry)
+
+    def peek(self, path: str) -> Optional[int]:
+        """不校验，直接返回记录的合计"""
+        entry = self._get(path)
+        return entry.total if entry is not None else None
+
+    def discard(self, path: str):
+        """删除目录及其已索引子目录的记录"""
+        stack = [path]
+        with self._lock:
+            while stack:
+                current = stack.pop()
+                entry = self._get(current)
+                if entry is None:
+                    continue
+                self._entries.pop(current)
+                if self.store is not None:
+                    self.store.delete(current)
+                stack.extend(os.path.join(current, name) for name in entry.children)
+
+    def invalidate(self, path: str, ancestors: bool = False):
+        """标记目录自身已变化，下次校验时重新扫描这一层
+
+        ancestors 为 True 时一并标记已索引的祖先目录。
+        """
+        start = path
+        with self._lock:
+            while True:
+                entry = self._get(path)
+                if entry is None:
+                    if path != start:
+                        return
+                elif entry.mtime != -1:
+                    self._put(path, entry._replace(mtime=-1))
+                parent = os.path.dirname(path)
+                if not ancestors or parent == path:
+                    return
+                path = parent
+
+    def clear(self):
+        self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> dict:
+        """内存缓存状态"""
+        return self._entries.stats()
+
+    def flush(self):
+        """把待写记录写入持久化存储"""
+        if self.store is not None:
+            self.store.flush()
+
+    # ------------------------------------------------------------------
+    # 统计与校验
+    # ------------------------------------------------------------------
+    def build(self, path: str,
+              progress: Optional[Callable[[dict], None]] = None,
+              cancel: Optional[threading.Event] = None) -> SizeResult:
+        """完整统计目录并为每个完整统计的子目录建立记录
+
+        cancel 置位时提前结束（结果不完整），已完整统计的子目录仍会建立记录。
+        """
+        scanned: Dict[str, tuple] = {}
+        now = time.time()
+
+        def on_directory(directory: str, mtime: int, own: int, names: List[str]):
+            scanned[directory] = (mtime, own, tuple(names))
+
+        def on_subtotal(directory: str, total: int):
+            info = scanned.pop(directory, None)
+            if info is not None:
+                self._put(directory, IndexEntry(*info, total, now))
+                if self.listener:
+                    self.listener(directory)
+
+        return self.engine.measure(path, progress, on_subtotal, on_directory, cancel=cancel)
+
+    def get(self, path: str, cancel: Optional[threading.Event] = None) -> Optional[int]:
+        """校验并返回目录大小；未索引、目录已不存在或被取消时返回None"""
+        old = self._get(path)
+        if old is None:
+            return None
+        return self._validate(path, old, cancel)
+
+    def _rescan(self, path: str, old: IndexEntry, now: float) -> Optional[IndexEntry]:
+        """重新扫描目录自身一层，子目录沿用各自的记录"""
+        SIZE_INDEX_RESCANS.inc()
+        own = 0
+        children = []
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            children.append(entry.name)
+                        else:
+                            own += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            self.discard(path)
+            return None
+        for name in set(old.children).difference(children):
+            self.discard(os.path.join(path, name))
+        with self._lock:
+            # 沿用当前记录的合计（其间可能已被其他线程累加过变化量）
+            current = self._get(path)
+            entry = IndexEntry(mtime, own, tuple(children),
+                               current.total if current is not None else old.total, now)
+            self._put(path, entry)
+        return entry
+
+    def _set_total(self, path: str, total: int, propagate: bool = False):
+        """更新目录的合计；propagate 为 True 时把变化量累加到祖先目录"""
+        with self._lock:
+            entry = self._get(path)
+            if entry is None or entry.total == total:
+                return
+            self._put(path, entry._replace(total=total))
+            if propagate:
+                self._propagate(path, total - entry.total)
+
+    def _validate(self, root: str, root_entry: IndexEntry,
+                  cancel: Optional[threading.Event] = None) -> Optional[int]:
+        """后序遍历已索引的子树，每个目录 stat 一次，返回新的合计
+
+        合计的变化量累加到已索引的祖先目录。
+        取消时返回None；已重新扫描或统计的子目录记录保留。
+        """
+        now = time.time()
+        totals: Dict[str, int] = {}
+        stack: List[Tuple[str, Optional[IndexEntry], bool]] = [(root, root_entry, False)]
+        while stack:
+            if cancel is not None and cancel.is_set():
+                return None
+            path, entry, expanded = stack.pop()
+            if expanded:
+                total = entry.own + sum(totals.pop(os.path.join(path, name), 0)
+                                        for name in entry.children)
+                self._set_total(path, total, propagate=path == root)
+                totals[path] = total
+                continue
+
+            if entry is None:
+                entry = self._get(path)
+                if entry is None:
+                    # 新出现或此前未能完整统计的子目录
+                    result = self.build(path, cancel=cancel)
+                    if not result.complete and cancel is not None and cancel.is_set():
+                        return None
+                    totals[path] = result.size
+                    continue
+            SIZE_INDEX_CHECKS.inc()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self.discard(path)
+                if path == root:
+                    return None
+                continue
+            if mtime != entry.mtime or now - entry.checked > self.expire:
+                entry = self._rescan(path, entry, now)
+                if entry is None:
+                    if path == root:
+                        return None
+                    continue
+            stack.append((path, entry, True))
+            stack.extend((os.path.join(path, name), None, False) for name in entry.children)
+        return totals.get(root)
+
+    def _propagate(self, path: str, delta: int):
+        """把合计的变化量累加到已索引的祖先目录（调用方需持有 _lock）"""
+        child, parent = path, os.path.dirname(path)
+        while parent != child:
+            entry = self._get(parent)
+            if entry is None or os.path.basename(child) not in entry.children:
+                break
+            self._put(parent, entry._replace(total=entry.total + delta))
+            child, parent = parent, os.path.dirname(parent)
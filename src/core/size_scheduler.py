@@ -0,0 +1,208 @@
+"""后台目录大小计算的优先级调度
+
+待计算的目录按优先级放在最小堆里，由固定数量的工作线程依次取出计算：
+- PRIORITY_VISIBLE：列表视口中可见的行；
+- PRIORITY_CURRENT：当前目录的其余子目录；
+- PRIORITY_SPECULATIVE：预测性计算，如切换到子目录后上级目录中剩下的同级目录。
+
+同一路径只排队一次，重复提交只合并回调并在需要时提升优先级（堆中留下的
+旧条目在取出时按优先级不符跳过）。切换目录时与新目录无关的请求被取消：
+未开始的直接丢弃，进行中的通过 Event 协作取消，已完整统计的子目录结果
+仍会留在大小缓存中，下次计算时不必重来。
+"""
+import heapq
+import itertools
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+from src.core.metrics import REGISTRY
+from src.core.utils import logger
+from src.config.settings import FileSystemSettings as Settings
+
+PRIORITY_VISIBLE = 0
+PRIORITY_CURRENT = 1
+PRIORITY_SPECULATIVE = 2
+
+SIZE_REQUESTS = REGISTRY.counter("size_scheduler_requests_total", "后台目录大小计算请求数",
+                                 ("result",))
+
+# compute(路径, 取消标志) 返回大小，被取消时返回None
+SizeFunction = Callable[[str, threading.Event], Optional[int]]
+SizeCallback = Callable[[str, int], None]
+
+
+class SizeRequest:
+    """一个待计算或计算中的目录"""
+    __slots__ = ('path', 'priority', 'callbacks', 'cancel', 'running')
+
+    def __init__(self, path: str, priority: int):
+        self.path = path
+        self.priority = priority
+        self.callbacks: List[SizeCallback] = []
+        self.cancel = threading.Event()
+        self.running = False
+
+
+class SizeScheduler:
+    """按优先级计算目录大小的线程池，线程在首次提交时启动"""
+
+    def __init__(self, compute: SizeFunction, workers: int = Settings.SIZE_SCHEDULER_WORKERS):
+        self.compute = compute
+        self.workers = max(1, workers)
+        self._heap: List[tuple] = []
+        self._requests: Dict[str, SizeRequest] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def __len__(self):
+        """排队中（未开始计算）的请求数"""
+        with self._condition:
+            return sum(1 for request in self._requests.values() if not request.running)
+
+    # ------------------------------------------------------------------
+    # 提交与调整
+    # ------------------------------------------------------------------
+    def submit(self, path: str, priority: int = PRIORITY_CURRENT,
+               callback: Optional[SizeCallback] = None):
+        """提交目录；已在排队或计算中时只合并回调，并按需提升优先级
+
+        callback(路径, 大小) 在工作线程中调用，被取消的请求不会回调。
+        """
+        self._ensure_started()
+        with self._condition:
+            request = self._requests.get(path)
+            if request is None:
+                request = self._requests[path] = SizeRequest(path, priority)
+                self._push(request)
+                SIZE_REQUESTS.labels("submitted").inc()
+            else:
+                SIZE_REQUESTS.labels("merged").inc()
+                if priority < request.priority and not request.running:
+                    request.priority = priority
+                    self._push(request)
+            if callback is not None and callback not in request.callbacks:
+                request.callbacks.append(callback)
+
+    def prioritize(self, paths: Iterable[str], priority: int = PRIORITY_VISIBLE):
+        """提升已在排队的目录的优先级（如滚动到视口中的行）"""
+        with self._condition:
+            for path in paths:
+                request = self._requests.get(path)
+                if request is not None and not request.running and priority < request.priority:
+                    request.priority = priority
+                    self._push(request)
+
+    def focus(self, directory: str):
+        """切换到新目录：其子目录的请求保留，上级目录中的同级目录降为
+        预测性计算，其余请求取消"""
+        siblings = os.path.dirname(directory)
+        with self._condition:
+            for path, request in list(self._requests.items()):
+                parent = os.path.dirname(path)
+                if parent == directory:
+                    continue
+                if parent == siblings and siblings != directory and path != directory:
+                    if request.priority < PRIORITY_SPECULATIVE:
+                        # 优先级降低时旧的堆条目会在取出时被跳过
+                        request.priority = PRIORITY_SPECULATIVE
+                        if not request.running:
+                            self._push(request)
+                    continue
+                self._cancel(request)
+
+    def cancel(self, path: str):
+        """取消单个目录的计算"""
+        with self._condition:
+            request = self._requests.get(path)
+            if request is not None:
+                self._cancel(request)
+
+    def cancel_all(self):
+        with self._condition:
+            for request in list(self._requests.values()):
+                self._cancel(request)
+
+    def stats(self) -> dict:
+        """排队与计算中的请求数"""
+        with self._condition:
+            running = sum(1 for request in self._requests.values() if request.running)
+            return {'workers': self.workers, 'running': running,
+                    'queued': len(self._requests) - running}
+
+    def shutdown(self):
+        """取消所有请求并停止工作线程"""
+        with self._condition:
+            self._stopping = True
+            for request in list(self._requests.values()):
+                self._cancel(request)
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    # ------------------------------------------------------------------
+    # 内部实现（调用方持有 _condition）
+    # ------------------------------------------------------------------
+    def _push(self, request: SizeRequest):
+        heapq.heappush(self._heap, (request.priority, next(self._sequence), request))
+        self._condition.notify()
+
+    def _cancel(self, request: SizeRequest):
+        request.cancel.set()
+        if self._requests.get(request.path) is request:
+            del self._requests[request.path]
+        SIZE_REQUESTS.labels("cancelled").inc()
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._condition:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"size-scheduler-{index}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next(self) -> Optional[SizeRequest]:
+        """取出优先级最高的有效请求；停止时返回None"""
+        with self._condition:
+            while True:
+                if self._stopping:
+                    return None
+                while self._heap:
+                    priority, _, request = heapq.heappop(self._heap)
+                    # 跳过已取消、已开始或优先级已调整的旧条目
+                    if (request.cancel.is_set() or request.running or
+                            priority != request.priority):
+                        continue
+                    request.running = True
+                    return request
+                self._condition.wait()
+
+    def _work(self):
+        while True:
+            request = self._next()
+            if request is None:
+                return
+            try:
+                size = self.compute(request.path, request.cancel)
+            except Exception as e:
+                logger.error(f"后台计算目录大小时出错 {request.path}: {str(e)}")
+                size = None
+            with self._condition:
+                if self._requests.get(request.path) is request:
+                    del self._requests[request.path]
+                callbacks = list(request.callbacks)
+            if size is None or request.cancel.is_set():
+                continue
+            SIZE_REQUESTS.labels("completed").inc()
+            for callback in callbacks:
+                try:
+                    callback(request.path, size)
+                except Exception as e:
+                    logger.error(f"目录大小回调失败 {request.path}: {str(e)}")
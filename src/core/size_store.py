@@ -0,0 +1,129 @@
+"""目录大小索引的持久化存储
+
+索引记录保存在用户缓存目录下的 SQLite 数据库中（WAL 模式）：
+- 按路径逐条查询，启动时不整体加载；
+- 写入先攒在内存中，达到批量大小或调用 flush 时在一个事务内批量写入；
+- WAL 允许多个程序实例同时读，写入时按 busy timeout 等待其他实例的事务。
+
+数据库只是缓存，损坏或无法打开时调用方可以退回纯内存模式。
+"""
+import sqlite3
+import threading
+from typing import Dict, Optional
+from src.core.size_index import IndexEntry
+from src.core.utils import logger
+from src.config.settings import FileSystemSettings as Settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dir_sizes (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    own INTEGER NOT NULL,
+    children TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    checked REAL NOT NULL
+) WITHOUT ROWID
+"""
+# 文件名不能包含 NUL，用作子目录名的分隔符
+_SEPARATOR = '\0'
+
+
+class SizeStore:
+    """SQLite 持久化的目录索引记录（线程安全）"""
+
+    def __init__(self, path: str, batch_size: int = Settings.CACHE_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: Dict[str, Optional[IndexEntry]] = {}  # None 表示待删除
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=Settings.CACHE_BUSY_TIMEOUT,
+                                     isolation_level=None, check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+
+    def get(self, path: str) -> Optional[IndexEntry]:
+        """查询单个目录的记录"""
+        with self._lock:
+            if path in self._pending:
+                return self._pending[path]
+            try:
+                row = self._conn.execute(
+                    "SELECT mtime, own, children, total, checked FROM dir_sizes WHERE path = ?",
+                    (path,)).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"读取目录大小缓存失败 {path}: {str(e)}")
+                return None
+        if row is None:
+            return None
+        mtime, own, children, total, checked = row
+        return IndexEntry(mtime, own, tuple(children.split(_SEPARATOR)) if children else (),
+                          total, checked)
+
+    def put(self, path: str, entry: IndexEntry):
+        """写入记录（攒批）"""
+        with self._lock:
+            self._pending[path] = entry
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def delete(self, path: str):
+        """删除记录（攒批）"""
+        with self._lock:
+            self._pending[path] = None
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """在一个事务内写入所有待写记录"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            rows = [(path, e.mtime, e.own, _SEPARATOR.join(e.children), e.total, e.checked)
+                    for path, e in pending.items() if e is not None]
+            deleted = [(path,) for path, e in pending.items() if e is None]
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO dir_sizes VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    self._conn.executemany("DELETE FROM dir_sizes WHERE path = ?", deleted)
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.error(f"写入目录大小缓存失败: {str(e)}")
+                # 保留未写入的记录，下次再试（期间的新写入优先）
+                for path, entry in pending.items():
+                    self._pending.setdefault(path, entry)
+
+    def count(self) -> int:
+        """已持久化的记录数"""
+        with self._lock:
+            try:
+                return self._conn.execute("SELECT COUNT(*) FROM dir_sizes").fetchone()[0]
+            except sqlite3.Error:
+                return 0
+
+    def clear(self):
+        """清空所有记录"""
+        with self._lock:
+            self._pending.clear()
+            try:
+                self._conn.execute("DELETE FROM dir_sizes")
+            except sqlite3.Error as e:
+                logger.error(f"清空目录大小缓存失败: {str(e)}")
+
+    def close(self):
+        """写入剩余记录并关闭数据库"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,151 @@
+"""基于字典的子域名枚举（仅用于授权的资产审计）
+
+对 "<词>.<域名>" 形式的候选名字经批量解析器并发解析：
+- 先查询若干随机子域名检测泛解析，落在泛解析地址内的结果视为无效；
+- 应答地址集合相同的名字合并为一组，只在首次出现时上报；
+- 命中结果以生成器流式返回，候选名字分批提交，内存占用与字典大小无关。
+
+StubZone 提供本地区域数据，可替代真实DNS用于验证。
+"""
+import queue
+import secrets
+from concurrent.futures import Future
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional
+from src.core.network import NetworkOperations
+from src.core.resolver import BulkResolver, FORWARD
+from src.core.utils import logger
+from src.config.settings import ResolverSettings, SubdomainSettings as Settings
+
+
+def resolve_addresses(name: str) -> List[str]:
+    """默认解析函数：基于 resolve_dns，失败或无记录时返回空列表"""
+    success, result = NetworkOperations.resolve_dns(name)
+    return result['addresses'] if success else []
+
+
+class StubZone:
+    """本地区域数据：名字 -> 地址列表，支持 "*.example.com" 泛解析记录"""
+
+    def __init__(self, records: Optional[Dict[str, List[str]]] = None):
+        self.records = {name.lower().rstrip('.'): list(addresses)
+                        for name, addresses in (records or {}).items()}
+
+    @classmethod
+    def load(cls, path: str) -> 'StubZone':
+        """从文本文件加载，每行 "名字 地址 [地址...]"，# 开头为注释"""
+        records = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split('#', 1)[0].split()
+                if len(parts) >= 2:
+                    records.setdefault(parts[0], []).extend(parts[1:])
+        return cls(records)
+
+    def resolve(self, name: str) -> List[str]:
+        """按精确记录、再按最近的泛解析记录查询"""
+        name = name.lower().rstrip('.')
+        if name in self.records:
+            return self.records[name]
+        labels = name.split('.')
+        for index in range(1, len(labels)):
+            wildcard = '*.' + '.'.join(labels[index:])
+            if wildcard in self.records:
+                return self.records[wildcard]
+        return []
+
+
+class SubdomainEnumerator:
+    """子域名枚举器"""
+
+    def __init__(self, domain: str, resolver: Optional[BulkResolver] = None,
+                 resolve_fn: Callable[[str], List[str]] = resolve_addresses,
+                 rate: float = Settings.RATE_LIMIT,
+                 max_workers: int = ResolverSettings.MAX_WORKERS):
+        self.domain = domain.strip().strip('.').lower()
+        if not self.domain:
+            raise ValueError("域名不能为空")
+        self.resolver = resolver or BulkResolver(max_workers=max_workers, rate=rate,
+                                                 resolve_fn=resolve_fn)
+        self.wildcard: FrozenSet[str] = frozenset()
+        self.groups: Dict[FrozenSet[str], List[str]] = {}
+        self.stats = {'candidates': 0, 'resolved': 0, 'hits': 0,
+                      'duplicates': 0, 'wildcard_filtered': 0, 'errors': 0}
+
+    def detect_wildcard(self) -> FrozenSet[str]:
+        """查询随机子域名，返回泛解析的地址集合（无泛解析时为空）"""
+        addresses = set()
+        for _ in range(Settings.WILDCARD_PROBES):
+            addresses.update(self.resolver.resolve(f"{secrets.token_hex(8)}.{self.domain}"))
+        self.wildcard = frozenset(addresses)
+        return self.wildcard
+
+    def candidates(self, words: Iterable[str]) -> Iterator[str]:
+        """由字典生成去重后的候选名字"""
+        seen = set()
+        for word in words:
+            word = word.strip().strip('.').lower()
+            if not word or word.startswith('#') or word in seen:
+                continue
+            seen.add(word)
+            yield f"{word}.{self.domain}"
+
+    def _classify(self, name: str, addresses: List[str]) -> Optional[dict]:
+        """判定一次应答是否为新的有效命中"""
+        if not addresses:
+            return None
+        answer = frozenset(addresses)
+        if self.wildcard and answer <= self.wildcard:
+            self.stats['wildcard_filtered'] += 1
+            return None
+        group = self.groups.get(answer)
+        if group is not None:
+            group.append(name)
+            self.stats['duplicates'] += 1
+            return None
+        self.groups[answer] = [name]
+        self.stats['hits'] += 1
+        return {'name': name, 'addresses': sorted(answer)}
+
+    def run(self, words: Iterable[str], detect_wildcard: bool = True) -> Iterator[dict]:
+        """按到达顺序流式返回命中结果"""
+        if detect_wildcard:
+            self.detect_wildcard()
+        answers: queue.Queue = queue.Queue()
+        names = self.candidates(words)
+        outstanding = 0
+        exhausted = False
+
+        def on_answer(name: str, future: Future):
+            # 每个提交的名字都必须放回一个应答，否则 outstanding 无法归零
+            try:
+                answers.put((name, future.result(), None))
+            except Exception as e:
+                answers.put((name, [], e))
+
+        while True:
+            while not exhausted and outstanding < Settings.MAX_OUTSTANDING:
+                name = next(names, None)
+                if name is None:
+                    exhausted = True
+                    break
+                self.stats['candidates'] += 1
+                outstanding += 1
+                self.resolver.submit(FORWARD, name).add_done_callback(
+                    lambda future, name=name: on_answer(name, future))
+            if not outstanding:
+                break
+            name, addresses, error = answers.get()
+            outstanding -= 1
+            self.stats['resolved'] += 1
+            if error is not None:
+                self.stats['errors'] += 1
+                logger.debug(f"解析 {name} 失败: {str(error)}")
+            hit = self._classify(name, addresses)
+            if hit:
+                yield hit
+
+    def summary(self) -> dict:
+        """枚举结果汇总（含按应答地址分组的全部名字）"""
+        return dict(self.stats, domain=self.domain, wildcard=sorted(self.wildcard),
+                    groups=[{'addresses': sorted(answer), 'names': names}
+                            for answer, names in self.groups.items()])
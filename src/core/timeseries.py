@@ -0,0 +1,460 @@
+"""探测结果时序存储
+
+嵌入式的探测历史存储，数据按 主机/精度/时间分区 写入定长二进制段文件，
+通过 mmap 访问：
+
+    <root>/hosts.json                   主机名 -> 主机ID
+    <root>/raw/<主机ID>/<YYYYMMDD>.seg   原始样本（按UTC天分段）
+    <root>/1m/<主机ID>/<YYYYMM>.seg      分钟汇总（按月分段）
+    <root>/1h/<主机ID>/<YYYY>.seg        小时汇总（按年分段）
+
+段文件内记录按时间递增，范围查询在 mmap 上二分定位起止位置，直接返回
+内存视图，不把原始样本转换为 Python 对象。分钟/小时汇总在时间桶结束时
+自动生成（最小/平均/最大/P95/样本数/丢包数），过期数据按分区整文件删除。
+"""
+import calendar
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from src.core.utils import get_user_data_dir, logger
+from src.config.settings import TimeSeriesSettings as Settings
+
+# 原始样本：时间戳(毫秒) + 往返时延(毫秒，NaN 表示丢包)
+RAW_RECORD = struct.Struct('<qf')
+# 汇总记录：桶起始时间(毫秒) + 样本数 + 丢包数 + 最小/平均/最大/P95 时延(毫秒)
+ROLLUP_RECORD = struct.Struct('<qIIffff')
+
+RAW = "raw"
+MINUTE = "1m"
+HOUR = "1h"
+RESOLUTIONS = (RAW, MINUTE, HOUR)
+
+_BUCKET_MS = {MINUTE: 60 * 1000, HOUR: 3600 * 1000}
+_RECORD_FOR = {RAW: RAW_RECORD, MINUTE: ROLLUP_RECORD, HOUR: ROLLUP_RECORD}
+_PARTITION_FORMAT = {RAW: "%Y%m%d", MINUTE: "%Y%m", HOUR: "%Y"}
+
+_HEADER = struct.Struct('<4sHHQ')
+# Windows 上文件存在映射时不能改变文件大小（SetEndOfFile 失败），只能通过
+# 建立更大的映射来扩展文件；POSIX 上 mmap 长度不能超过文件大小，需先扩展文件
+_EXTEND_BY_MAPPING = os.name == 'nt'
+_MAGIC = b'NTTS'
+_VERSION = 1
+
+
+def _partition_name(resolution: str, ts_ms: int) -> str:
+    """时间戳所属分区的文件名"""
+    return time.strftime(_PARTITION_FORMAT[resolution], time.gmtime(ts_ms / 1000)) + ".seg"
+
+
+def _partition_end(resolution: str, name: str) -> int:
+    """分区结束时间（毫秒，不含）"""
+    stem = name[:-4]
+    if resolution == RAW:
+        start = time.strptime(stem, "%Y%m%d")
+        return (calendar.timegm(start) + 86400) * 1000
+    if resolution == MINUTE:
+        year, month = int(stem[:4]), int(stem[4:6])
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return calendar.timegm(time.strptime(f"{year}{month:02d}", "%Y%m")) * 1000
+    return calendar.timegm(time.strptime(str(int(stem) + 1), "%Y")) * 1000
+
+
+class _TimestampView:
+    """段内时间戳列的只读序列视图，供 bisect 使用"""
+    __slots__ = ('_buf', '_size', '_count')
+
+    def __init__(self, segment: 'Segment'):
+        self._buf = segment._mm
+        self._size = segment.record.size
+        self._count = segment.count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index: int) -> int:
+        return struct.unpack_from('<q', self._buf, _HEADER.size + index * self._size)[0]
+
+
+class Segment:
+    """定长记录段文件（mmap 访问，按需倍增扩容）"""
+
+    def __init__(self, path: str, record: struct.Struct):
+        self.path = path
+        self.record = record
+        exists = os.path.exists(path)
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if not exists:
+            capacity = Settings.INITIAL_SEGMENT_RECORDS
+            self._file.truncate(_HEADER.size + capacity * record.size)
+            self._file.write(_HEADER.pack(_MAGIC, _VERSION, record.size, 0))
+            self._file.flush()
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, version, record_size, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or record_size != record.size:
+            self.close()
+            raise ValueError(f"无效的段文件: {path}")
+        self.count = count
+        self.capacity = (len(self._mm) - _HEADER.size) // record.size
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        """容量翻倍
+
+        先关闭旧映射再扩展文件；旧映射仍被查询结果的内存视图引用而无法关闭时，
+        Windows 上改为直接建立更大的映射来扩展文件（不调用 truncate），旧映射
+        随最后一个视图释放。
+        """
+        size = _HEADER.size + self.capacity * 2 * self.record.size
+        try:
+            self._mm.close()
+            closed = True
+        except BufferError:
+            closed = False
+        if closed or not _EXTEND_BY_MAPPING:
+            self._file.truncate(size)
+            self._mm = mmap.mmap(self._file.fileno(), 0)
+        else:
+            self._mm = mmap.mmap(self._file.fileno(), size)
+        self.capacity *= 2
+
+    def append(self, *fields):
+        """追加一条记录"""
+        if self.count >= self.capacity:
+            self._grow()
+        self.record.pack_into(self._mm, _HEADER.size + self.count * self.record.size, *fields)
+        self.count += 1
+        struct.pack_into('<Q', self._mm, 8, self.count)
+
+    def last(self) -> Optional[tuple]:
+        """最后一条记录"""
+        if not self.count:
+            return None
+        return self.record.unpack_from(self._mm, _HEADER.size + (self.count - 1) * self.record.size)
+
+    def search(self, start_ms: int, end_ms: int) -> Tuple[int, int]:
+        """二分查找时间范围 [start_ms, end_ms) 对应的记录下标范围"""
+        view = _TimestampView(self)
+        return bisect_left(view, start_ms), bisect_left(view, end_ms)
+
+    def view(self, first: int, last: int) -> memoryview:
+        """记录下标范围 [first, last) 的内存视图（零拷贝）"""
+        offset = _HEADER.size + first * self.record.size
+        return memoryview(self._mm)[offset:offset + (last - first) * self.record.size]
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        try:
+            self._mm.close()
+        except (BufferError, ValueError):
+            # 仍有外部内存视图引用时交给垃圾回收释放
+            pass
+        self._file.close()
+
+
+class QueryResult:
+    """范围查询结果：若干段内存视图的拼接"""
+
+    def __init__(self, resolution: str, record: struct.Struct, views: List[memoryview]):
+        self.resolution = resolution
+        self.record = record
+        self.views = views
+
+    def __len__(self):
+        return sum(len(view) for view in self.views) // self.record.size
+
+    def tobytes(self) -> bytes:
+        """拼接为连续的字节串（可直接交给 numpy.frombuffer）"""
+        return b''.join(self.views)
+
+    def __iter__(self) -> Iterator[tuple]:
+        for view in self.views:
+            yield from self.record.iter_unpack(view)
+
+
+class _Bucket:
+    """正在累积的汇总时间桶"""
+    __slots__ = ('start', 'values', 'lost')
+
+    def __init__(self, start: int):
+        self.start = start
+        self.values = array('f')
+        self.lost = 0
+
+    def add(self, rtt: float):
+        if rtt != rtt:  # NaN 表示丢包
+            self.lost += 1
+        else:
+            self.values.append(rtt)
+
+    def summarize(self) -> tuple:
+        """生成汇总记录字段"""
+        count = len(self.values) + self.lost
+        if not self.values:
+            nan = float('nan')
+            return self.start, count, self.lost, nan, nan, nan, nan
+        ordered = sorted(self.values)
+        p95 = ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+        return (self.start, count, self.lost, ordered[0],
+                sum(ordered) / len(ordered), ordered[-1], p95)
+
+
+class TimeSeriesStore:
+    """探测结果时序存储"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or get_user_data_dir(Settings.DATA_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._segments: 'OrderedDict[str, Segment]' = OrderedDict()
+        self._hosts_path = os.path.join(self.root, "hosts.json")
+        self._hosts: Dict[str, int] = {}
+        if os.path.exists(self._hosts_path):
+            with open(self._hosts_path, 'r', encoding='utf-8') as f:
+                self._hosts = json.load(f)
+        self._last_ts: Dict[int, int] = {}
+        self._buckets: Dict[Tuple[int, str], _Bucket] = {}
+
+    # ------------------------------------------------------------------
+    # 主机与段文件管理
+    # ------------------------------------------------------------------
+    def hosts(self) -> List[str]:
+        return list(self._hosts)
+
+    def host_id(self, host: str, create: bool = True) -> Optional[int]:
+        """获取主机ID，不存在时分配新ID"""
+        with self._lock:
+            host_id = self._hosts.get(host)
+            if host_id is None and create:
+                host_id = len(self._hosts)
+                self._hosts[host] = host_id
+                tmp_path = self._hosts_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._hosts, f, ensure_ascii=False)
+                os.replace(tmp_path, self._hosts_path)
+            return host_id
+
+    def _segment_dir(self, resolution: str, host_id: int) -> str:
+        return os.path.join(self.root, resolution, str(host_id))
+
+    def _segment(self, resolution: str, host_id: int, name: str,
+                 create: bool = True) -> Optional[Segment]:
+        """获取（必要时打开或创建）段文件，超出上限时关闭最久未用的段"""
+        path = os.path.join(self._segment_dir(resolution, host_id), name)
+        segment = self._segments.get(path)
+        if segment is not None:
+            self._segments.move_to_end(path)
+            return segment
+        if not create and not os.path.exists(path):
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        segment = Segment(path, _RECORD_FOR[resolution])
+        self._segments[path] = segment
+        while len(self._segments) > Settings.MAX_OPEN_SEGMENTS:
+            _, old = self._segments.popitem(last=False)
+            old.close()
+        return segment
+
+    def _segment_names(self, resolution: str, host_id: int) -> List[str]:
+        directory = self._segment_dir(resolution, host_id)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def record(self, host: str, rtt_ms: Optional[float], timestamp: Optional[float] = None):
+        """记录一个探测样本，rtt_ms 为 None 表示丢包"""
+        ts_ms = int((time.time() if timestamp is None else timestamp) * 1000)
+        rtt = float('nan') if rtt_ms is None else float(rtt_ms)
+        with self._lock:
+            host_id = self.host_id(host)
+            if host_id not in self._last_ts:
+                self._restore_host(host_id)
+            # 保证段内时间递增（时钟回拨时沿用上一个时间戳）
+            ts_ms = max(ts_ms, self._last_ts.get(host_id, ts_ms))
+            self._last_ts[host_id] = ts_ms
+            self._segment(RAW, host_id, _partition_name(RAW, ts_ms)).append(ts_ms, rtt)
+            for resolution in (MINUTE, HOUR):
+                self._add_to_bucket(host_id, resolution, ts_ms, rtt)
+
+    def _add_to_bucket(self, host_id: int, resolution: str, ts_ms: int, rtt: float):
+        """把样本累积到汇总桶，跨桶时先写出上一个桶"""
+        start = ts_ms - ts_ms % _BUCKET_MS[resolution]
+        bucket = self._buckets.get((host_id, resolution))
+        if bucket is not None and bucket.start != start:
+            self._write_bucket(host_id, resolution, bucket)
+            bucket = None
+        if bucket is None:
+            bucket = self._buckets[(host_id, resolution)] = _Bucket(start)
+        bucket.add(rtt)
+
+    def _write_bucket(self, host_id: int, resolution: str, bucket: _Bucket):
+        fields = bucket.summarize()
+        if fields[1]:
+            self._segment(resolution, host_id, _partition_name(resolution, bucket.start)).append(*fields)
+
+    def _restore_host(self, host_id: int):
+        """进程重启后从原始样本重建尚未写出的汇总桶"""
+        names = self._segment_names(RAW, host_id)
+        if not names:
+            self._last_ts[host_id] = 0
+            return
+        segment = self._segment(RAW, host_id, names[-1])
+        last = segment.last()
+        if last is None:
+            self._last_ts[host_id] = 0
+            return
+        last_ts = last[0]
+        self._last_ts[host_id] = last_ts
+        for resolution in (MINUTE, HOUR):
+            start = last_ts - last_ts % _BUCKET_MS[resolution]
+            rollups = self._segment(resolution, host_id, _partition_name(resolution, start), create=False)
+            written = rollups.last() if rollups is not None else None
+            if written is not None and written[0] >= start:
+                continue
+            bucket = _Bucket(start)
+            first, end = segment.search(start, last_ts + 1)
+            for _, rtt in RAW_RECORD.iter_unpack(segment.view(first, end)):
+                bucket.add(rtt)
+            self._buckets[(host_id, resolution)] = bucket
+
+    def flush(self, now: Optional[float] = None):
+        """写出已结束的汇总桶并把段文件刷到磁盘"""
+        now_ms = int((time.time() if now is None else now) * 1000)
+        with self._lock:
+            for (host_id, resolution), bucket in list(self._buckets.items()):
+                if bucket.start + _BUCKET_MS[resolution] <= now_ms:
+                    self._write_bucket(host_id, resolution, bucket)
+                    del self._buckets[(host_id, resolution)]
+            for segment in self._segments.values():
+                segment.flush()
+
+    def close(self):
+        """刷盘并关闭所有段文件（未结束的桶在下次打开时从原始样本重建）"""
+        with self._lock:
+            for segment in self._segments.values():
+                segment.flush()
+                segment.close()
+            self._segments.clear()
+            self._buckets.clear()
+            self._last_ts.clear()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    @staticmethod
+    def choose_resolution(start: float, end: float) -> str:
+        """根据时间跨度选择查询精度"""
+        span = end - start
+        if span <= 6 * 3600:
+            return RAW
+        if span <= 7 * 86400:
+            return MINUTE
+        return HOUR
+
+    def query(self, host: str, start: float, end: float,
+              resolution: Optional[str] = None) -> QueryResult:
+        """查询时间范围 [start, end)（秒）内的记录
+
+        返回的 QueryResult 由段文件的内存视图组成；汇总精度只包含已写出的完整时间桶。
+        """
+        resolution = resolution or self.choose_resolution(start, end)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"未知的精度: {resolution}")
+        record = _RECORD_FOR[resolution]
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        views = []
+        with self._lock:
+            host_id = self.host_id(host, create=False)
+            if host_id is None:
+                return QueryResult(resolution, record, views)
+            first_name = _partition_name(resolution, start_ms)
+            last_name = _partition_name(resolution, max(start_ms, end_ms - 1))
+            for name in self._segment_names(resolution, host_id):
+                if name < first_name or name > last_name:
+                    continue
+                segment = self._segment(resolution, host_id, name)
+                first, last = segment.search(start_ms, end_ms)
+                if last > first:
+                    views.append(segment.view(first, last))
+        return QueryResult(resolution, record, views)
+
+    def summary(self, host: str, start: float, end: float) -> dict:
+        """基于汇总数据统计时间范围内的最小/平均/最大时延与丢包"""
+        resolution = self.choose_resolution(start, end)
+        if resolution == RAW:
+            resolution = MINUTE
+        count = lost = 0
+        total = 0.0
+        low, high = float('inf'), float('-inf')
+        for _, n, n_lost, v_min, v_avg, v_max, _ in self.query(host, start, end, resolution):
+            count += n
+            lost += n_lost
+            if n > n_lost:
+                total += v_avg * (n - n_lost)
+                low = min(low, v_min)
+                high = max(high, v_max)
+        received = count - lost
+        return {
+            'host': host,
+            'resolution': resolution,
+            'count': count,
+            'lost': lost,
+            'loss_rate': lost / count if count else 0.0,
+            'min': low if received else None,
+            'avg': total / received if received else None,
+            'max': high if received else None,
+        }
+
+    # ------------------------------------------------------------------
+    # 数据保留
+    # ------------------------------------------------------------------
+    def apply_retention(self, now: Optional[float] = None) -> int:
+        """删除超过保留期限的分区，返回删除的段文件数"""
+        now = time.time() if now is None else now
+        limits = {RAW: Settings.RAW_RETENTION, MINUTE: Settings.MINUTE_RETENTION,
+                  HOUR: Settings.HOUR_RETENTION}
+        removed = 0
+        with self._lock:
+            for resolution, retention in limits.items():
+                cutoff_ms = int((now - retention) * 1000)
+                for host_id in self._hosts.values():
+                    for name in self._segment_names(resolution, host_id):
+                        if _partition_end(resolution, name) > cutoff_ms:
+                            continue
+                        path = os.path.join(self._segment_dir(resolution, host_id), name)
+                        segment = self._segments.pop(path, None)
+                        if segment is not None:
+                            segment.close()
+                        try:
+                            os.remove(path)
+                            removed += 1
+                        except OSError as e:
+                            logger.warning(f"删除过期段文件失败 {path}: {str(e)}")
+        if removed:
+            logger.info(f"已删除 {removed} 个过期时序段文件")
+        return removed
+
+    def clear(self):
+        """删除全部数据"""
+        with self._lock:
+            self.close()
+            for resolution in RESOLUTIONS:
+                shutil.rmtree(os.path.join(self.root, resolution), ignore_errors=True)
+            self._hosts.clear()
+            if os.path.exists(self._hosts_path):
+                os.remove(self._hosts_path)
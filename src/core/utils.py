@@ -1,5 +1,6 @@
 """通用工具函数"""
 from datetime import datetime
+import ipaddress
 import logging
 import os
 
@@ -21,9 +22,56 @@ def setup_logger():
     )
     return logging.getLogger(__name__)
 
+def get_user_data_dir(*parts: str) -> str:
+    """获取用户数据目录（不存在时创建）"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        root = os.path.join(base, 'NetworkTools')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+        root = os.path.join(base, 'network-tools')
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def get_user_cache_dir(*parts: str) -> str:
+    """获取用户缓存目录（不存在时创建），存放可随时重建的数据"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        root = os.path.join(base, 'NetworkTools', 'Cache')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        root = os.path.join(base, 'network-tools')
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
 # 创建logger实例
 logger = setup_logger()
 
+def is_loopback(host: str) -> bool:
+    """host 是否为本机回环地址（"localhost" 视为回环，空串表示所有地址）"""
+    if host.lower() == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host.strip('[]')).is_loopback
+    except ValueError:
+        return False
+
+def raise_file_limit(required: int):
+    """尽量把进程可打开文件数上限提高到 required（仅类Unix系统）"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < required:
+        target = required if hard == resource.RLIM_INFINITY else min(required, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError) as e:
+            logger.warning(f"无法提高文件描述符上限: {str(e)}")
+
 def format_size(size: int) -> str:
     """格式化文件大小"""
     try:
@@ -1,15 +1,43 @@
 """文件浏览框架"""
 import os
+import queue
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
-from src.gui.widgets import ScrolledTreeview
+import time
+from src.gui.widgets import ListModel, VirtualTreeview
 from src.core.file_system import FileSystemOperations
 from src.core.utils import format_size, format_timestamp, logger
+from src.config.settings import FileSystemSettings, SIZE_UPDATE_INTERVAL
 from PIL import Image, ImageTk
 from src.gui.text_viewer import TextViewer
 from src.gui.image_viewer import ImageViewer
 
+def name_key(item):
+    return item['name'].lower()
+
+
+def size_key(item):
+    """按字节数排序；未知或计算中的大小排在最小"""
+    return -1 if item['size_status'] else item['size']
+
+
+def modified_key(item):
+    return item['modified']
+
+
+def is_dir(item):
+    return item['is_dir']
+
+
+# 列 -> (列头文本, 排序键, 默认是否降序)；按名称排序时目录在前
+SORT_COLUMNS = {
+    '#0': ("名称", name_key, False),
+    'size': ("大小", size_key, True),
+    'modified': ("修改时间", modified_key, True),
+}
+
+
 class FileFrame(ttk.LabelFrame):
     def __init__(self, master, **kwargs):
         super().__init__(master, text="文件浏览器", padding="5", **kwargs)
@@ -23,7 +51,21 @@ class FileFrame(ttk.LabelFrame):
         self.path_var = tk.StringVar()
         self.file_system = FileSystemOperations
         self.file_system.initialize()  # 初始化文件系统操作
+        self.model = ListModel(key=lambda item: item['path'])
+        self.filter_var = tk.StringVar()
+        self._updates = queue.Queue()  # 后台线程产生的界面更新
+        self._listing = None  # 进行中的目录加载的取消标志 (threading.Event)
+        self._listed = 0
+        self._sizes = {}  # 待刷新到列表的目录大小：路径 -> 大小
+        self._sizes_applied = 0.0
+        self._prioritized = frozenset()  # 上次要求优先计算的可见目录
+        self.sort_column = '#0'
+        self.sort_reverse = False
         self.create_widgets()
+        self.apply_sort()
+        self.file_system.start_watching(
+            lambda changes, overflow: self._updates.put(('changes', changes, overflow)))
+        self.after(200, self._drain_updates)
 
     def create_widgets(self):
         """创建界面组件"""
@@ -70,40 +112,33 @@ class FileFrame(ttk.LabelFrame):
                                   command=self.go_to_parent)
         self.up_button.pack(side="left", padx=2)
 
+        # 按名称筛选（在数据模型上进行）
+        filter_entry = ttk.Entry(toolbar, textvariable=self.filter_var, width=20)
+        filter_entry.pack(side="right", padx=2)
+        ttk.Label(toolbar, text="筛选:").pack(side="right")
+        self.filter_var.trace_add("write", lambda *args: self.apply_filter())
+
     def create_tree_view(self):
-        """创建树形视图"""
-        # 创建框架来容纳树形视图和滚动条
-        tree_frame = ttk.Frame(self)
-        tree_frame.pack(fill="both", expand=True, padx=5, pady=5)
-
-        # 创建树形视图
-        self.tree = ttk.Treeview(tree_frame, columns=("icon", "size", "modified"), 
-                                show="tree headings")
-        
-        # 设置列头
-        self.tree.heading("size", text="大小", command=lambda: self.sort_tree("size"))
-        self.tree.heading("modified", text="修改时间", 
-                         command=lambda: self.sort_tree("modified"))
-        
+        """创建文件列表（只为可见行创建 Tk 项）"""
+        self.file_list = VirtualTreeview(self, self.model, self._row_options,
+                                         columns=("icon", "size", "modified"))
+        self.file_list.pack(fill="both", expand=True, padx=5, pady=5)
+
+        # 设置列头（点击排序，再次点击切换升降序）
+        for column in SORT_COLUMNS:
+            self.file_list.heading(column, command=lambda c=column: self.sort_tree(c))
+        self.update_sort_headings()
+
         # 设置列宽
-        self.tree.column("size", width=120, anchor="e")
-        self.tree.column("modified", width=150, anchor="w")
-        
-        # 创建滚动条
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", 
-                           command=self.tree.yview)
-        hsb = ttk.Scrollbar(tree_frame, orient="horizontal", 
-                           command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        # 布局
-        vsb.pack(side="right", fill="y")
-        hsb.pack(side="bottom", fill="x")
-        self.tree.pack(side="left", fill="both", expand=True)
-        
+        self.file_list.column("size", width=120, anchor="e")
+        self.file_list.column("modified", width=150, anchor="w")
+
+        # 正在计算大小的目录使用斜体显示
+        self.file_list.tag_configure('calculating', font=('', 9, 'italic'))
+
         # 绑定事件
-        self.tree.bind("<Double-1>", self.on_double_click)
-        self.tree.bind("<Button-3>", self.show_context_menu)
+        self.file_list.bind_tree("<Double-1>", self.on_double_click)
+        self.file_list.bind_tree("<Button-3>", self.show_context_menu)
 
     def create_context_menu(self):
         """创建右键菜单"""
@@ -118,14 +153,14 @@ class FileFrame(ttk.LabelFrame):
 
     def show_context_menu(self, event):
         """显示右键菜单"""
-        item = self.tree.identify_row(event.y)
+        item = self.file_list.row_at(event.y)
         if item:
-            self.tree.selection_set(item)
+            self.file_list.selection_set([item])
             self.context_menu.post(event.x_root, event.y_root)
 
     def view_selected(self):
         """查看选中的文件内容"""
-        selected = self.tree.selection()
+        selected = self.file_list.selection()
         if not selected:
             self.status_var.set("请先选择要查看的文件")
             return
@@ -158,7 +193,7 @@ class FileFrame(ttk.LabelFrame):
 
     def open_selected(self):
         """打开选中的文件或目录"""
-        selected = self.tree.selection()
+        selected = self.file_list.selection()
         if not selected:
             return
 
@@ -184,16 +219,15 @@ class FileFrame(ttk.LabelFrame):
     def delete_selected(self):
         """删除选中的文件或目录"""
         try:
-            selected = self.tree.selection()
+            selected = self.file_list.selection()
             if not selected:
                 self.status_var.set("请先选择要删除的文件或目录")
                 return
 
             item = selected[0]
-            item_text = self.tree.item(item)["text"]
-            
+
             # 不允许删除上级目录项
-            if item_text == "📁 ..":
+            if item['name'] == "..":
                 self.status_var.set("不能删除上级目录")
                 return
 
@@ -213,7 +247,7 @@ class FileFrame(ttk.LabelFrame):
             else:
                 os.remove(item_path)
             
-            self.tree.delete(item)
+            self.model.remove(item_path)
             self.status_var.set(f"已删除: {os.path.basename(item_path)}")
             logger.info(f"成功删除: {item_path}")
 
@@ -222,22 +256,13 @@ class FileFrame(ttk.LabelFrame):
 
     def delete_multiple(self):
         """删除选中的多个文件或目录"""
-        selected_items = self.tree.selection()
+        selected_items = self.file_list.selection()
         if not selected_items:
             self.status_var.set("未选择任何项目")
             return
 
-        # 获取所有选中项的路径
-        items_to_delete = []
-        for item in selected_items:
-            item_text = self.tree.item(item)['text']
-            # 跳过 ".." 返回上级目录的项
-            if item_text.endswith(".."):
-                continue
-            # 移除图标前缀（"📁 " 或 "📄 "）
-            name = item_text[2:]
-            full_path = os.path.join(self.current_path, name)
-            items_to_delete.append(full_path)
+        # 获取所有选中项的路径，跳过 ".." 返回上级目录的项
+        items_to_delete = [item['path'] for item in selected_items if item['name'] != ".."]
 
         if not items_to_delete:
             self.status_var.set("没有可删除的项目")
@@ -268,67 +293,188 @@ class FileFrame(ttk.LabelFrame):
         self.status_var.set(f"成功删除 {success_count} 个项目")
 
     def get_full_path(self, item):
-        """获取树形视图项目的完整路径"""
+        """获取列表行的完整路径"""
         if not self.current_path:
             return None
+        return item['path']
 
-        item_text = self.tree.item(item)["text"]
-        # 移除文件夹/文件图标
-        if item_text.startswith("📁 "):
-            item_text = item_text[2:]
-        elif item_text.startswith("📄 "):
-            item_text = item_text[2:]
-            
-        return os.path.join(self.current_path, item_text)
-
-    def update_file_size(self, path, size):
-        """更新文件大小的回调函数"""
+    def update_file_sizes(self, sizes):
+        """把一批计算出的大小写入对应的行（按路径索引查找），只重绘一次"""
         try:
-            for item in self.tree.get_children():
-                if self.tree.item(item)['values'][0] == path:
+            updated = False
+            for path, size in sizes.items():
+                item = self.model.get(path)
+                # 校验后大小未变的缓存值不必重绘
+                if item is not None and (item['size'] != size or item['size_status']):
                     # 更新大小，清除状态
-                    self.tree.set(item, 'size', self.file_system.format_size(size))
-                    break
+                    item['size'] = size
+                    item['size_status'] = ''
+                    updated = True
+            if not updated:
+                return
+            if self.sort_column == 'size':
+                self.model.resort()
+            else:
+                self.model.changed()
         except Exception as e:
             logger.error(f"更新文件大小失败: {str(e)}")
 
     def show_directory_contents(self, directory):
-        """显示目录内容"""
+        """显示目录内容（后台线程逐批加载，界面线程逐批追加）"""
         try:
+            self.cancel_listing()
             self.current_path = directory
             self.path_var.set(directory)
             self.status_var.set("正在加载目录...")
-            self.tree.delete(*self.tree.get_children())
-
-            contents = self.file_system.get_directory_contents(
-                directory, 
-                size_callback=self.update_file_size
-            )
-
-            # 按名称排序，目录在前
-            contents.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
-
-            for item in contents:
-                # 使用状态信息格式化大小显示
-                size_str = self.file_system.format_size(item['size'], item['size_status'])
-                modified_str = format_timestamp(item['modified'])
-                
-                values = (item['path'], size_str, modified_str)
-                icon = "📁 " if item['is_dir'] else "📄 "
-                
-                # 如果是正在计算大小的目录，使用斜体显示
-                tags = ('calculating',) if item['size_status'] == self.file_system.SIZE_CALCULATING else ()
-                
-                self.tree.insert("", "end", text=icon + item['name'], 
-                               values=values, tags=tags)
-
-            self.status_var.set("就绪")
+            self.file_system.watch_directory(directory)
+
+            # 沿用当前的排序方式；".." 固定在最前面
+            parent = self.file_system.parent_item(directory)
+            self.model.set_rows([], pinned=[parent] if parent else [])
+            self.file_list.first = 0
+
+            cancel = threading.Event()
+            self._listing = cancel
+            self._listed = 0
+            threading.Thread(target=self._list_directory, args=(directory, cancel),
+                             name="dir-listing", daemon=True).start()
 
         except Exception as e:
-            error_msg = f"读取目录失败: {str(e)}"
-            logger.error(error_msg)
-            self.status_var.set(error_msg)
-            messagebox.showerror("错误", error_msg)
+            self._show_listing_error(e)
+
+    def cancel_listing(self):
+        """取消进行中的目录加载，已排队的批次随之作废"""
+        if self._listing is not None:
+            self._listing.set()
+            self._listing = None
+
+    def _list_directory(self, directory, cancel):
+        """后台线程：读取目录并把每一批交给界面线程"""
+        try:
+            for batch in self.file_system.iter_directory_contents(
+                    directory, size_callback=self._queue_size, cancel=cancel):
+                if cancel.is_set():
+                    return
+                self._updates.put(('batch', cancel, batch))
+            self._updates.put(('listed', cancel, None))
+        except Exception as e:
+            self._updates.put(('listed', cancel, e))
+
+    def _show_listing_error(self, error):
+        error_msg = f"读取目录失败: {str(error)}"
+        logger.error(error_msg)
+        self.status_var.set(error_msg)
+        messagebox.showerror("错误", error_msg)
+
+    def _row_options(self, item):
+        """条目对应的行文本、列值和标签"""
+        # 使用状态信息格式化大小显示
+        size_str = self.file_system.format_size(item['size'], item['size_status'])
+        modified_str = format_timestamp(item['modified'])
+        values = (item['path'], size_str, modified_str)
+        icon = "📁 " if item['is_dir'] else "📄 "
+        # 如果是正在计算大小的目录，使用斜体显示
+        tags = ('calculating',) if item['size_status'] == self.file_system.SIZE_CALCULATING else ()
+        return icon + item['name'], values, tags
+
+    def _drain_updates(self):
+        """在界面线程中应用目录加载批次、目录变化和后台计算出的大小"""
+        rows = []
+        try:
+            for _ in range(500):
+                item = self._updates.get_nowait()
+                if item[0] == 'batch':
+                    # 同一轮的多个批次合并后一次追加
+                    if item[1] is self._listing:
+                        rows.extend(item[2])
+                    continue
+                if rows:
+                    self._append_rows(rows)
+                    rows = []
+                if item[0] == 'listed':
+                    if item[1] is self._listing:
+                        self._finish_listing(item[2])
+                elif item[0] == 'changes':
+                    self._apply_changes(item[1], item[2])
+                elif item[0] == 'size':
+                    self._sizes[item[1]] = item[2]
+        except queue.Empty:
+            pass
+        except Exception as e:
+            logger.error(f"更新文件列表失败: {str(e)}")
+        if rows:
+            self._append_rows(rows)
+        # 大小结果合并后每 SIZE_UPDATE_INTERVAL 刷新一次
+        now = time.monotonic()
+        if self._sizes and now - self._sizes_applied >= SIZE_UPDATE_INTERVAL:
+            sizes, self._sizes = self._sizes, {}
+            self._sizes_applied = now
+            self.update_file_sizes(sizes)
+        self._prioritize_visible()
+        # 加载目录期间加快轮询，第一批尽快显示
+        self.after(30 if self._listing is not None else 200, self._drain_updates)
+
+    def _prioritize_visible(self):
+        """让视口中仍在计算大小的目录优先计算"""
+        calculating = self.file_system.SIZE_CALCULATING
+        paths = frozenset(item['path'] for item in self.file_list.visible()
+                          if item['size_status'] == calculating)
+        if paths and paths != self._prioritized:
+            self.file_system.prioritize_sizes(paths)
+        self._prioritized = paths
+
+    def _append_rows(self, rows):
+        self.model.extend(rows)
+        self._listed += len(rows)
+        self.status_var.set(f"正在加载目录... 已读取 {self._listed} 项")
+
+    def _finish_listing(self, error):
+        self._listing = None
+        if error is not None:
+            self._show_listing_error(error)
+        else:
+            self.status_var.set(f"就绪（{self._listed} 项）")
+
+    def _apply_changes(self, changes, overflow):
+        """按监视到的变化增量更新当前目录的行"""
+        current = self.current_path
+        if not current:
+            return
+        names = changes.get(current, set())
+        if overflow or len(names) > FileSystemSettings.WATCH_REFRESH_THRESHOLD:
+            self.refresh_current_directory()
+            return
+        if '' in names:
+            self.status_var.set("当前目录已被删除或移动")
+            return
+        for name in names:
+            self._update_row(os.path.join(current, name))
+
+        # 子目录内部的变化只影响对应行的大小
+        prefix = os.path.join(current, '')
+        resized = set()
+        for directory in changes:
+            if directory.startswith(prefix):
+                child = os.path.join(current, directory[len(prefix):].split(os.sep)[0])
+                item = self.model.get(child)
+                if item is not None and child not in resized:
+                    resized.add(child)
+                    item['size_status'] = self.file_system.SIZE_CALCULATING
+                    self.file_system.request_size(child, self._queue_size)
+        if resized:
+            self.model.changed()
+
+    def _update_row(self, path):
+        """插入、更新或删除单个路径对应的行"""
+        info = self.file_system.get_item_info(path, size_callback=self._queue_size)
+        if info is None:
+            self.model.remove(path)
+        else:
+            self.model.put(info)
+
+    def _queue_size(self, path, size):
+        """后台线程计算出大小后转交界面线程"""
+        self._updates.put(('size', path, size))
 
     def load_thumbnail(self, file_path):
         """加载文件缩略图"""
@@ -365,18 +511,37 @@ class FileFrame(ttk.LabelFrame):
                 self.show_directory_contents(parent)
 
     def sort_tree(self, column):
-        """排序树形视图"""
-        items = [(self.tree.set(item, column), item) 
-                for item in self.tree.get_children("")]
-        items.sort(reverse=True)
-        for index, (_, item) in enumerate(items):
-            self.tree.move(item, "", index)
+        """按列排序（在数据模型上进行）；再次点击同一列切换升降序"""
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = SORT_COLUMNS[column][2]
+        self.apply_sort()
+        self.update_sort_headings()
+
+    def apply_sort(self):
+        _, key, _ = SORT_COLUMNS[self.sort_column]
+        self.model.sort(key, self.sort_reverse, group=is_dir if key is name_key else None)
+
+    def update_sort_headings(self):
+        """在当前排序列的列头显示方向标记"""
+        for column, (text, _, _) in SORT_COLUMNS.items():
+            if column == self.sort_column:
+                text += " ▼" if self.sort_reverse else " ▲"
+            self.file_list.heading(column, text=text)
+
+    def apply_filter(self):
+        """按名称筛选当前目录的条目"""
+        text = self.filter_var.get().strip().lower()
+        self.model.set_filter((lambda item: text in item['name'].lower()) if text else None)
+        self.file_list.first = 0
 
     def on_double_click(self, event):
         """处理双击事件"""
-        item = self.tree.identify_row(event.y)
+        item = self.file_list.row_at(event.y)
         if item:
-            self.tree.selection_set(item)
+            self.file_list.selection_set([item])
             self.open_selected()
 
     def show_error(self, title: str, error: Exception, operation: str = "操作"):
@@ -425,9 +590,4 @@ class FileFrame(ttk.LabelFrame):
         """清理资源"""
         self.file_system.cleanup()
         
-    def setup_ui(self):
-        # ... 其他UI设置代码 ...
-        
-        # 添加计算中状态的样式
-        self.tree.tag_configure('calculating', font=('', 9, 'italic'))
         
\ No newline at end of file
@@ -1,13 +1,24 @@
 """网络工具框架"""
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
+import queue
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from src.core.network import NetworkOperations
+from src.core.resolver import get_resolver
+from src.config.settings import SCAN_WORKERS
 
 class NetworkFrame(ttk.LabelFrame):
     def __init__(self, master, **kwargs):
         super().__init__(master, text="网络工具", padding="5", **kwargs)
+        # 扫描线程与解析回调只往队列里放结果，由界面线程定时取出更新表格
+        self._result_queue = queue.Queue()
+        self._host_rows = {}
+        self._hostnames = {}
+        self._scan_total = 0
+        self._scan = None  # 当前扫描的标志 (threading.Event)，置位表示已被新扫描取代
         self.create_widgets()
+        self.after(100, self._drain_results)
 
     def create_widgets(self):
         # 创建输入框架
@@ -16,6 +27,9 @@ class NetworkFrame(ttk.LabelFrame):
         # 创建输出区域
         self.create_output_area()
 
+        # 创建扫描结果表格
+        self.create_results_table()
+
     def create_input_frame(self):
         input_frame = ttk.Frame(self)
         input_frame.pack(fill="x", padx=5, pady=5)
@@ -39,6 +53,11 @@ class NetworkFrame(ttk.LabelFrame):
                        variable=self.protocol_var, 
                        value="UDP").pack(side="left", padx=2)
 
+        # 代理（可选），如 socks5://10.0.0.1:1080 或 http://10.0.0.1:3128
+        ttk.Label(input_frame, text="代理:").pack(side="left", padx=5)
+        self.proxy_entry = ttk.Entry(input_frame, width=24)
+        self.proxy_entry.pack(side="left", padx=5)
+
         # 按钮
         self.create_buttons(input_frame)
 
@@ -62,6 +81,22 @@ class NetworkFrame(ttk.LabelFrame):
         self.output = scrolledtext.ScrolledText(self, height=10, width=70)
         self.output.pack(fill="x", padx=5, pady=5)
 
+    def create_results_table(self):
+        """端口扫描结果表格，主机名在反向解析完成后异步填入"""
+        frame = ttk.Frame(self)
+        frame.pack(fill="both", expand=True, padx=5, pady=5)
+        columns = (("address", "地址", 160), ("port", "端口", 60),
+                   ("status", "状态", 340), ("hostname", "主机名", 220))
+        self.results = ttk.Treeview(frame, columns=[c[0] for c in columns],
+                                    show="headings", height=8)
+        for column, text, width in columns:
+            self.results.heading(column, text=text)
+            self.results.column(column, width=width, anchor="w")
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.results.yview)
+        self.results.configure(yscrollcommand=scrollbar.set)
+        self.results.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
     def clear_output(self):
         """清除输出区域"""
         self.output.delete(1.0, tk.END)
@@ -101,11 +136,15 @@ class NetworkFrame(ttk.LabelFrame):
         self.append_output(f"正在解析域名 {domain}...")
         
         def dns_thread():
-            success, result = NetworkOperations.resolve_dns(domain)
+            success, result = NetworkOperations.resolve_dns(domain, aliases=True)
             if success:
                 self.append_output(f"主机名: {result['hostname']}")
                 self.append_output(f"别名列表: {', '.join(result['aliases']) if result['aliases'] else '无'}")
                 self.append_output(f"IP地址列表: {', '.join(result['addresses'])}")
+                for address, info in (result.get('annotations') or {}).items():
+                    if info:
+                        self.append_output(f"  {address}: AS{info['asn']} {info['country']} "
+                                           f"{info['org']}")
             else:
                 self.append_output(f"DNS解析失败: {result['error']}")
             self.dns_button.config(state="normal")
@@ -113,38 +152,96 @@ class NetworkFrame(ttk.LabelFrame):
         threading.Thread(target=dns_thread, daemon=True).start()
 
     def start_port_scan(self):
-        """开始端口扫描"""
+        """开始端口扫描（地址支持网段/范围，端口支持列表/范围）"""
         host = self.ip_entry.get().strip()
         port_str = self.port_entry.get().strip()
         protocol = self.protocol_var.get()
+        proxy = self.proxy_entry.get().strip() or None
 
         if not host or not port_str:
             messagebox.showerror("错误", "请输入IP地址和端口")
             return
 
         try:
-            port = int(port_str)
-            if not (0 <= port <= 65535):
-                raise ValueError("端口号必须在0-65535之间")
+            hosts = NetworkOperations.expand_targets(host)
+            ports = NetworkOperations.parse_ports(port_str)
+            if not hosts or not ports:
+                raise ValueError("没有可扫描的目标")
         except ValueError as e:
-            messagebox.showerror("错误", f"无效的端口号: {str(e)}")
+            messagebox.showerror("错误", f"无效的地址或端口: {str(e)}")
             return
 
+        targets = [(h, p) for h in hosts for p in ports]
+        # 单个主机时显示所有端口，批量扫描只显示开放的端口
+        show_closed = len(hosts) == 1
+        self._scan_total = len(targets)
+        # 旧扫描剩余的目标不再扫描，已在队列中的结果和迟到的反向解析结果按标志丢弃
+        if self._scan is not None:
+            self._scan.set()
+        scan = self._scan = threading.Event()
+        self.results.delete(*self.results.get_children())
+        self._host_rows.clear()
+        self._hostnames.clear()
+
         self.port_scan_button.config(state="disabled")
         self.clear_output()
-        self.append_output(f"正在扫描 {host}:{port} ({protocol})...")
-        
+        self.append_output(f"正在扫描 {host} 的 {len(ports)} 个端口，共 {len(targets)} 个目标 "
+                           f"({protocol}){f'，经代理 {proxy}' if proxy else ''}...")
+
+        def on_ptr(address, name):
+            self._result_queue.put(('ptr', scan, address, name))
+
+        def scan_one(target):
+            address, port = target
+            if scan.is_set():
+                return False
+            success, result = NetworkOperations.scan_port(address, port, protocol, proxy)
+            if success or show_closed:
+                self._result_queue.put(('result', scan, address, port, result))
+            if success:
+                get_resolver().reverse_many([address], on_ptr)
+            return success
+
         def scan_thread():
-            success, result = NetworkOperations.scan_port(host, port, protocol)
-            self.append_output(result)
-            self.port_scan_button.config(state="normal")
+            with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(targets))) as pool:
+                open_count = sum(pool.map(scan_one, targets))
+            self._result_queue.put(('done', scan, open_count, len(targets)))
 
         threading.Thread(target=scan_thread, daemon=True).start()
 
+    def _drain_results(self):
+        """在界面线程中处理扫描结果与反向解析结果"""
+        try:
+            for _ in range(500):
+                item = self._result_queue.get_nowait()
+                kind = item[0]
+                if item[1] is not self._scan:
+                    continue
+                if kind == 'result':
+                    _, _, address, port, result = item
+                    row = self.results.insert("", "end", values=(
+                        address, port, result, self._hostnames.get(address, "")))
+                    self._host_rows.setdefault(address, []).append(row)
+                    if self._scan_total == 1:
+                        self.append_output(result)
+                elif kind == 'ptr':
+                    _, _, address, name = item
+                    self._hostnames[address] = name or "-"
+                    for row in self._host_rows.get(address, ()):
+                        self.results.set(row, "hostname", name or "-")
+                elif kind == 'done':
+                    _, _, open_count, total = item
+                    self.append_output(f"扫描完成: {total} 个目标，{open_count} 个开放")
+                    self.port_scan_button.config(state="normal")
+        except queue.Empty:
+            pass
+        self.after(100, self._drain_results)
+
     def disable_controls(self):
         """禁用所有控件"""
         self.ip_entry.config(state="disabled")
         self.port_entry.config(state="disabled")
+        self.proxy_entry.config(state="disabled")
         self.ping_button.config(state="disabled")
         self.dns_button.config(state="disabled")
         self.port_scan_button.config(state="disabled")
@@ -153,6 +250,7 @@ class NetworkFrame(ttk.LabelFrame):
         """启用所有控件"""
         self.ip_entry.config(state="normal")
         self.port_entry.config(state="normal")
+        self.proxy_entry.config(state="normal")
         self.ping_button.config(state="normal")
         self.dns_button.config(state="normal")
         self.port_scan_button.config(state="normal") 
\ No newline at end of file
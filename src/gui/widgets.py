@@ -1,6 +1,12 @@
 """自定义控件"""
 import tkinter as tk
+import tkinter.font as tkfont
 from tkinter import ttk
+from bisect import bisect_left, bisect_right
+from collections import deque
+from operator import itemgetter
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from src.config.settings import VIRTUAL_LIST_OVERSCAN
 
 class StatusBar(ttk.Frame):
     def __init__(self, master, **kwargs):
@@ -28,4 +34,649 @@ class ScrolledTreeview(ttk.Treeview):
         # 布局
         self.vsb.pack(side="right", fill="y")
         self.hsb.pack(side="bottom", fill="x")
-        self.pack(side="left", fill="both", expand=True) 
\ No newline at end of file
+        self.pack(side="left", fill="both", expand=True) 
+
+class LiveChart(tk.Canvas):
+    """实时延迟曲线
+
+    每条曲线预先创建固定数量的折线段（每个像素列一段），新数据到达时
+    整体左移并复用移出左边界的线段，只重绘新增的列。样本数超过列数时
+    按列做 最小/最大值 降采样，保证尖峰不会被平均掉。
+    """
+
+    def __init__(self, master, window: int = 600, column_width: int = 2,
+                 y_max: float = 100.0, fps: int = 60, **kwargs):
+        kwargs.setdefault("background", "white")
+        kwargs.setdefault("highlightthickness", 0)
+        super().__init__(master, **kwargs)
+        self.window = window  # 可见窗口内的样本数
+        self.column_width = column_width
+        self.y_max = y_max
+        self.interval = max(1, 1000 // fps)
+        self.series = {}
+        self._columns = 0
+        self._width = 0
+        self._height = 0
+        self._axis_label = self.create_text(4, 2, anchor="nw", fill="gray40",
+                                            text=f"{self.y_max:g} ms")
+        self.bind("<Configure>", self._on_resize)
+        self._job = self.after(self.interval, self._tick)
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+    def add_series(self, name: str, color: str = "steelblue"):
+        """添加一条曲线"""
+        if name in self.series:
+            return
+        self.series[name] = _ChartSeries(name, color, self.window)
+        self._build_series(self.series[name])
+
+    def remove_series(self, name: str):
+        """移除曲线"""
+        series = self.series.pop(name, None)
+        if series:
+            self.delete(series.tag)
+
+    def add_sample(self, name: str, value):
+        """追加样本（可在任意线程调用），value 为 None 表示丢包"""
+        series = self.series.get(name)
+        if series is not None:
+            series.pending.append(float("nan") if value is None else float(value))
+
+    def destroy(self):
+        if self._job:
+            self.after_cancel(self._job)
+            self._job = None
+        super().destroy()
+
+    # ------------------------------------------------------------------
+    # 绘制
+    # ------------------------------------------------------------------
+    def _on_resize(self, event):
+        """尺寸变化时按新的列数重建线段"""
+        if event.width == self._width and event.height == self._height:
+            return
+        self._columns = max(1, event.width // self.column_width)
+        self._width = event.width
+        self._height = event.height
+        for series in self.series.values():
+            self._build_series(series)
+
+    def _build_series(self, series: "_ChartSeries"):
+        """创建曲线的线段池，并用保留的列摘要重绘"""
+        self.delete(series.tag)
+        if not self._columns:
+            return
+        series.samples_per_column = max(1, -(-self.window // self._columns))
+        series.items = [self.create_line(0, 0, 0, 0, fill=series.color, state="hidden",
+                                         tags=(series.tag, "series"))
+                        for _ in range(self._columns)]
+        series.hidden = set(series.items)
+        series.head = 0
+        series.last_y = None
+        history = list(series.history)[-self._columns:]
+        for position, column in enumerate(history, 1):
+            self._draw_column(series, column, position)
+        series.drawn = len(history)
+
+    def _tick(self):
+        """定时处理新样本，每条曲线只更新新增的列"""
+        self._job = None
+        try:
+            for series in self.series.values():
+                columns = series.consume()
+                if columns and self._columns:
+                    self._append_columns(series, columns)
+        finally:
+            self._job = self.after(self.interval, self._tick)
+
+    def _append_columns(self, series: "_ChartSeries", columns: list):
+        """左移已有线段并复用最旧的线段绘制新列"""
+        peak = max((column[2] for column in columns if column[2] == column[2]), default=0.0)
+        if peak > self.y_max:
+            self._rescale(peak)
+
+        # 新列先画在各自的最终位置右侧 shift 列处，再整体左移 shift 列
+        columns = columns[-self._columns:]
+        total = series.drawn + len(columns)
+        shift = max(0, total - self._columns)
+        for position, column in enumerate(columns, series.drawn + 1):
+            self._draw_column(series, column, position)
+        series.drawn = min(total, self._columns)
+        if shift:
+            self.move(series.tag, -shift * self.column_width, 0)
+
+    def _draw_column(self, series: "_ChartSeries", column: tuple, position: int):
+        """在线段池中取下一段绘制一列（position 为该列在可见区域的序号，从1开始）"""
+        first, low, high, last = column
+        item = series.items[series.head]
+        series.head = (series.head + 1) % len(series.items)
+        x = (position - 1) * self.column_width
+        if low != low:  # 整列丢包
+            if item not in series.hidden:
+                self.itemconfigure(item, state="hidden")
+                series.hidden.add(item)
+            series.last_y = None
+            return
+        y_first, y_low, y_high, y_last = (self._y(v) for v in (first, low, high, last))
+        x_prev = x - self.column_width
+        y_prev = series.last_y if series.last_y is not None else y_first
+        self.coords(item, x_prev, y_prev, x, y_first, x, y_low, x, y_high, x, y_last)
+        if item in series.hidden:
+            self.itemconfigure(item, state="normal")
+            series.hidden.discard(item)
+        series.last_y = y_last
+
+    def _y(self, value: float) -> float:
+        height = self._height or int(self["height"])
+        return height - 1 - min(value, self.y_max) / self.y_max * (height - 12)
+
+    def _rescale(self, peak: float):
+        """纵轴上限增大时一次性缩放所有已绘制线段"""
+        new_max = self.y_max
+        while new_max < peak:
+            new_max *= 2
+        height = self._height or int(self["height"])
+        self.scale("series", 0, height - 1, 1, self.y_max / new_max)
+        for series in self.series.values():
+            if series.last_y is not None:
+                series.last_y = height - 1 - (height - 1 - series.last_y) * self.y_max / new_max
+        self.y_max = new_max
+        self.itemconfigure(self._axis_label, text=f"{self.y_max:g} ms")
+
+
+class _ChartSeries:
+    """实时曲线的数据与绘制状态"""
+
+    def __init__(self, name: str, color: str, window: int):
+        self.name = name
+        self.color = color
+        self.tag = f"series:{name}"
+        self.pending = deque()
+        self.history = deque(maxlen=window)  # 已完成列的摘要，用于重建
+        self.items = []
+        self.hidden = set()
+        self.head = 0
+        self.drawn = 0
+        self.last_y = None
+        self.samples_per_column = 1
+        self._reset_column()
+
+    def _reset_column(self):
+        self._count = 0
+        self._first = self._low = self._high = self._last = float("nan")
+
+    def consume(self) -> list:
+        """把待处理样本累积到列中，返回新完成的列 (首值, 最小, 最大, 末值)"""
+        columns = []
+        pending = self.pending
+        while pending:
+            value = pending.popleft()
+            self._count += 1
+            if value == value:
+                if self._first != self._first:
+                    self._first = self._low = self._high = value
+                else:
+                    if value < self._low:
+                        self._low = value
+                    if value > self._high:
+                        self._high = value
+                self._last = value
+            if self._count >= self.samples_per_column:
+                column = (self._first, self._low, self._high, self._last)
+                columns.append(column)
+                self.history.append(column)
+                self._reset_column()
+        return columns
+
+
+class ListModel:
+    """虚拟列表的数据模型
+
+    全部行保存在 Python 列表中，筛选和排序只重排行对象的引用，不涉及 Tk。
+    pinned 中的行（如 ".."）始终显示在最前面，不参与筛选和排序。
+    """
+
+    def __init__(self, key: Callable[[Any], Hashable] = lambda row: row):
+        self.key = key
+        self.pinned: list = []
+        self.rows: list = []
+        self.view: list = []
+        self._index: Dict[Hashable, Any] = {}
+        self._filter: Optional[Callable[[Any], bool]] = None
+        self._sort_key: Optional[Callable[[Any], Any]] = None
+        self._group: Optional[Callable[[Any], bool]] = None
+        self._reverse = False
+        self._group_count = 0  # view 开头 group 为真的行数
+        self._keys: Optional[list] = None  # 与 view 一一对应的排序键，None 表示需重新计算
+        self._listeners: list = []
+
+    def __len__(self):
+        return len(self.pinned) + len(self.view)
+
+    def __getitem__(self, index: int):
+        pinned = len(self.pinned)
+        return self.pinned[index] if index < pinned else self.view[index - pinned]
+
+    def subscribe(self, callback: Callable[[], None]):
+        """数据变化时调用 callback()"""
+        self._listeners.append(callback)
+
+    def changed(self):
+        """通知视图重绘（直接修改行内容后调用）"""
+        for callback in self._listeners:
+            callback()
+
+    # ------------------------------------------------------------------
+    # 行操作
+    # ------------------------------------------------------------------
+    def get(self, key):
+        """按键查找行"""
+        return self._index.get(key)
+
+    def set_rows(self, rows: Iterable, pinned: Iterable = ()):
+        """替换全部数据"""
+        self.pinned = list(pinned)
+        self.rows = list(rows)
+        self._index = {self.key(row): row for row in self.pinned}
+        self._index.update((self.key(row), row) for row in self.rows)
+        self._rebuild()
+
+    def extend(self, rows: Iterable):
+        """追加行；键已存在的行原地更新，不重复添加
+
+        已排序时只对新增行排序，再按缓存的排序键二分插入到现有视图中，
+        流式加载时每批的开销与新增行数（加一次列表拷贝）成正比。
+        """
+        added_rows = []
+        updated = False
+        for row in rows:
+            key = self.key(row)
+            old = self._index.get(key)
+            if old is None:
+                self._index[key] = row
+                added_rows.append(row)
+            elif isinstance(old, dict):
+                old.update(row)
+                updated = True
+        rows = added_rows
+        self.rows.extend(rows)
+        added = [row for row in rows if self._filter is None or self._filter(row)]
+        if self._sort_key is None:
+            self.view.extend(added)
+        elif updated:
+            # 已有行的内容变了，位置可能随之变化
+            self.view = self._ordered(self.view + added)
+        elif added:
+            self._merge(added)
+        self.changed()
+
+    def put(self, row):
+        """插入新行，或原地更新键相同的行"""
+        old = self._index.get(self.key(row))
+        if old is None:
+            self.extend([row])
+            return
+        if isinstance(old, dict):
+            old.update(row)
+        self.changed()
+
+    def remove(self, key):
+        """删除键对应的行"""
+        row = self._index.pop(key, None)
+        if row is None:
+            return
+        self.pinned = [r for r in self.pinned if r is not row]
+        self.rows = [r for r in self.rows if r is not row]
+        view = [r for r in self.view if r is not row]
+        if len(view) != len(self.view) and self._group is not None and self._group(row):
+            self._group_count -= 1
+        self.view = view
+        self._keys = None
+        self.changed()
+
+    # ------------------------------------------------------------------
+    # 筛选与排序
+    # ------------------------------------------------------------------
+    def set_filter(self, predicate: Optional[Callable[[Any], bool]]):
+        """设置筛选条件（None 表示显示全部）"""
+        self._filter = predicate
+        self._rebuild()
+
+    def sort(self, key: Optional[Callable[[Any], Any]], reverse: bool = False,
+             group: Optional[Callable[[Any], bool]] = None):
+        """按 key 排序可见行（None 表示保持原始顺序）
+
+        group(row) 为真的行（如目录）不论升降序都排在前面。key 和 group 与
+        上次相同、只切换方向时分组内各自反转当前顺序（O(n)），不重新计算
+        排序键也不重新比较；键相等的行的相对顺序随之反转。
+        """
+        if key is not None and key is self._sort_key and group is self._group:
+            if reverse != self._reverse:
+                self._reverse = reverse
+                head, tail = self.view[:self._group_count], self.view[self._group_count:]
+                head.reverse()
+                tail.reverse()
+                self.view = head + tail
+                self._keys = None
+                self.changed()
+            return
+        self._sort_key = key
+        self._group = group
+        self._reverse = reverse
+        self._rebuild()
+
+    def resort(self):
+        """行内容变化后按当前排序方式重新排列（基本有序时接近 O(n)）"""
+        if self._sort_key is None:
+            self.changed()
+            return
+        self.view = self._ordered(self.view)
+        self.changed()
+
+    def _ordered(self, rows: list) -> list:
+        """按当前排序方式排列 rows（每行的排序键只计算一次）
+
+        有 group 时先分组再各自排序，分组在行的原始顺序上进行，比排序后
+        再按打乱的顺序访问各行快得多。
+        """
+        key, reverse, group = self._sort_key, self._reverse, self._group
+        first = [row for row in rows if group(row)] if group is not None else []
+        self._group_count = len(first)
+        self._keys = None
+        if not first:
+            return sorted(rows, key=key, reverse=reverse)
+        rest = [row for row in rows if not group(row)]
+        first.sort(key=key, reverse=reverse)
+        rest.sort(key=key, reverse=reverse)
+        first.extend(rest)
+        return first
+
+    def _merge(self, added: list):
+        """把新增行按当前排序方式插入 view
+
+        新增行按缓存的排序键在各自分组的范围内二分定位，键相等时排在已有行
+        之后，与整体重新稳定排序的结果一致。
+        """
+        key, reverse, group = self._sort_key, self._reverse, self._group
+        if self._keys is None:
+            self._keys = [key(row) for row in self.view]
+        view, keys = self.view, self._keys
+        size, count = len(view), self._group_count
+        decorated = sorted(((key(row), row) for row in added), key=itemgetter(0), reverse=reverse)
+        first = [item for item in decorated if group(item[1])] if group is not None else []
+        if first:
+            decorated = first + [item for item in decorated if not group(item[1])]
+        grouped = len(first)
+        if reverse:
+            # 降序列表反转成升序后二分，插在相等键之前即原列表中相等键之后
+            ascending = keys[::-1]
+            positions = [size - bisect_left(ascending, k, *((size - count, size) if index < grouped
+                                                            else (0, size - count)))
+                         for index, (k, _) in enumerate(decorated)]
+        else:
+            positions = [bisect_right(keys, k, *((0, count) if index < grouped else (count, size)))
+                         for index, (k, _) in enumerate(decorated)]
+
+        merged_view, merged_keys = [], []
+        previous = 0
+        for position, (k, row) in zip(positions, decorated):
+            if position > previous:
+                merged_view.extend(view[previous:position])
+                merged_keys.extend(keys[previous:position])
+                previous = position
+            merged_view.append(row)
+            merged_keys.append(k)
+        merged_view.extend(view[previous:])
+        merged_keys.extend(keys[previous:])
+        self.view, self._keys = merged_view, merged_keys
+        self._group_count = count + grouped
+
+    def _rebuild(self):
+        rows = self.rows
+        if self._filter is not None:
+            rows = [row for row in rows if self._filter(row)]
+        self.view = self._ordered(rows) if self._sort_key is not None else list(rows)
+        self.changed()
+
+
+class VirtualTreeview(ttk.Frame):
+    """只为可见行创建 Tk 项的列表视图
+
+    内部 Treeview 只保留 "可见行数 + overscan" 个项，滚动时按新的起始位置
+    改写这些项的内容，数据量再大 Tk 中的项数也不变。选中状态以行的键记录在
+    Python 侧，滚出视口的行保持选中。
+    """
+
+    def __init__(self, master, model: ListModel,
+                 render: Callable[[Any], Tuple[str, tuple, tuple]],
+                 columns: Tuple[str, ...], overscan: int = VIRTUAL_LIST_OVERSCAN, **kwargs):
+        super().__init__(master)
+        self.model = model
+        self.render = render
+        self.overscan = overscan
+        self.first = 0
+        self.visible_rows = 1
+        self.selected = set()
+        self._anchor = None  # 键盘导航的当前行序号
+        self._slots = []
+        self._slot_rows = []
+        self._attached = 0
+        self._extend_selection = False
+        self._applied_selection = ()
+        self._redraw_pending = False
+        self._height = 0  # Treeview 当前高度（像素）
+        self._metrics = None  # 计算项池大小时所用的 (行高, 首行顶部位置)
+
+        self.tree = ttk.Treeview(self, columns=columns, show="tree headings",
+                                 selectmode="extended", height=1, **kwargs)
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.hsb.set)
+        self.vsb.pack(side="right", fill="y")
+        self.hsb.pack(side="bottom", fill="x")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Button-1>", self._on_click, add="+")
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "page-"),
+                          ("<Next>", "page+"), ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(key, lambda e, step=step: self._on_key(step))
+        model.subscribe(self.refresh)
+
+    # ------------------------------------------------------------------
+    # 透传到 Treeview 的配置
+    # ------------------------------------------------------------------
+    def heading(self, column, **kwargs):
+        return self.tree.heading(column, **kwargs)
+
+    def column(self, column, **kwargs):
+        return self.tree.column(column, **kwargs)
+
+    def tag_configure(self, tag, **kwargs):
+        return self.tree.tag_configure(tag, **kwargs)
+
+    def bind_tree(self, sequence, func):
+        return self.tree.bind(sequence, func, add="+")
+
+    # ------------------------------------------------------------------
+    # 选中与定位
+    # ------------------------------------------------------------------
+    def row_at(self, y: int):
+        """窗口坐标 y 处的行，没有时返回None"""
+        item = self.tree.identify_row(y)
+        if not item:
+            return None
+        return self._slot_rows[self._slots.index(item)]
+
+    def selection(self) -> list:
+        """选中的行"""
+        rows = (self.model.get(key) for key in self.selected)
+        return [row for row in rows if row is not None]
+
+    def selection_set(self, rows: Iterable):
+        key = self.model.key
+        self.selected = {key(row) for row in rows}
+        self.refresh()
+
+    def see(self, index: int):
+        """滚动使第 index 行可见"""
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self.visible_rows:
+            self.first = index - self.visible_rows + 1
+        self.refresh()
+
+    def scroll(self, rows: int):
+        self.first += rows
+        self.refresh()
+
+    def visible(self) -> list:
+        """当前视口中的行"""
+        end = min(len(self.model), self.first + self.visible_rows)
+        return [self.model[index] for index in range(max(0, self.first), end)]
+
+    # ------------------------------------------------------------------
+    # 绘制
+    # ------------------------------------------------------------------
+    def refresh(self):
+        """合并到空闲时重绘（模型变化时可频繁调用）"""
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def _redraw(self):
+        self._redraw_pending = False
+        total = len(self.model)
+        self.first = max(0, min(self.first, total - self.visible_rows))
+        count = min(len(self._slots), total - self.first)
+        key = self.model.key
+        selection = []
+        for slot in range(count):
+            row = self.model[self.first + slot]
+            item = self._slots[slot]
+            text, values, tags = self.render(row)
+            self.tree.item(item, text=text, values=values, tags=tags)
+            self._slot_rows[slot] = row
+            if key(row) in self.selected:
+                selection.append(item)
+        # 数据不足一屏时把多余的项摘下，而不是留下空行
+        for slot in range(count, self._attached):
+            self.tree.detach(self._slots[slot])
+            self._slot_rows[slot] = None
+        for slot in range(self._attached, count):
+            self.tree.move(self._slots[slot], "", slot)
+        self._attached = count
+        self._applied_selection = tuple(selection)
+        self.tree.selection_set(selection)
+        if total:
+            self.vsb.set(self.first / total, min(1.0, (self.first + self.visible_rows) / total))
+        else:
+            self.vsb.set(0.0, 1.0)
+        # 首次有行显示后按实际行高校正项池大小
+        if count and self._metrics != self._row_metrics():
+            self._layout()
+
+    def _row_metrics(self) -> Tuple[int, int]:
+        """(行高, 首行顶部位置)
+
+        有已显示的项时取其 bbox（包含主题、字体缩放和 DPI 的影响），否则按
+        样式的 rowheight 或默认字体行距估算，表头按一行计。
+        """
+        if self._attached:
+            box = self.tree.bbox(self._slots[0])
+            if box and box[3] > 0:
+                return box[3], box[1]
+        height = ttk.Style().lookup("Treeview", "rowheight")
+        try:
+            height = int(height)
+        except (TypeError, ValueError):
+            height = 0
+        if height <= 0:
+            height = tkfont.nametofont("TkDefaultFont").metrics("linespace")
+        return height, height
+
+    def _on_resize(self, event):
+        self._height = event.height
+        self._layout()
+
+    def _layout(self):
+        """按当前高度和行高调整项池的大小"""
+        self._metrics = height, top = self._row_metrics()
+        self.visible_rows = max(1, (self._height - top) // height)
+        wanted = self.visible_rows + self.overscan
+        while len(self._slots) < wanted:
+            self._slots.append(self.tree.insert("", "end"))
+            self.tree.detach(self._slots[-1])
+            self._slot_rows.append(None)
+        while len(self._slots) > wanted:
+            self.tree.delete(self._slots.pop())
+            self._slot_rows.pop()
+            self._attached = min(self._attached, len(self._slots))
+        self.refresh()
+
+    # ------------------------------------------------------------------
+    # 事件
+    # ------------------------------------------------------------------
+    def _on_scrollbar(self, action, value, unit=None):
+        total = len(self.model)
+        if action == "moveto":
+            self.first = int(float(value) * total)
+        elif unit == "pages":
+            self.first += int(value) * self.visible_rows
+        else:
+            self.first += int(value)
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        # Windows 每格 120，macOS 为较小的整数
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll(-3 * delta)
+        return "break"
+
+    def _on_click(self, event):
+        # Ctrl/Shift 点击保留视口外的选中行
+        self._extend_selection = bool(event.state & 0x0005)
+        item = self.tree.identify_row(event.y)
+        if item:
+            self._anchor = self.first + self._slots.index(item)
+
+    def _on_select(self, event):
+        current = self.tree.selection()
+        if current == self._applied_selection:
+            return  # 由重绘本身触发
+        key = self.model.key
+        visible = {key(row) for row in self._slot_rows if row is not None}
+        chosen = {key(self._slot_rows[self._slots.index(item)]) for item in current}
+        if self._extend_selection:
+            self.selected = (self.selected - visible) | chosen
+        else:
+            self.selected = chosen
+        self._applied_selection = current
+        self._extend_selection = False
+
+    def _on_key(self, step):
+        total = len(self.model)
+        if not total:
+            return "break"
+        index = self._anchor if self._anchor is not None else self.first
+        if step == "home":
+            index = 0
+        elif step == "end":
+            index = total - 1
+        elif step == "page-":
+            index -= self.visible_rows
+        elif step == "page+":
+            index += self.visible_rows
+        else:
+            index += step
+        index = max(0, min(index, total - 1))
+        self._anchor = index
+        self.selected = {self.model.key(self.model[index])}
+        self.see(index)
+        return "break"
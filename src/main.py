@@ -1,9 +1,425 @@
 """主程序入口"""
-from src.gui.main_window import MainWindow
+import argparse
+import json
+import os
+import sys
+import threading
+from src.config.settings import (AgentSettings, ApiSettings, MetricsSettings, MonitorSettings,
+                                 ListenerSettings, LoadSettings, ResolverSettings,
+                                 SubdomainSettings, SchedulerSettings)
+
+
+def run_gui():
+    """启动图形界面"""
+    from src.gui.main_window import MainWindow
 
-def main():
     app = MainWindow()
     app.mainloop()
 
+
+def run_agent(args):
+    """以无界面代理模式运行"""
+    from src.core.agent import ProbeAgent
+
+    try:
+        agent = ProbeAgent(args.host, args.port, name=args.name, max_workers=args.workers,
+                           token=args.token or os.environ.get(AgentSettings.TOKEN_ENV))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"探测代理监听于 {agent.address[0]}:{agent.address[1]}")
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.server_close()
+
+
+def run_coordinator(args):
+    """以协调器模式运行，把任务分发给多个代理"""
+    from src.core.agent import AgentCoordinator
+    from src.core.network import NetworkOperations
+
+    coordinator = AgentCoordinator(AgentCoordinator.parse_agents(args.agents),
+                                   token=args.token or os.environ.get(AgentSettings.TOKEN_ENV))
+    limit = AgentSettings.MAX_JOB_TARGETS
+    try:
+        hosts = NetworkOperations.expand_targets(args.targets, limit)
+        if args.type == 'scan':
+            if not args.ports:
+                raise SystemExit("端口扫描需要指定 --ports")
+            ports = NetworkOperations.parse_ports(args.ports, limit)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.type == 'scan':
+        # 先核对组合数再展开，避免 /16 x 全端口之类的输入耗尽内存
+        if len(hosts) * len(ports) > limit:
+            raise SystemExit(f"目标过多: {len(hosts)} 个主机 x {len(ports)} 个端口"
+                             f"（上限 {limit} 个），请拆分后分批执行")
+        targets = [[host, port] for host in hosts for port in ports]
+    else:
+        targets = hosts
+
+    annotator = None
+    if args.annotate:
+        from src.core.ip_annotate import get_annotator
+
+        annotator = get_annotator()
+        if annotator is None:
+            raise SystemExit("尚未导入归属数据库，请先执行 asn --compile")
+
+    print_lock = threading.Lock()
+
+    def emit(message):
+        with print_lock:
+            print(json.dumps(message, ensure_ascii=False), flush=True)
+
+    resolver = None
+    pending_ptr = {}
+    if args.ptr:
+        from src.core.resolver import get_resolver
+
+        resolver = get_resolver()
+
+    for message in coordinator.stream(args.type, targets, args.protocol, args.broadcast):
+        target = message.get('target')
+        host = target[0] if isinstance(target, list) else target
+        if annotator and host is not None:
+            info = annotator.lookup(host)
+            message['asn'] = info._asdict() if info else None
+        emit(message)
+        # 结果先行输出，主机名解析完成后再单独输出一行
+        if resolver and message.get('success') and host not in pending_ptr:
+            pending_ptr.update(resolver.reverse_many(
+                [host], lambda address, name: emit({'target': address, 'ptr': name})))
+
+    for future in pending_ptr.values():
+        future.result()
+
+
+def run_api_server(args):
+    """以HTTP/JSON接口服务模式运行"""
+    from src.core.api_server import ApiServer, run_server
+
+    token = args.token or os.environ.get(ApiSettings.TOKEN_ENV)
+    try:
+        ApiServer.check_binding(args.host, token)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"HTTP接口服务监听于 http://{args.host}:{args.port}")
+    run_server(args.host, args.port, args.workers, token)
+
+
+def run_report(args):
+    """输出探测历史的延迟分析报表"""
+    import time
+    from src.core.analytics import LatencyReporter
+    from src.core.timeseries import TimeSeriesStore, MINUTE
+    from src.config.settings import TimeSeriesSettings
+
+    store = TimeSeriesStore(args.data_dir)
+    end = time.time()
+    hosts = [h.strip() for h in args.hosts.split(',') if h.strip()] if args.hosts else None
+    reports = LatencyReporter(store).report(end - args.days * 86400, end, hosts)
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+    else:
+        print(LatencyReporter.format_table(reports))
+        if any(report['resolution'] == MINUTE for report in reports):
+            days = TimeSeriesSettings.RAW_RETENTION / 86400
+            print(f"注: 时间范围超出原始样本保留期（{days:g}天），已改用分钟汇总计算，百分位等为近似值")
+    store.close()
+
+
+def run_monitor(args):
+    """以TCP长连接健康监控模式运行"""
+    import time
+    from src.core.connection_monitor import ConnectionMonitor
+    from src.core.network import NetworkOperations
+
+    heartbeat = args.heartbeat.encode('utf-8').decode('unicode_escape').encode('latin-1') \
+        if args.heartbeat else None
+    monitor = ConnectionMonitor(
+        callback=lambda event: print(json.dumps(event, ensure_ascii=False), flush=True))
+    for host, port in NetworkOperations.parse_endpoints(args.targets):
+        monitor.add(host, port, heartbeat, args.interval)
+    monitor.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop()
+
+
+def run_listener(args):
+    """以多端口监听测试端模式运行"""
+    import time
+    from src.core.listener import PortListener
+    from src.core.network import NetworkOperations
+
+    listener = PortListener(
+        NetworkOperations.parse_ports(args.ports),
+        protocols=[p.strip().upper() for p in args.protocols.split(',') if p.strip()],
+        host=args.host, mode=args.mode,
+        callback=lambda hit: print(json.dumps(hit, ensure_ascii=False), flush=True))
+    listener.start_in_thread()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+        print(json.dumps(listener.report(), ensure_ascii=False))
+
+
+def run_loadgen(args):
+    """以TCP建连压测模式运行"""
+    from src.core.loadgen import LoadGenerator
+    from src.core.network import NetworkOperations
+
+    host, port = NetworkOperations.parse_endpoints(args.target)[0]
+    request = args.request.encode('utf-8').decode('unicode_escape').encode('latin-1') \
+        if args.request else b''
+    generator = LoadGenerator(host, port, concurrency=args.concurrency, rate=args.rate,
+                              duration=args.duration, request=request,
+                              read_response=args.read, workers=args.workers,
+                              reset=not args.graceful_close)
+    try:
+        result = generator.run()
+    except KeyboardInterrupt:
+        generator.stop()
+        return
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(LoadGenerator.format_report(result))
+
+
+def run_asn(args):
+    """导入归属数据库或查询地址归属"""
+    from src.core.ip_annotate import get_annotator, install_database
+
+    if args.compile:
+        count = install_database(args.compile)
+        print(f"已导入 {count} 个地址段")
+        if not args.addresses:
+            return
+    annotator = get_annotator()
+    if annotator is None:
+        raise SystemExit("尚未导入归属数据库，请先执行 asn --compile <ip2asn.tsv>")
+    addresses = args.addresses or (line.strip() for line in sys.stdin)
+    addresses = [address for address in addresses if address]
+    for address, info in zip(addresses, annotator.annotate(addresses)):
+        if args.json:
+            print(json.dumps({'address': address, 'asn': info._asdict() if info else None},
+                             ensure_ascii=False))
+        elif info:
+            print(f"{address}\tAS{info.asn}\t{info.country}\t{info.org}")
+        else:
+            print(f"{address}\t-\t-\t-")
+
+
+def run_subdomains(args):
+    """基于字典枚举子域名"""
+    from src.core.subdomain import StubZone, SubdomainEnumerator, resolve_addresses
+
+    resolve_fn = StubZone.load(args.zone).resolve if args.zone else resolve_addresses
+    enumerator = SubdomainEnumerator(args.domain, resolve_fn=resolve_fn, rate=args.rate,
+                                     max_workers=args.workers)
+    with open(args.wordlist, 'r', encoding='utf-8', errors='ignore') as words:
+        try:
+            for hit in enumerator.run(words, detect_wildcard=not args.no_wildcard_check):
+                print(json.dumps(hit, ensure_ascii=False), flush=True)
+        except KeyboardInterrupt:
+            pass
+    summary = enumerator.summary()
+    if not args.groups:
+        summary.pop('groups')
+    print(json.dumps({'summary': summary}, ensure_ascii=False))
+    enumerator.resolver.shutdown(wait=False)
+
+
+def run_scheduler(args):
+    """按计划周期性执行探测任务"""
+    import time
+    from src.core.scheduler import ProbeScheduler, parse_job_spec
+    from src.core.timeseries import TimeSeriesStore
+
+    specs = [parse_job_spec(spec) for spec in args.job or []]
+    if args.jobs_file:
+        with open(args.jobs_file, 'r', encoding='utf-8') as f:
+            for item in json.load(f):
+                target = item['target']
+                if item['type'] == 'scan' and isinstance(target, str):
+                    target = parse_job_spec(f"scan:{target}:0")[1]
+                specs.append((item['type'], target, float(item['interval'])))
+    if not specs:
+        raise SystemExit("请通过 --job 或 --jobs-file 指定任务")
+
+    store = None if args.no_store else TimeSeriesStore(args.data_dir)
+    callback = None if args.quiet else \
+        (lambda event: print(json.dumps(event, ensure_ascii=False), flush=True))
+    scheduler = ProbeScheduler(args.workers, store, callback)
+    for job_type, target, interval in specs:
+        scheduler.add(job_type, target, interval)
+    print(f"已调度 {len(specs)} 个定时任务", flush=True)
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        if store is not None:
+            store.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="网络工具集合")
+    parser.add_argument("--metrics-textfile", metavar="PATH",
+                        help="定期把监控指标写入 textfile collector 文件")
+    parser.add_argument("--metrics-interval", type=float,
+                        default=MetricsSettings.TEXTFILE_INTERVAL, help="指标写入间隔（秒）")
+    subparsers = parser.add_subparsers(dest="mode")
+
+    agent_parser = subparsers.add_parser("agent", help="以探测代理模式运行")
+    agent_parser.add_argument("--host", default=AgentSettings.DEFAULT_HOST, help="监听地址")
+    agent_parser.add_argument("--port", type=int, default=AgentSettings.DEFAULT_PORT,
+                              help="监听端口")
+    agent_parser.add_argument("--name", help="代理名称")
+    agent_parser.add_argument("--workers", type=int, default=AgentSettings.MAX_WORKERS,
+                              help="并发探测数")
+    agent_parser.add_argument("--token", help=f"共享令牌，监听非本机地址时必需"
+                                              f"（默认读取环境变量 {AgentSettings.TOKEN_ENV}）")
+    agent_parser.set_defaults(func=run_agent)
+
+    coord_parser = subparsers.add_parser("coordinate", help="把任务分发给多个代理")
+    coord_parser.add_argument("--agents", required=True, help="代理列表 host:port,host:port")
+    coord_parser.add_argument("--token", help=f"代理的共享令牌（默认读取环境变量 "
+                                              f"{AgentSettings.TOKEN_ENV}）")
+    coord_parser.add_argument("--type", choices=("ping", "dns", "scan"), default="scan",
+                              help="任务类型")
+    coord_parser.add_argument("--targets", required=True,
+                              help="目标列表，支持CIDR和地址范围")
+    coord_parser.add_argument("--ports", help="端口列表，如 22,80,8000-8010")
+    coord_parser.add_argument("--protocol", choices=("TCP", "UDP"), default="TCP")
+    coord_parser.add_argument("--ptr", action="store_true",
+                              help="对有结果的主机并发做反向解析，名字到达后追加输出")
+    coord_parser.add_argument("--annotate", action="store_true",
+                              help="为结果标注目标地址的 ASN/国家/组织")
+    coord_parser.add_argument("--broadcast", action="store_true",
+                              help="每个代理都执行全部目标")
+    coord_parser.set_defaults(func=run_coordinator)
+
+    serve_parser = subparsers.add_parser("serve", help="以HTTP/JSON接口服务模式运行")
+    serve_parser.add_argument("--host", default=ApiSettings.DEFAULT_HOST, help="监听地址")
+    serve_parser.add_argument("--port", type=int, default=ApiSettings.DEFAULT_PORT,
+                              help="监听端口")
+    serve_parser.add_argument("--workers", type=int, default=ApiSettings.MAX_WORKERS,
+                              help="工作线程数")
+    serve_parser.add_argument("--token", help=f"访问令牌，监听非本机地址时必需"
+                                              f"（默认读取环境变量 {ApiSettings.TOKEN_ENV}）")
+    serve_parser.set_defaults(func=run_api_server)
+
+    report_parser = subparsers.add_parser("report", help="输出探测历史的延迟分析报表")
+    report_parser.add_argument("--data-dir", help="时序数据目录")
+    report_parser.add_argument("--hosts", help="主机列表（默认全部）")
+    report_parser.add_argument("--days", type=float, default=1, help="统计最近多少天")
+    report_parser.add_argument("--json", action="store_true", help="以JSON格式输出完整报表")
+    report_parser.set_defaults(func=run_report)
+
+    monitor_parser = subparsers.add_parser("monitor", help="保持TCP长连接并实时报告断开与重连")
+    monitor_parser.add_argument("--targets", required=True, help="目标列表 host:port,host:port")
+    monitor_parser.add_argument("--heartbeat", help="应用层心跳内容，支持转义，如 'PING\\r\\n'")
+    monitor_parser.add_argument("--interval", type=float,
+                                default=MonitorSettings.HEARTBEAT_INTERVAL, help="心跳间隔（秒）")
+    monitor_parser.set_defaults(func=run_monitor)
+
+    listen_parser = subparsers.add_parser("listen", help="在端口范围上监听并应答，用于验证防火墙通路")
+    listen_parser.add_argument("--ports", required=True, help="端口列表，如 10000-12000")
+    listen_parser.add_argument("--protocols", default="TCP,UDP", help="协议列表")
+    listen_parser.add_argument("--host", default=ListenerSettings.DEFAULT_HOST, help="监听地址")
+    listen_parser.add_argument("--mode", choices=("echo", "ack"), default=ListenerSettings.MODE,
+                               help="应答方式")
+    listen_parser.set_defaults(func=run_listener)
+
+    load_parser = subparsers.add_parser("loadgen", help="对目标反复建立/关闭TCP连接进行压测")
+    load_parser.add_argument("--target", required=True, help="目标 host:port")
+    load_parser.add_argument("-c", "--concurrency", type=int, default=LoadSettings.CONCURRENCY,
+                             help="同时进行中的连接上限")
+    load_parser.add_argument("--rate", type=float, default=0,
+                             help="每秒发起的连接数（默认不限速）")
+    load_parser.add_argument("-d", "--duration", type=float, default=LoadSettings.DURATION,
+                             help="持续时间（秒）")
+    load_parser.add_argument("--workers", type=int, default=LoadSettings.WORKERS,
+                             help="事件循环线程数")
+    load_parser.add_argument("--request", help="建连后发送的请求内容，支持转义")
+    load_parser.add_argument("--read", action="store_true", help="发送请求后等待应答")
+    load_parser.add_argument("--graceful-close", action="store_true",
+                             help="正常四次挥手关闭（默认发送RST以避免TIME_WAIT）")
+    load_parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    load_parser.set_defaults(func=run_loadgen)
+
+    asn_parser = subparsers.add_parser("asn", help="离线查询IP地址的 ASN/国家/组织")
+    asn_parser.add_argument("addresses", nargs="*", help="要查询的地址（默认从标准输入读取）")
+    asn_parser.add_argument("--compile", metavar="FILE",
+                            help="导入 ip2asn 格式的 CSV/TSV 数据库")
+    asn_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    asn_parser.set_defaults(func=run_asn)
+
+    sub_parser = subparsers.add_parser("subdomains",
+                                       help="基于字典枚举子域名（仅用于授权的资产审计）")
+    sub_parser.add_argument("--domain", required=True, help="基础域名")
+    sub_parser.add_argument("--wordlist", required=True, help="字典文件，每行一个词")
+    sub_parser.add_argument("--rate", type=float, default=SubdomainSettings.RATE_LIMIT,
+                            help="每秒查询数上限（0 表示不限）")
+    sub_parser.add_argument("--workers", type=int, default=ResolverSettings.MAX_WORKERS,
+                            help="并发解析数")
+    sub_parser.add_argument("--zone", help="使用本地区域数据文件代替真实DNS（验证用）")
+    sub_parser.add_argument("--no-wildcard-check", action="store_true", help="跳过泛解析检测")
+    sub_parser.add_argument("--groups", action="store_true",
+                            help="汇总中列出按应答地址分组的全部名字")
+    sub_parser.set_defaults(func=run_subdomains)
+
+    schedule_parser = subparsers.add_parser("schedule", help="按计划周期性执行探测任务")
+    schedule_parser.add_argument("--job", action="append",
+                                 help="任务，格式 类型:目标:间隔秒，如 ping:8.8.8.8:5、"
+                                      "scan:10.0.0.1:443:60、dns:example.com:600（可重复）")
+    schedule_parser.add_argument("--jobs-file",
+                                 help='任务列表JSON文件 [{"type", "target", "interval"}]')
+    schedule_parser.add_argument("--workers", type=int, default=SchedulerSettings.MAX_WORKERS,
+                                 help="执行探测的线程数")
+    schedule_parser.add_argument("--data-dir", help="时序数据目录")
+    schedule_parser.add_argument("--no-store", action="store_true", help="不写入时序存储")
+    schedule_parser.add_argument("--quiet", action="store_true", help="不逐条输出执行结果")
+    schedule_parser.set_defaults(func=run_scheduler)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv if argv is not None else sys.argv[1:])
+
+    writer = None
+    if args.metrics_textfile:
+        from src.core.metrics import TextfileWriter
+
+        writer = TextfileWriter(args.metrics_textfile, args.metrics_interval)
+        writer.start()
+
+    try:
+        if not args.mode:
+            run_gui()
+        else:
+            args.func(args)
+    finally:
+        if writer:
+            writer.stop()
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,76 @@
+"""探测代理与协调器：本机多代理往返、令牌校验与无效消息"""
+import socket
+
+import pytest
+
+from src.core.agent import AgentCoordinator, ProbeAgent, recv_message, send_message
+
+
+@pytest.fixture
+def open_port():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+        yield server.getsockname()[1]
+
+
+@pytest.fixture
+def agents():
+    started = []
+
+    def start(count, token=None):
+        for _ in range(count):
+            started.append(ProbeAgent("127.0.0.1", 0, token=token, max_workers=4).start())
+        return [agent.address for agent in started]
+
+    yield start
+    for agent in started:
+        agent.stop()
+
+
+def test_round_trip_across_agents(agents, open_port, free_port):
+    addresses = agents(2)
+    targets = [["127.0.0.1", open_port], ["127.0.0.1", free_port]] * 2
+    messages = AgentCoordinator(addresses).run("scan", targets)
+
+    done = [m for m in messages if m.get('done')]
+    results = [m for m in messages if 'target' in m]
+    assert len(done) == 2 and sum(m['count'] for m in done) == 4
+    assert not [m for m in messages if 'error' in m]
+    assert len({m['agent'] for m in results}) == 2
+    assert sorted((m['target'][1], m['success']) for m in results) == sorted(
+        [(open_port, True), (open_port, True), (free_port, False), (free_port, False)])
+
+
+def test_broadcast_runs_every_target_on_every_agent(agents, open_port):
+    addresses = agents(2)
+    messages = AgentCoordinator(addresses).run("scan", [["127.0.0.1", open_port]], broadcast=True)
+    assert len([m for m in messages if m.get('success')]) == 2
+
+
+def test_token_is_checked(agents, open_port):
+    addresses = agents(1, token="s3cret")
+    ok = AgentCoordinator(addresses, token="s3cret").run("scan", [["127.0.0.1", open_port]])
+    assert [m['success'] for m in ok if 'target' in m] == [True]
+
+    denied = AgentCoordinator(addresses, token="wrong").run("scan", [["127.0.0.1", open_port]])
+    assert len(denied) == 1 and denied[0]['error'] == "令牌无效"
+    missing = AgentCoordinator(addresses).run("scan", [["127.0.0.1", open_port]])
+    assert 'error' in missing[0]
+
+
+def test_public_bind_requires_token():
+    with pytest.raises(ValueError):
+        ProbeAgent("0.0.0.0", 0)
+    ProbeAgent("0.0.0.0", 0, token="s3cret").server_close()
+
+
+def test_non_object_message_gets_error_reply(agents):
+    address = agents(1)[0]
+    with socket.create_connection(address, timeout=5) as sock:
+        send_message(sock, ["not", "a", "job"])
+        reply = recv_message(sock)
+        assert reply['error'] and reply['job'] is None
+        # 连接仍可继续使用
+        send_message(sock, {'id': 'j1', 'type': 'scan', 'targets': 5})
+        assert recv_message(sock)['error'] == "targets 必须是列表"
@@ -0,0 +1,68 @@
+"""延迟分析报表：稳健Z分数与超出原始样本保留期时的分钟汇总回退"""
+import time
+
+import numpy as np
+import pytest
+
+from src.core.analytics import (LatencyReporter, RAW_DTYPE, analyze_samples,
+                                report_resolution, robust_zscores)
+from src.core.timeseries import TimeSeriesStore, RAW, MINUTE
+from src.config.settings import TimeSeriesSettings
+
+
+def test_zscores_flag_spike_when_mad_is_zero():
+    values = np.full(5000, 10.0)
+    values[1234] = 510.0
+    scores = robust_zscores(values)
+    assert np.flatnonzero(scores > 3.5).tolist() == [1234]
+
+
+def test_zscores_constant_series():
+    assert not robust_zscores(np.full(100, 7.0)).any()
+
+
+def test_analyze_samples_reports_spike():
+    now_ms = int(time.time() * 1000)
+    samples = np.empty(5000, dtype=RAW_DTYPE)
+    samples['ts'] = now_ms + np.arange(5000) * 1000
+    samples['rtt'] = 10.0
+    samples['rtt'][100] = 510.0
+    samples['rtt'][200] = np.nan
+    report = analyze_samples(samples)
+    assert report['resolution'] == RAW
+    assert report['outliers']['count'] == 1
+    assert report['outliers']['samples'][0]['rtt'] == 510.0
+    assert report['lost'] == 1
+
+
+def test_report_resolution():
+    now = time.time()
+    assert report_resolution(now - 3600, now) == RAW
+    assert report_resolution(now - TimeSeriesSettings.RAW_RETENTION - 60, now) == MINUTE
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def test_old_range_uses_minute_rollups(store):
+    now = time.time()
+    start = now - 10 * 86400
+    # 每 10 秒一个样本，持续 3 小时；其中一分钟全部丢失
+    begin = int(start // 60 * 60) + 3600
+    for offset in range(0, 3 * 3600, 10):
+        lost = 1800 <= offset < 1860
+        store.record("host", None if lost else 20.0, begin + offset)
+    store.flush(now)
+
+    report = LatencyReporter(store).host_report("host", start, now)
+    assert report['resolution'] == MINUTE
+    assert report['samples'] == 3 * 360
+    assert report['lost'] == 6
+    assert report['loss_streaks'] == {'count': 1, 'longest': 6}
+    assert report['percentiles']['p50'] == pytest.approx(20.0)
+    assert report['avg'] == pytest.approx(20.0)
+    assert LatencyReporter.format_table([report]).splitlines()[1].endswith(MINUTE)
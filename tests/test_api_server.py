@@ -0,0 +1,130 @@
+"""HTTP/JSON 接口服务：参数校验、长任务与单次调用的线程隔离"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from src.core.api_server import ApiServer
+
+
+async def request(port, raw: bytes):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body) if body else None
+
+
+def get(port, path):
+    return request(port, f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+
+
+def post(port, path, payload):
+    body = json.dumps(payload).encode()
+    return request(port, f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                   + body)
+
+
+@pytest.fixture
+def run():
+    """在新事件循环中启动服务并执行测试协程"""
+    def runner(test, **kwargs):
+        async def main():
+            server = await ApiServer("127.0.0.1", 0, **kwargs).start()
+            try:
+                await test(server)
+            finally:
+                await server.stop()
+        asyncio.run(main())
+    return runner
+
+
+def test_bad_content_length_and_offset_are_400(run):
+    async def test(server):
+        status, body = await request(server.port,
+                                     b"POST /api/jobs HTTP/1.1\r\nContent-Length: abc\r\n\r\n")
+        assert status == 400
+        status, job = await post(server.port, "/api/jobs",
+                                 {'type': 'dirsize', 'targets': ["/nonexistent"]})
+        assert status == 202
+        assert (await get(server.port, f"/api/jobs/{job['id']}?offset=x"))[0] == 400
+        assert (await get(server.port, f"/api/jobs/{job['id']}?offset=-1"))[0] == 400
+        assert (await get(server.port, f"/api/jobs/{job['id']}?offset=0"))[0] == 200
+
+    run(test)
+
+
+def test_job_runs_all_targets_with_bounded_workers(run):
+    async def test(server):
+        status, job = await post(server.port, "/api/jobs",
+                                 {'type': 'dirsize', 'targets': [f"/nonexistent/{i}"
+                                                                 for i in range(500)]})
+        assert status == 202
+        task = server.jobs[job['id']].task
+        await asyncio.sleep(0)
+        # 只创建了 JOB_CONCURRENCY 个工作协程，而不是每个目标一个
+        assert len(asyncio.all_tasks()) < 50
+        await task
+        status, result = await get(server.port, f"/api/jobs/{job['id']}")
+        assert result['status'] == 'done'
+        assert len(result['results']) == 500
+
+    run(test)
+
+
+def test_interactive_calls_do_not_wait_for_jobs(run, monkeypatch):
+    release = threading.Event()
+
+    def slow_dir_size(path):
+        if path.startswith("/job/"):
+            release.wait(5)
+        return True, {'path': path}
+
+    monkeypatch.setattr(ApiServer, "_dir_size", staticmethod(slow_dir_size))
+
+    async def test(server):
+        status, job = await post(server.port, "/api/jobs",
+                                 {'type': 'dirsize', 'targets': [f"/job/{i}" for i in range(40)]})
+        assert status == 202
+        await asyncio.sleep(0.1)
+        try:
+            # 长任务占满了任务线程池，单次调用仍在保留的线程中立即完成
+            status, body = await asyncio.wait_for(get(server.port, "/api/dirsize?path=/x"), 2)
+            assert status == 200 and body['success']
+        finally:
+            release.set()
+
+    run(test, max_workers=4)
+
+
+def test_oversized_scan_is_rejected_before_expansion(run):
+    async def test(server):
+        status, body = await post(server.port, "/api/jobs",
+                                  {'type': 'scan', 'targets': "10.0.0.0/16", 'ports': "1-65535"})
+        assert status == 400
+        assert not server.jobs
+        status, _ = await post(server.port, "/api/jobs",
+                               {'type': 'ping', 'targets': "10.0.0.0/8"})
+        assert status == 400
+
+    run(test)
+
+
+def test_token_is_required_on_every_request(run):
+    async def test(server):
+        assert (await get(server.port, "/metrics"))[0] == 401
+        wrong = b"GET /api/jobs HTTP/1.1\r\nAuthorization: Bearer nope\r\n\r\n"
+        assert (await request(server.port, wrong))[0] == 401
+        right = b"GET /api/jobs HTTP/1.1\r\nAuthorization: Bearer s3cret\r\n\r\n"
+        assert (await request(server.port, right))[0] == 200
+
+    run(test, token="s3cret")
+
+
+def test_refuses_public_host_without_token():
+    with pytest.raises(ValueError):
+        ApiServer("0.0.0.0", 0)
+    ApiServer("0.0.0.0", 0, token="s3cret")
@@ -0,0 +1,80 @@
+"""长连接监控：多个候选地址时竞速建连"""
+import queue
+import socket
+import threading
+
+import pytest
+
+from src.core.connection_monitor import ConnectionMonitor
+from src.core.network import NetworkOperations
+
+
+@pytest.fixture
+def server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(16)
+        yield sock
+
+
+def test_dual_candidates_race_to_the_reachable_address(server, free_port, monkeypatch):
+    open_port = server.getsockname()[1]
+    # 第一个候选地址拒绝连接，第二个可用
+    monkeypatch.setattr(NetworkOperations, "resolve_addresses", staticmethod(
+        lambda host, port, socktype=socket.SOCK_STREAM: [
+            (socket.AF_INET, ("127.0.0.1", free_port)),
+            (socket.AF_INET, ("127.0.0.1", open_port))]))
+    events = queue.Queue()
+    monitor = ConnectionMonitor(callback=events.put, keepalive=False).start()
+    try:
+        monitor.add("dual.example", open_port)
+        event = events.get(timeout=5)
+        assert event['event'] == 'up'
+        assert monitor.snapshot()[0]['state'] == 'up'
+
+        # 对端关闭后重新竞速建连
+        peer, _ = server.accept()
+        peer.close()
+        assert events.get(timeout=5)['event'] == 'down'
+        assert events.get(timeout=5)['event'] == 'up'
+    finally:
+        monitor.stop()
+
+
+def test_unreachable_candidates_report_connect_failed(free_port, monkeypatch):
+    monkeypatch.setattr(NetworkOperations, "resolve_addresses", staticmethod(
+        lambda host, port, socktype=socket.SOCK_STREAM: [
+            (socket.AF_INET, ("127.0.0.1", free_port))] * 2))
+    events = queue.Queue()
+    monitor = ConnectionMonitor(callback=events.put).start()
+    try:
+        monitor.add("dual.example", free_port)
+        event = events.get(timeout=5)
+        assert event['event'] == 'connect_failed'
+        assert event['reason'] == 'ECONNREFUSED'
+    finally:
+        monitor.stop()
+
+
+def test_later_candidates_wait_for_the_attempt_delay(server, monkeypatch):
+    """首个地址很快连上时不会再对后面的地址发起连接，也不使用辅助线程"""
+    with socket.socket() as second:
+        second.bind(("127.0.0.1", 0))
+        second.listen(16)
+        second.settimeout(0.5)
+        monkeypatch.setattr("src.core.connection_monitor.CONNECTION_ATTEMPT_DELAY", 2)
+        monkeypatch.setattr(NetworkOperations, "resolve_addresses", staticmethod(
+            lambda host, port, socktype=socket.SOCK_STREAM: [
+                (socket.AF_INET, server.getsockname()),
+                (socket.AF_INET, second.getsockname())]))
+        threads = threading.active_count()
+        events = queue.Queue()
+        monitor = ConnectionMonitor(callback=events.put, keepalive=False).start()
+        try:
+            monitor.add("dual.example", server.getsockname()[1])
+            assert events.get(timeout=5)['event'] == 'up'
+            assert threading.active_count() == threads + 1
+            with pytest.raises(socket.timeout):
+                second.accept()
+        finally:
+            monitor.stop()
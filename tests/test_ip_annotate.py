@@ -0,0 +1,70 @@
+"""IP 归属标注：区间表编译、IPv4/IPv6 查询与重新导入后的重新加载"""
+import pytest
+
+from src.core import ip_annotate
+from src.core.ip_annotate import AsnInfo, IpAnnotator
+
+DATABASE = """range_start\trange_end\tAS_number\tcountry_code\tAS_description
+1.0.0.0\t1.0.0.255\t13335\tUS\tCLOUDFLARENET
+8.8.8.0\t8.8.8.255\t15169\tUS\tGOOGLE
+10.0.0.0\t10.255.255.255\t0\tNone\tNot routed
+2001:4860::\t2001:4860:ffff:ffff:ffff:ffff:ffff:ffff\t15169\tUS\tGOOGLE
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    source = tmp_path / "ip2asn.tsv"
+    source.write_text(DATABASE, encoding="utf-8")
+    return str(source)
+
+
+@pytest.fixture
+def annotator(database, tmp_path):
+    target = str(tmp_path / "ip2asn.idx")
+    assert IpAnnotator.compile(database, target) == 4
+    annotator = IpAnnotator(target)
+    yield annotator
+    annotator.close()
+
+
+def test_ipv4_lookup(annotator):
+    assert annotator.lookup("8.8.8.8") == AsnInfo(15169, "US", "GOOGLE")
+    assert annotator.lookup("1.0.0.0") == AsnInfo(13335, "US", "CLOUDFLARENET")
+    assert annotator.lookup("1.0.0.255").asn == 13335
+    # 占位国家代码被丢弃
+    assert annotator.lookup("10.1.2.3") == AsnInfo(0, "", "Not routed")
+
+
+def test_ipv6_and_bracketed_lookup(annotator):
+    assert annotator.lookup("2001:4860:4860::8888") == AsnInfo(15169, "US", "GOOGLE")
+    assert annotator.lookup("[2001:4860:4860::8844]") == AsnInfo(15169, "US", "GOOGLE")
+
+
+def test_miss_and_invalid_address(annotator):
+    assert annotator.lookup("1.0.1.0") is None
+    assert annotator.lookup("0.0.0.1") is None
+    assert annotator.lookup("2001:db8::1") is None
+    assert annotator.annotate(["not-an-ip", "300.1.1.1", "::zz", "8.8.8.8"]) == [
+        None, None, None, AsnInfo(15169, "US", "GOOGLE")]
+
+
+def test_install_database_reloads_shared_annotator(database, tmp_path, monkeypatch):
+    index = str(tmp_path / "shared.idx")
+    monkeypatch.setattr(ip_annotate, "default_index_path", lambda: index)
+    monkeypatch.setattr(ip_annotate, "_annotator", None)
+    assert ip_annotate.get_annotator() is None
+
+    assert ip_annotate.install_database(database) == 4
+    first = ip_annotate.get_annotator()
+    assert first.lookup("8.8.8.8").asn == 15169
+    assert ip_annotate.get_annotator() is first
+
+    updated = tmp_path / "updated.tsv"
+    updated.write_text("8.8.8.0\t8.8.8.255\t64500\tDE\tEXAMPLE\n", encoding="utf-8")
+    assert ip_annotate.install_database(str(updated)) == 1
+    second = ip_annotate.get_annotator()
+    assert second is not first
+    assert second.lookup("8.8.8.8") == AsnInfo(64500, "DE", "EXAMPLE")
+    assert second.lookup("1.0.0.1") is None
+    second.close()
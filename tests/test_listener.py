@@ -0,0 +1,73 @@
+"""多端口监听测试端（回环地址）"""
+import socket
+
+import pytest
+
+from src.core.listener import PortListener
+from src.core.network import NetworkOperations
+
+
+@pytest.fixture
+def listener(free_port):
+    listener = PortListener([free_port], host="127.0.0.1").start_in_thread()
+    yield listener
+    listener.stop()
+
+
+def test_tcp_echo(listener):
+    port = listener.ports[0]
+    with socket.create_connection(("127.0.0.1", port), timeout=2) as sock:
+        sock.sendall(b"hello")
+        assert sock.recv(16) == b"hello"
+    assert port in listener.hits["TCP"]
+
+
+def test_udp_echo(listener):
+    port = listener.ports[0]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(2)
+        sock.sendto(b"x", ("127.0.0.1", port))
+        assert sock.recvfrom(16)[0] == b"x"
+
+
+def test_udp_empty_probe_is_acked(listener):
+    port = listener.ports[0]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(2)
+        sock.sendto(b"", ("127.0.0.1", port))
+        assert sock.recvfrom(16)[0] == f"ACK {port}\n".encode()
+
+
+def test_scanner_sees_listener_ports(listener):
+    port = listener.ports[0]
+    tcp_open, _ = NetworkOperations.scan_port("127.0.0.1", port, "TCP")
+    udp_open, message = NetworkOperations.scan_port("127.0.0.1", port, "UDP")
+    assert tcp_open
+    assert udp_open, message
+    assert port in listener.hits["UDP"]
+
+
+def test_ack_mode_and_peer_reporting(free_port):
+    hits = []
+    listener = PortListener([free_port], protocols=("TCP",), host="127.0.0.1",
+                            mode="ack", callback=hits.append).start_in_thread()
+    try:
+        for _ in range(3):
+            with socket.create_connection(("127.0.0.1", free_port), timeout=2) as sock:
+                assert sock.recv(16) == f"ACK {free_port}\n".encode()
+    finally:
+        listener.stop()
+    # 同一对端只上报一次
+    assert len(hits) == 1 and hits[0]['first_on_port']
+    assert listener.report()['tcp'] == [{'port': free_port, 'first_peer': '127.0.0.1'}]
+
+
+def test_start_failure_is_raised_instead_of_hanging(free_port, monkeypatch):
+    async def broken_start(self):
+        raise RuntimeError("启动失败")
+
+    monkeypatch.setattr(PortListener, "start", broken_start)
+    listener = PortListener([free_port], host="127.0.0.1")
+    with pytest.raises(RuntimeError, match="启动失败"):
+        listener.start_in_thread()
+    assert listener._thread is None
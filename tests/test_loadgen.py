@@ -0,0 +1,87 @@
+"""TCP 建连压测：统计口径、按错误码分类的失败与速率限制"""
+import socket
+import threading
+
+import pytest
+
+from src.core.loadgen import CONNECT_LATENCY, CONNECTIONS, LoadGenerator
+from src.core.metrics import REGISTRY
+
+
+@pytest.fixture
+def server():
+    """接受连接、回显一次请求后关闭的本机服务端"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(512)
+    sock.settimeout(0.1)
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            with conn:
+                conn.settimeout(0.5)
+                try:
+                    data = conn.recv(1024)
+                    if data:
+                        conn.sendall(data)
+                except OSError:
+                    pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield sock.getsockname()[1]
+    stop.set()
+    thread.join()
+    sock.close()
+
+
+def test_counts_are_consistent(server):
+    before = CONNECT_LATENCY.count
+    result = LoadGenerator("127.0.0.1", server, concurrency=4, duration=0.5, workers=2).run()
+    assert result['connected'] > 0
+    assert result['failed'] == 0 and result['errors'] == {}
+    assert result['completed'] == result['connected']
+    assert sum(bucket['count'] for bucket in result['histogram']) == result['connected']
+    latency = result['latency_ms']
+    assert 0 < latency['p50'] <= latency['p99'] <= latency['max']
+    # 各线程的直方图在结束时一次性并入全局指标
+    assert CONNECT_LATENCY.count - before == result['connected']
+    assert "建连延迟(ms)" in LoadGenerator.format_report(result)
+
+
+def test_request_and_response(server):
+    result = LoadGenerator("127.0.0.1", server, concurrency=2, duration=0.5, workers=1,
+                           request=b"ping\n", read_response=True, reset=False).run()
+    assert result['completed'] > 0
+    assert result['failed'] == 0
+
+
+def test_refused_connections_are_classified(free_port):
+    refused = CONNECTIONS.labels("ECONNREFUSED").value
+    result = LoadGenerator("127.0.0.1", free_port, concurrency=2, rate=50,
+                           duration=0.3, workers=1).run()
+    assert result['connected'] == 0
+    assert result['failed'] == result['attempts'] > 0
+    assert list(result['errors']) == ["ECONNREFUSED"]
+    assert result['latency_ms']['p50'] is None
+    assert CONNECTIONS.labels("ECONNREFUSED").value - refused == result['failed']
+
+
+def test_rate_limits_attempts(server):
+    result = LoadGenerator("127.0.0.1", server, concurrency=8, rate=40, duration=0.5,
+                           workers=2).run()
+    # 0.5 秒内按 40 次/秒发起，首轮允许各线程立即发起一次
+    assert 10 <= result['attempts'] <= 24
+
+
+def test_histogram_merge_requires_same_buckets():
+    other = REGISTRY.histogram("test_loadgen_other_buckets", "测试", buckets=(1, 2))
+    with pytest.raises(ValueError):
+        CONNECT_LATENCY.merge(other.local())
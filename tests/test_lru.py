@@ -0,0 +1,48 @@
+"""有界 LRU 缓存：按条目数与字节数淘汰最久未使用的条目"""
+from src.core.lru import LruCache
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = LruCache("test_lru_count", max_entries=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") == "A"  # a 变为最近使用
+    cache.put("d", "D")
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    stats = cache.stats()
+    assert stats['entries'] == 3
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 4 and stats['misses'] == 1
+
+
+def test_evicts_by_estimated_bytes():
+    cache = LruCache("test_lru_bytes", max_bytes=250, sizeof=lambda key, value: len(value))
+    cache.put("a", "x" * 100)
+    cache.put("b", "x" * 100)
+    cache.put("c", "x" * 100)
+    assert cache.get("a") is None
+    assert cache.bytes == 200
+    # 替换条目时按新值重新计算字节数
+    cache.put("b", "x" * 10)
+    assert cache.bytes == 110
+    cache.put("d", "x" * 140)
+    assert [cache.get(key) is not None for key in "bcd"] == [True, True, True]
+    assert cache.bytes == 250
+
+
+def test_single_oversized_entry_is_kept():
+    cache = LruCache("test_lru_oversized", max_bytes=10, sizeof=lambda key, value: len(value))
+    cache.put("big", "x" * 100)
+    assert cache.get("big") == "x" * 100
+
+
+def test_pop_and_clear():
+    cache = LruCache("test_lru_pop", sizeof=lambda key, value: 5)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "missing") == "missing"
+    assert len(cache) == 1 and cache.bytes == 5
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0
@@ -0,0 +1,54 @@
+"""Ping 指标：每次调用都记录耗时和结果标签"""
+import subprocess
+
+import pytest
+
+from src.core.network import NetworkOperations, PROBE_DURATION, PROBE_RESULTS
+
+
+class FakePopen:
+    """返回固定输出的 ping 进程"""
+    output = b""
+    error = b""
+    returncode = 0
+
+    def __init__(self, command, stdout=None, stderr=None):
+        pass
+
+    def communicate(self):
+        return self.output, self.error
+
+
+def counts():
+    return (PROBE_DURATION.labels("ping").count,
+            {result: PROBE_RESULTS.labels("ping", result).value
+             for result in ("ok", "lost", "error")})
+
+
+@pytest.mark.parametrize("output, returncode, result", [
+    (b"64 bytes from 192.0.2.1: icmp_seq=1 ttl=64 time=1.23 ms\n"
+     b"4 packets transmitted, 4 received, 0% packet loss\n", 0, "ok"),
+    (b"4 packets transmitted, 0 received, 100% packet loss\n", 1, "lost"),
+    # 统计行无法识别时按应答时延或退出码判断
+    (b"Antwort von 192.0.2.1: Bytes=32 Zeit=3ms TTL=64\n", 0, "ok"),
+    (b"Zeitueberschreitung der Anforderung.\n", 1, "lost"),
+])
+def test_every_ping_records_duration_and_result(monkeypatch, output, returncode, result):
+    monkeypatch.setattr(subprocess, "Popen", type("Popen", (FakePopen,), {
+        'output': output, 'returncode': returncode}))
+    duration, before = counts()
+    assert NetworkOperations.ping("192.0.2.1")[0]
+    after_duration, after = counts()
+    assert after_duration == duration + 1
+    assert {k: after[k] - before[k] for k in after} == {
+        k: (1 if k == result else 0) for k in after}
+
+
+def test_failed_ping_records_error(monkeypatch):
+    monkeypatch.setattr(subprocess, "Popen", type("Popen", (FakePopen,), {
+        'error': b"ping: unknown host"}))
+    duration, before = counts()
+    assert not NetworkOperations.ping("nonexistent.invalid")[0]
+    after_duration, after = counts()
+    assert after_duration == duration + 1
+    assert after['error'] == before['error'] + 1
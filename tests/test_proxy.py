@@ -0,0 +1,91 @@
+"""经 SOCKS5 / HTTP CONNECT 代理探测（本地代理）"""
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from src.core.network import NetworkOperations
+from src.core.proxy import LocalProxy, ProxyClient, ProxyError, ProxyTargetError
+
+
+class _BannerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.request.sendall(b"HELLO\r\n")
+
+
+@pytest.fixture
+def target():
+    """发送 banner 的本地目标服务"""
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _BannerHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def proxy():
+    proxy = LocalProxy().start()
+    yield proxy
+    proxy.stop()
+
+
+@pytest.mark.parametrize("scheme", ["socks5", "socks5h", "http"])
+def test_open_port_via_proxy(proxy, target, scheme):
+    success, message = NetworkOperations.scan_port("127.0.0.1", target, "TCP", proxy.url(scheme))
+    assert success, message
+    assert "开放" in message
+
+
+@pytest.mark.parametrize("scheme", ["socks5", "http"])
+def test_closed_port_via_proxy(proxy, free_port, scheme):
+    success, message = NetworkOperations.scan_port("127.0.0.1", free_port, "TCP",
+                                                   proxy.url(scheme))
+    assert not success
+    assert "关闭" in message
+
+
+def test_banner_via_proxy_reports_hop_and_target(proxy, target):
+    success, result = NetworkOperations.grab_banner("127.0.0.1", target, proxy.url())
+    assert success, result
+    assert result['banner'] == "HELLO\r\n"
+    assert result['hop_ms'] >= 0 and result['target_ms'] >= 0
+
+
+def test_socks5_auth():
+    proxy = LocalProxy(credentials=("user", "secret")).start()
+    try:
+        host, port = proxy.address
+        good = ProxyClient(f"socks5://user:secret@{host}:{port}")
+        with good.open("127.0.0.1", port) as (sock, timings):
+            assert timings['proxy'].endswith(f":{port}")
+
+        bad = ProxyClient(f"socks5://user:wrong@{host}:{port}")
+        with pytest.raises(ProxyError) as info:
+            with bad.open("127.0.0.1", port):
+                pass
+        assert not isinstance(info.value, ProxyTargetError)
+    finally:
+        proxy.stop()
+
+
+def test_proxy_failure_is_not_reported_as_closed(target):
+    proxy = LocalProxy(credentials=("user", "secret")).start()
+    try:
+        host, port = proxy.address
+        success, message = NetworkOperations.scan_port(
+            "127.0.0.1", target, "TCP", f"socks5://user:wrong@{host}:{port}")
+    finally:
+        proxy.stop()
+    assert not success
+    assert "关闭" not in message and "未知" in message
+
+
+def test_target_refused_raises_target_error(proxy, free_port):
+    client = ProxyClient(proxy.url("http"))
+    with pytest.raises(ProxyTargetError):
+        with client.open("127.0.0.1", free_port):
+            pass
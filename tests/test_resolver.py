@@ -0,0 +1,37 @@
+"""BulkResolver：解析函数的任何异常都不能让调用方等不到结果"""
+from src.core.resolver import BulkResolver
+
+
+def broken(name):
+    raise RuntimeError("boom")
+
+
+def test_unexpected_error_resolves_empty_and_clears_inflight():
+    resolver = BulkResolver(rate=0, resolve_fn=broken, reverse_fn=broken)
+    seen = []
+    try:
+        futures = resolver.resolve_many(["a.example", "b.example"],
+                                        lambda name, value: seen.append((name, value)))
+        assert [f.result(5) for f in futures.values()] == [[], []]
+        assert resolver.reverse("192.0.2.1", timeout=5) is None
+        assert resolver.stats()['inflight'] == 0
+    finally:
+        resolver.shutdown()
+    # 回调在工作线程中于结果设置之后执行，线程池停止后才能确定都已调用
+    assert sorted(seen) == [("a.example", []), ("b.example", [])]
+
+
+def test_failures_are_cached():
+    calls = []
+
+    def resolve(name):
+        calls.append(name)
+        raise RuntimeError("boom")
+
+    resolver = BulkResolver(rate=0, resolve_fn=resolve)
+    try:
+        assert resolver.resolve("a.example", timeout=5) == []
+        assert resolver.resolve("a.example", timeout=5) == []
+        assert calls == ["a.example"]
+    finally:
+        resolver.shutdown()
@@ -0,0 +1,121 @@
+"""定时探测调度：按到期时间执行、慢探测后不补跑也不漂移、停止与移除"""
+import queue
+import threading
+import time
+
+import pytest
+
+from src.core.scheduler import ProbeScheduler
+
+
+@pytest.fixture(autouse=True)
+def fast_schedule(monkeypatch):
+    """允许很短的间隔，首次执行固定在一个间隔之后"""
+    monkeypatch.setattr("src.config.settings.SchedulerSettings.MIN_INTERVAL", 0.01)
+    monkeypatch.setattr("src.core.scheduler.random.uniform", lambda low, high: high)
+
+
+def recording_check(calls, delay=0.0):
+    def check(job_type, target):
+        calls.put((target, time.monotonic()))
+        if callable(delay):
+            time.sleep(delay(target))
+        elif delay:
+            time.sleep(delay)
+        return True, [1.0], "ok"
+    return check
+
+
+def drain(calls):
+    items = []
+    while not calls.empty():
+        items.append(calls.get())
+    return items
+
+
+def test_jobs_run_in_due_time_order():
+    calls = queue.Queue()
+    scheduler = ProbeScheduler(max_workers=1, check=recording_check(calls))
+    scheduler.add('dns', "slow", 0.15, jitter=0)
+    scheduler.add('dns', "fast", 0.05, jitter=0)
+    scheduler.add('dns', "medium", 0.1, jitter=0)
+    scheduler.start()
+    try:
+        first = [calls.get(timeout=2)[0] for _ in range(4)]
+    finally:
+        scheduler.stop()
+    # fast 在 0.05、0.10 秒到期，medium 在 0.10 秒，slow 在 0.15 秒
+    assert first[0] == "fast"
+    assert sorted(first[1:3]) == ["fast", "medium"]
+    assert first[3] in ("fast", "slow")
+    assert "slow" in first + [target for target, _ in drain(calls)]
+
+
+def test_earlier_job_wakes_the_scheduler():
+    calls = queue.Queue()
+    scheduler = ProbeScheduler(max_workers=1, check=recording_check(calls)).start()
+    try:
+        scheduler.add('dns', "later", 60, jitter=0)
+        time.sleep(0.05)
+        scheduler.add('dns', "soon", 0.05, jitter=0)
+        assert calls.get(timeout=1)[0] == "soon"
+    finally:
+        scheduler.stop()
+
+
+def test_slow_probe_skips_missed_runs_without_drift():
+    calls = queue.Queue()
+    slow_first = iter([0.3])
+    check = recording_check(calls, delay=lambda target: next(slow_first, 0))
+    scheduler = ProbeScheduler(max_workers=2, check=check)
+    job_id = scheduler.add('dns', "target", 0.05, jitter=0)
+    scheduler.start()
+    try:
+        time.sleep(0.7)
+    finally:
+        scheduler.stop()
+    starts = [started for _, started in drain(calls)]
+    job = next(job for job in scheduler.jobs() if job['id'] == job_id)
+    # 慢探测期间到期的执行被跳过，而不是在结束后集中补跑
+    assert job['overlaps'] >= 3
+    assert job['runs'] == len(starts) >= 4
+    gaps = [b - a for a, b in zip(starts[1:], starts[2:])]
+    assert min(gaps) > 0.025
+    # 基准时间按固定频率推进：慢探测后的执行仍落在原来的节拍上
+    phase = [(start - starts[0]) / 0.05 for start in starts[1:]]
+    assert all(abs(p - round(p)) < 0.4 for p in phase)
+
+
+def test_stop_waits_for_running_probe_and_halts():
+    calls = queue.Queue()
+    results = queue.Queue()
+    scheduler = ProbeScheduler(max_workers=1, check=recording_check(calls, delay=0.2),
+                               callback=results.put)
+    scheduler.add('dns', "target", 0.05, jitter=0)
+    scheduler.start()
+    calls.get(timeout=2)
+    scheduler.stop()
+    # 正在执行的探测在 stop 返回前完成并回调
+    assert results.get_nowait()['success']
+    runs = scheduler.jobs()[0]['runs']
+    time.sleep(0.2)
+    assert scheduler.jobs()[0]['runs'] == runs
+    assert calls.empty()
+    assert not any(thread.name == "probe-scheduler" for thread in threading.enumerate())
+
+
+def test_removed_job_does_not_run_again():
+    calls = queue.Queue()
+    scheduler = ProbeScheduler(max_workers=1, check=recording_check(calls))
+    job_id = scheduler.add('dns', "target", 0.05, jitter=0)
+    scheduler.start()
+    try:
+        calls.get(timeout=2)
+        scheduler.remove(job_id)
+        time.sleep(0.1)
+        drain(calls)
+        time.sleep(0.2)
+        assert calls.empty()
+        assert scheduler.jobs() == []
+    finally:
+        scheduler.stop()
@@ -0,0 +1,93 @@
+"""并行目录大小计算引擎：结果与 os.walk 一致，关闭时未处理的任务以不完整结果结束"""
+import os
+import threading
+import time
+
+import pytest
+
+from src.core.size_engine import SizeEngine
+
+
+def walk_size(root):
+    """参照实现：os.walk 累加所有非目录项（含指向目录的符号链接本身）的 lstat 大小"""
+    total = 0
+    for directory, dirs, files in os.walk(root):
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(directory, d))]:
+            total += os.lstat(os.path.join(directory, name)).st_size
+    return total
+
+
+def make_tree(root, width=3, depth=4):
+    """每层 width 个子目录、每个目录若干大小不同的文件"""
+    stack = [(root, 0)]
+    while stack:
+        directory, level = stack.pop()
+        os.makedirs(directory, exist_ok=True)
+        for i in range(level + 2):
+            with open(os.path.join(directory, f"f{i}"), 'wb') as f:
+                f.write(b'x' * (len(directory) * (i + 1)))
+        if level < depth:
+            stack.extend((os.path.join(directory, f"d{i}"), level + 1) for i in range(width))
+
+
+@pytest.fixture
+def engine():
+    engine = SizeEngine(workers=4)
+    yield engine
+    engine.shutdown()
+
+
+def test_matches_os_walk(engine, tmp_path):
+    root = str(tmp_path / "tree")
+    make_tree(root)
+    os.symlink(os.path.join(root, "d0"), os.path.join(root, "link"))
+    subtotals = {}
+    lock = threading.Lock()
+
+    def on_subtotal(path, total):
+        with lock:
+            subtotals[path] = total
+
+    result = engine.measure(root, on_subtotal=on_subtotal, timeout=30)
+    assert result.complete and not result.errors
+    assert result.size == walk_size(root)
+    assert result.dirs == sum(1 for _ in os.walk(root))
+    for path, total in subtotals.items():
+        assert total == walk_size(path), path
+    assert len(subtotals) == result.dirs
+    assert engine.stats()['busy'] == 0
+
+
+def test_concurrent_jobs_share_the_pool(engine, tmp_path):
+    roots = [str(tmp_path / f"tree{i}") for i in range(4)]
+    for root in roots:
+        make_tree(root, width=2, depth=3)
+    jobs = [engine.submit(root) for root in roots]
+    assert [job.result(30).size for job in jobs] == [walk_size(root) for root in roots]
+
+
+def test_shutdown_resolves_unfinished_jobs(tmp_path):
+    root = str(tmp_path / "tree")
+    make_tree(root)
+    engine = SizeEngine(workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def on_directory(path, mtime, own, names):
+        if path == root:
+            started.set()
+            release.wait(5)
+
+    job = engine.submit(root, on_directory=on_directory)
+    assert started.wait(5)
+    stopper = threading.Thread(target=engine.shutdown)
+    stopper.start()
+    while not engine._stopping:
+        time.sleep(0.01)
+    release.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+
+    result = job.result(timeout=5)
+    assert not result.complete
+    assert job.cancelled
+    assert engine.stats() == {'workers': 0, 'busy': 0, 'queued': 0}
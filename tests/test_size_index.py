@@ -0,0 +1,147 @@
+"""目录大小索引：增量校验、失效标记、变化量向祖先累加与 SQLite 持久化"""
+import os
+import shutil
+import threading
+
+import pytest
+
+from src.core.size_engine import SizeEngine
+from src.core.size_index import SizeIndex, SIZE_INDEX_RESCANS
+from src.core.size_store import SizeStore
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
+
+def walk_size(root):
+    """参照实现：os.walk 累加所有非目录项的 lstat 大小"""
+    total = 0
+    for directory, dirs, files in os.walk(root):
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(directory, d))]:
+            total += os.lstat(os.path.join(directory, name)).st_size
+    return total
+
+
+@pytest.fixture
+def engine():
+    engine = SizeEngine(workers=3)
+    yield engine
+    engine.shutdown()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "root"
+    write(str(root / "top"), 10)
+    write(str(root / "a" / "f1"), 100)
+    write(str(root / "a" / "b" / "f2"), 200)
+    write(str(root / "c" / "f3"), 50)
+    return str(root)
+
+
+@pytest.fixture
+def index(engine, tree):
+    index = SizeIndex(engine, expire=3600)
+    assert index.build(tree).size == walk_size(tree) == 360
+    return index
+
+
+def test_build_indexes_every_directory(index, tree):
+    for sub in ("", "a", os.path.join("a", "b"), "c"):
+        assert os.path.join(tree, sub).rstrip(os.sep) in index
+    assert index.get(tree) == 360
+    assert index.peek(os.path.join(tree, "a")) == 300
+
+
+def test_changed_directory_is_rescanned_alone(index, tree):
+    write(os.path.join(tree, "a", "b", "new"), 1000)
+    rescans = SIZE_INDEX_RESCANS.value
+    assert index.get(tree) == walk_size(tree) == 1360
+    assert SIZE_INDEX_RESCANS.value - rescans == 1
+    assert index.peek(os.path.join(tree, "a")) == 1300
+
+
+def test_new_and_removed_subdirectories(index, tree):
+    write(os.path.join(tree, "d", "e", "f4"), 7)
+    shutil.rmtree(os.path.join(tree, "c"))
+    assert index.get(tree) == walk_size(tree) == 317
+    assert os.path.join(tree, "c") not in index
+    assert index.peek(os.path.join(tree, "d", "e")) == 7
+
+
+def test_subtree_change_propagates_to_ancestors(index, tree):
+    write(os.path.join(tree, "a", "b", "new"), 40)
+    assert index.get(os.path.join(tree, "a", "b")) == 240
+    # 只校验了子目录，祖先的合计也随之更新
+    assert index.peek(os.path.join(tree, "a")) == 340
+    assert index.peek(tree) == 400
+
+
+def test_in_place_rewrite_needs_invalidate(index, tree):
+    # 原地改写文件内容不改变目录的修改时间
+    with open(os.path.join(tree, "c", "f3"), 'r+b') as f:
+        f.write(b'y' * 80)
+    assert index.get(tree) == 360
+    index.invalidate(os.path.join(tree, "c"))
+    assert index.get(tree) == walk_size(tree) == 390
+
+
+def test_concurrent_validation_keeps_ancestors_consistent(engine, tmp_path):
+    root = str(tmp_path / "wide")
+    for i in range(16):
+        write(os.path.join(root, f"d{i}", "sub", "f"), i)
+    index = SizeIndex(engine, expire=3600)
+    index.build(root)
+    for i in range(16):
+        write(os.path.join(root, f"d{i}", "sub", "g"), 1000 + i)
+
+    barrier = threading.Barrier(16)
+
+    def validate(i):
+        barrier.wait()
+        index.get(os.path.join(root, f"d{i}"))
+
+    threads = [threading.Thread(target=validate, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert index.peek(root) == walk_size(root)
+    assert index.get(root) == walk_size(root)
+
+
+def test_store_backs_evicted_entries_and_survives_restart(engine, tree, tmp_path):
+    store = SizeStore(str(tmp_path / "sizes.db"), batch_size=2)
+    index = SizeIndex(engine, expire=3600, store=store, max_entries=1)
+    index.build(tree)
+    # 内存中只保留一条，其余记录从 SQLite 读回
+    assert len(index) == 1
+    assert index.get(tree) == 360
+    index.flush()
+    store.close()
+
+    store = SizeStore(str(tmp_path / "sizes.db"))
+    try:
+        assert store.count() == 4
+        reopened = SizeIndex(engine, expire=3600, store=store)
+        write(os.path.join(tree, "a", "more"), 5)
+        assert reopened.get(tree) == walk_size(tree) == 365
+        reopened.discard(os.path.join(tree, "a"))
+        reopened.flush()
+        assert store.count() == 2
+    finally:
+        store.close()
+
+
+def test_expired_record_is_rescanned_not_dropped(index, tree):
+    """超过 expire 的记录在校验时重新扫描自身一层，而不是被缓存丢弃后整棵重新统计"""
+    with open(os.path.join(tree, "c", "f3"), 'r+b') as f:
+        f.write(b'y' * 80)
+    index.expire = 0
+    rescans = SIZE_INDEX_RESCANS.value
+    assert index.get(tree) == walk_size(tree) == 390
+    assert SIZE_INDEX_RESCANS.value - rescans == 4
+    assert len(index) == 4
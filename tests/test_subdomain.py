@@ -0,0 +1,74 @@
+"""子域名枚举：泛解析过滤、同应答合并，以及解析失败时不挂起"""
+import threading
+from concurrent.futures import Future
+
+from src.core.resolver import BulkResolver
+from src.core.subdomain import StubZone, SubdomainEnumerator
+
+ZONE = {
+    "www.example.test": ["192.0.2.10"],
+    "web.example.test": ["192.0.2.10"],
+    "mail.example.test": ["192.0.2.20", "192.0.2.21"],
+    "shadow.example.test": ["198.51.100.1"],
+    "*.example.test": ["198.51.100.1"],
+}
+
+WORDS = ["www", "web", "mail", "shadow", "nothing", "www", "", "# comment"]
+
+
+def enumerate_zone(records, detect_wildcard=True):
+    enumerator = SubdomainEnumerator("example.test", resolve_fn=StubZone(records).resolve, rate=0)
+    try:
+        hits = list(enumerator.run(WORDS, detect_wildcard))
+    finally:
+        enumerator.resolver.shutdown()
+    return enumerator, hits
+
+
+def test_wildcard_answers_are_filtered():
+    enumerator, hits = enumerate_zone(ZONE)
+    assert enumerator.wildcard == {"198.51.100.1"}
+    names = sorted(hit['name'] for hit in hits)
+    # www 与 web 应答相同，先到者上报，另一个并入同组
+    assert names[0] == "mail.example.test"
+    assert names[1:] in (["web.example.test"], ["www.example.test"])
+    summary = enumerator.summary()
+    assert summary['candidates'] == 5
+    assert summary['resolved'] == 5
+    assert summary['wildcard_filtered'] == 2  # shadow 与 nothing 都落在泛解析地址内
+    assert summary['duplicates'] == 1
+    groups = {tuple(group['addresses']): sorted(group['names']) for group in summary['groups']}
+    assert groups[("192.0.2.10",)] == ["web.example.test", "www.example.test"]
+
+
+def test_without_wildcard_everything_resolving_is_reported():
+    records = {name: addresses for name, addresses in ZONE.items() if not name.startswith('*')}
+    enumerator, hits = enumerate_zone(records)
+    assert enumerator.wildcard == frozenset()
+    assert len(hits) == 3
+    assert enumerator.stats['wildcard_filtered'] == 0
+
+
+class FailingResolver(BulkResolver):
+    """部分查询的 Future 以异常结束"""
+
+    def submit(self, kind, name):
+        if name.startswith("mail."):
+            future = Future()
+            threading.Timer(0.01, future.set_exception, (RuntimeError("boom"),)).start()
+            return future
+        return super().submit(kind, name)
+
+
+def test_failed_lookup_does_not_hang():
+    resolver = FailingResolver(rate=0, resolve_fn=StubZone(ZONE).resolve)
+    enumerator = SubdomainEnumerator("example.test", resolver=resolver)
+    done = []
+    thread = threading.Thread(target=lambda: done.append(list(enumerator.run(WORDS))), daemon=True)
+    thread.start()
+    thread.join(5)
+    resolver.shutdown()
+    assert done, "run() 未结束"
+    assert [hit['name'] for hit in done[0]] in (["www.example.test"], ["web.example.test"])
+    assert enumerator.stats['errors'] == 1
+    assert enumerator.stats['resolved'] == 5
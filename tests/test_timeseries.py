@@ -0,0 +1,124 @@
+"""时序存储：段文件扩容时先关闭旧映射、仍被引用的视图保持有效，过期分区被定期清理"""
+import struct
+import time
+
+import pytest
+
+from src.core.scheduler import ProbeScheduler
+from src.core.timeseries import Segment, TimeSeriesStore, RAW, MINUTE, RAW_RECORD
+
+
+@pytest.fixture
+def segment(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.config.settings.TimeSeriesSettings.INITIAL_SEGMENT_RECORDS", 4)
+    segment = Segment(str(tmp_path / "test.seg"), RAW_RECORD)
+    yield segment
+    segment.close()
+
+
+class _CheckedFile:
+    """截断文件时检查旧映射已经关闭"""
+
+    def __init__(self, segment):
+        self._segment = segment
+        self._file = segment._file
+        self.truncated = 0
+
+    def truncate(self, size):
+        assert self._segment._mm.closed, "文件仍被映射时不能改变大小"
+        self.truncated += 1
+        return self._file.truncate(size)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def test_grow_closes_mapping_before_truncate(segment):
+    checked = segment._file = _CheckedFile(segment)
+    for index in range(20):
+        segment.append(index, float(index))
+    assert checked.truncated == 3
+    assert segment.capacity == 32
+    assert [segment.record.unpack(bytes(segment.view(i, i + 1)))[0] for i in range(20)] == \
+        list(range(20))
+
+
+def test_grow_keeps_outstanding_views_valid(segment):
+    for index in range(4):
+        segment.append(index, 1.0)
+    view = segment.view(0, 4)
+    for index in range(4, 10):
+        segment.append(index, 2.0)
+    assert [ts for ts, _ in struct.iter_unpack('<qf', view)] == [0, 1, 2, 3]
+    assert segment.capacity == 16 and len(segment) == 10
+    assert segment.last()[0] == 9
+    del view
+
+
+def test_grow_with_outstanding_views_extends_by_mapping(segment, monkeypatch):
+    """模拟 Windows：视图未释放时不截断文件，由更大的映射扩展文件"""
+    import mmap
+    import os
+    from src.core import timeseries
+
+    real_mmap = mmap.mmap
+
+    def windows_mmap(fileno, length):
+        # Windows 上长度超过文件大小时由映射扩展文件
+        if length and length > os.fstat(fileno).st_size:
+            os.ftruncate(fileno, length)
+        return real_mmap(fileno, length)
+
+    monkeypatch.setattr(timeseries, "_EXTEND_BY_MAPPING", True)
+    monkeypatch.setattr(timeseries.mmap, "mmap", windows_mmap)
+    checked = segment._file = _CheckedFile(segment)
+    for index in range(4):
+        segment.append(index, 1.0)
+    view = segment.view(0, 4)
+    for index in range(4, 10):
+        segment.append(index, 2.0)
+    # 第一次扩容时视图仍引用旧映射，不截断；第二次的旧映射已可关闭，照常截断
+    assert checked.truncated == 1
+    assert segment.capacity == 16
+    assert [ts for ts, _ in struct.iter_unpack('<qf', view)] == [0, 1, 2, 3]
+    assert [segment.record.unpack(bytes(segment.view(i, i + 1)))[0] for i in range(10)] == \
+        list(range(10))
+    del view
+
+
+def fill_store(store, now):
+    """一条超出原始样本保留期的样本和一条新样本，分属不同的按天分区"""
+    store.record("host", 10.0, now - 30 * 86400)
+    store.record("host", 12.0, now - 60)
+    store.flush(now)
+    return store.host_id("host")
+
+
+def test_apply_retention_drops_expired_segments(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    now = time.time()
+    host_id = fill_store(store, now)
+    assert len(store._segment_names(RAW, host_id)) == 2
+
+    assert store.apply_retention(now) == 1
+    assert len(store._segment_names(RAW, host_id)) == 1
+    # 分钟汇总的保留期更长，旧数据仍在
+    assert len(store.query("host", now - 31 * 86400, now, MINUTE)) == 2
+    assert [rtt for _, rtt in store.query("host", now - 31 * 86400, now, RAW)] == [12.0]
+    assert store.apply_retention(now) == 0
+    store.close()
+
+
+def test_scheduler_applies_retention_when_flushing(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.config.settings.SchedulerSettings.FLUSH_INTERVAL", 0.05)
+    store = TimeSeriesStore(str(tmp_path))
+    host_id = fill_store(store, time.time())
+    scheduler = ProbeScheduler(max_workers=2, store=store).start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(store._segment_names(RAW, host_id)) > 1 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        scheduler.stop()
+    assert len(store._segment_names(RAW, host_id)) == 1
+    store.close()